@@ -1,4 +1,9 @@
+import pandas as pd
 import streamlit as st
+from instrumentation import page_timings, session_timings, start_page
+from warmup import status, warm_start
+
+page_timer = start_page("Accueil")
 
 # Configuration de la page
 st.set_page_config(
@@ -7,6 +12,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Préchargement des données et des bibliothèques des pages pendant l'affichage de l'accueil
+warm_start()
+
 # Appliquer un thème de couleurs discrètes
 st.markdown("""
     <style>
@@ -38,4 +46,36 @@ st.markdown(
     """
 )   
 
-st.image("./images/logo-leon.png")
\ No newline at end of file
+st.image("./images/logo-leon.png")
+
+# Démarrage du serveur et temps de première interactivité des pages
+with st.expander("⏱️ Temps de démarrage"):
+    warm = status()
+    st.write(f"**Préchargement** : {warm['state']}"
+             + (f" en {warm['duration_s']:.1f} s" if warm["duration_s"] is not None else ""))
+    if warm["error"]:
+        st.error(warm["error"])
+    if warm["steps"]:
+        st.dataframe(
+            pd.DataFrame({"Étape": list(warm["steps"]), "Durée (s)": list(warm["steps"].values())}).round(2),
+            hide_index=True,
+        )
+    timings = page_timings()
+    if timings:
+        first_in_session = session_timings()
+        st.dataframe(
+            pd.DataFrame(timings)
+            .assign(session_s=lambda t: t["page"].map(first_in_session))
+            .rename(columns={
+                "page": "Page",
+                "first_run_s": "Première exécution (s)",
+                "since_process_start_s": "Depuis le démarrage (s)",
+                "runs": "Exécutions",
+                "last_run_s": "Dernière exécution (s)",
+                "session_s": "Première exécution de la session (s)",
+            })
+            .round(2),
+            hide_index=True,
+        )
+
+page_timer.ready()
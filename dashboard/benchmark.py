@@ -0,0 +1,179 @@
+"""
+Banc d'essai de la latence des pages, sans navigateur (``AppTest`` de Streamlit).
+
+Chaque page est pilotée par des interactions représentatives (choix d'une
+région, types de résidence, clic sur un point de la carte, nombre de clusters,
+modification et sauvegarde dans l'éditeur) ; chaque interaction est une
+réexécution chronométrée. Les sessions sont répétées pour obtenir les
+latences médiane (p50) et p95 de chaque interaction ; une session
+supplémentaire, suivie par ``tracemalloc``, mesure le pic de mémoire allouée
+par une session (caches partagés déjà chargés), et le pic de mémoire résidente
+du processus rend compte des chargements.
+
+Les jeux de données sont générés par ``data.synthetic`` (copie des données
+réelles, puis 100 000 et 1 000 000 d'établissements par défaut) ; les pages
+sont exécutées depuis la racine du jeu, si bien que les sauvegardes de
+l'éditeur ne touchent jamais aux données du dépôt.
+
+Exécution (depuis la racine du dépôt) :
+    python dashboard/benchmark.py [--rows real 100000 1000000] [--pages 1 2 3] [--repeats 5] [--output resultats.csv]
+"""
+import argparse
+import gc
+import os
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+import data
+from data import RESIDENCE_TYPES, ROW_ID, get_dataset
+from data.synthetic import SYNTHETIC_DIR, ensure_dataset
+from maps.clustering import clear_memory
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+PAGES = {
+    "1": "1 - Informations Entreprises.py",
+    "2": "2 - Informations Zones.py",
+    "3": "3 - Modifier les Etablissements.py",
+}
+DEFAULT_ROWS = ["real", "100000", "1000000"]
+TIMEOUT = 600
+
+
+def _widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+def _select_region(at):
+    _widget(at.selectbox, "Choisissez une région").select_index(1)
+
+
+def _toggle_types(at):
+    _widget(at.segmented_control, "Type de Résidence : ").set_value(list(RESIDENCE_TYPES))
+
+
+def _click_point(at):
+    # Sélection d'un point de la carte, telle que l'enregistre la page après un clic
+    frame = get_dataset().frame
+    row = frame.loc[frame["coordinates.latitude"].notna()].iloc[0]
+    at.session_state["selected_point"] = {
+        "id": int(row[ROW_ID]), "lat": row["coordinates.latitude"], "lon": row["coordinates.longitude"],
+    }
+
+
+def _change_clusters(at):
+    _widget(at.number_input, "Nombre de cluster : ").set_value(20)
+
+
+def _search_record(at):
+    _widget(at.text_input, "Rechercher un établissement").input("EHPAD")
+
+
+def _select_record(at):
+    at.selectbox(key="modify_selected_id").select_index(1)
+
+
+def _edit_and_save(at):
+    title = next(t for t in at.text_input if (t.key or "").startswith("modify") and (t.key or "").endswith("_title"))
+    title.input(f"{title.value} (banc d'essai)")
+    next(b for b in at.button if "Sauvegarder" in b.label).click()
+
+
+# Interactions de chaque page, jouées dans l'ordre après la première exécution
+SCENARIOS = {
+    "1": [("région", _select_region), ("types", _toggle_types), ("clic sur la carte", _click_point)],
+    "2": [("région", _select_region), ("types", _toggle_types), ("n_clusters", _change_clusters)],
+    "3": [("recherche", _search_record), ("sélection", _select_record), ("modification et sauvegarde", _edit_and_save)],
+}
+
+
+def run_session(page):
+    """Une session de la page : durée (s) de la première exécution puis de chaque interaction."""
+    at = AppTest.from_file(os.path.join(PAGES_DIR, PAGES[page]), default_timeout=TIMEOUT)
+    start = time.perf_counter()
+    at.run()
+    timings = [("première exécution", time.perf_counter() - start)]
+    for name, interact in SCENARIOS[page]:
+        interact(at)
+        start = time.perf_counter()
+        at.run()
+        timings.append((name, time.perf_counter() - start))
+    if at.exception:
+        raise RuntimeError(f"page {page} : {at.exception[0].message}")
+    return timings
+
+
+def peak_memory(page):
+    """Pic de mémoire allouée (Mo) pendant une session de la page."""
+    tracemalloc.start()
+    try:
+        run_session(page)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def _reset():
+    # Les caches partagés sont propres à chaque jeu de données
+    data.invalidate()
+    clear_memory()
+    gc.collect()
+
+
+def benchmark(rows, pages, repeats):
+    """Latences p50 / p95 (ms) et pic de mémoire (Mo) de chaque interaction, pour un jeu de données."""
+    root = ensure_dataset(None if rows == "real" else int(rows), base_dir=os.path.abspath(SYNTHETIC_DIR))
+    cwd = os.getcwd()
+    os.chdir(root)
+    results = []
+    try:
+        _reset()
+        for page in pages:
+            timings = {}
+            for _ in range(repeats):
+                for name, duration in run_session(page):
+                    timings.setdefault(name, []).append(duration)
+            peak_mb = peak_memory(page)
+            for name, durations in timings.items():
+                results.append({
+                    "rows": len(get_dataset().frame),
+                    "page": page,
+                    "interaction": name,
+                    "runs": len(durations),
+                    "p50_ms": 1000 * np.percentile(durations, 50),
+                    "p95_ms": 1000 * np.percentile(durations, 95),
+                    "peak_mb": peak_mb,
+                    # Pic de mémoire résidente du processus (Linux : Ko)
+                    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                })
+    finally:
+        os.chdir(cwd)
+        _reset()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description="Latence des pages sur des jeux de données croissants.")
+    parser.add_argument("--rows", nargs="+", default=DEFAULT_ROWS, help="Tailles des jeux (« real » : données réelles)")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES), help="Pages à mesurer")
+    parser.add_argument("--repeats", type=int, default=5, help="Sessions par page")
+    parser.add_argument("--output", default=None, help="Fichier CSV des résultats")
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in args.rows:
+        start = time.perf_counter()
+        results.extend(benchmark(rows, args.pages, args.repeats))
+        print(f"Jeu {rows} mesuré en {time.perf_counter() - start:.1f} s")
+    report = pd.DataFrame(results).round(1)
+    print(report.to_string(index=False))
+    if args.output:
+        report.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Accès aux données partagé par les pages du tableau de bord."""
+from .audit import column_report, record_report, validate_value
+from .cache import ResultCache
+from .cube import CubeSlice, RollupCube
+from .filters import RESIDENCE_TYPES, FilterEngine, FilterResult, FilterState, excluded_types
+from .database import sqlite_enabled
+from .geo import GeoIndex
+from .grid import PAGE_SIZES, RecordGrid
+from .journal import ConflictError, compact, journal_path, record_key
+from .mongo import mongo_enabled
+from .search import TOP_K, SearchIndex, normalize
+from .snapshot import build_snapshot, load_snapshot
+from .store import (
+    MAP_COLUMNS,
+    MAP_FIELDS,
+    ROW_ID,
+    SUMMARY_COLUMNS,
+    ZONE_COLUMNS,
+    Dataset,
+    get_audit,
+    get_column_metadata,
+    get_dataset,
+    get_frame,
+    get_map_rows,
+    get_mongo_collection,
+    get_record,
+    get_record_grid,
+    get_record_search,
+    get_records,
+    get_summary,
+    get_zone_table,
+    invalidate,
+    invalidate_records,
+    record_revision,
+    save_changes,
+    save_records,
+)
+from .zones import ZoneTable, classify_regions
@@ -0,0 +1,30 @@
+"""
+Commandes en ligne de commande du module de données (depuis la racine du dépôt) :
+    python -m dashboard.data <commande> [options]
+"""
+import sys
+
+from . import audit, database, etl, ingest, journal, mongo, snapshot, synthetic
+
+COMMANDS = {
+    "snapshot": snapshot.main,
+    "compact": journal.main,
+    "sqlite": database.main,
+    "audit": audit.main,
+    "etl": etl.main,
+    "ingest": ingest.main,
+    "mongo": mongo.main,
+    "synthetic": synthetic.main,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print("Usage : python -m dashboard.data {" + ",".join(COMMANDS) + "} [options]")
+        sys.exit(2)
+    COMMANDS[argv[0]](argv[1:])
+
+
+if __name__ == "__main__":
+    main()
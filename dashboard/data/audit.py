@@ -0,0 +1,208 @@
+"""
+Audit de la qualité de la base des établissements.
+
+Les règles sont celles du formulaire de l'éditeur (champ obligatoire, format
+téléphone, e-mail, date et nombre) ; ``validate_value`` les applique à une
+valeur saisie, ``audit_frame`` à toutes les colonnes de la base en une fois :
+expressions régulières précompilées appliquées par ``Series.str.fullmatch`` et
+dates analysées par ``pd.to_datetime(errors="coerce")``, sans boucle par ligne.
+
+Le rapport est produit par colonne et par établissement (JSON et CSV) :
+    python -m dashboard.data audit [--output-dir ./data/audit] [--format json csv]
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .database import METADATA_PATH
+from .journal import ID_COLUMN, RECORDS_PATH, apply_changes, fold, journal_path, read_journal
+
+REPORT_DIR = "./data/audit"
+REPORT_FORMATS = ["json", "csv"]
+# Type et caractère obligatoire des colonnes absentes de noms_colonnes.csv
+DEFAULT_WIDGET_TYPE = "Char 256"
+
+PHONE_PATTERN = re.compile(r"\+?[0-9 .-]{8,}")
+EMAIL_PATTERN = re.compile(r"[\w.-]+@[\w.-]+\.\w+")
+# Équivalent de str(value).replace('.', '').isdigit()
+NUMBER_PATTERN = re.compile(r"[0-9.]*[0-9][0-9.]*")
+
+MESSAGES = {
+    "obligatoire": "Ce champ est obligatoire",
+    "telephone": "Format téléphone invalide (+XX X XX XX XX)",
+    "email": "Format email invalide (exemple@domaine.com)",
+    "date": "Format date invalide (AAAA-MM-JJ)",
+    "nombre": "Doit être un nombre valide",
+}
+
+
+def format_rules(widget_type):
+    """Règles de format applicables à un type de widget."""
+    rules = []
+    if widget_type == "Structure telephonique":
+        rules.append("telephone")
+    if widget_type == "Structure mail":
+        rules.append("email")
+    if "Date" in widget_type:
+        rules.append("date")
+    if widget_type == "Nombre":
+        rules.append("nombre")
+    return rules
+
+
+def _is_missing(value):
+    return value is None or value == "" or (np.ndim(value) == 0 and pd.isnull(value))
+
+
+def _valid_format(rule, value):
+    if rule == "telephone":
+        return PHONE_PATTERN.fullmatch(str(value)) is not None
+    if rule == "email":
+        return EMAIL_PATTERN.fullmatch(str(value)) is not None
+    if rule == "nombre":
+        return NUMBER_PATTERN.fullmatch(str(value)) is not None
+    try:
+        pd.to_datetime(value)
+    except (ValueError, TypeError, OverflowError):
+        return False
+    return True
+
+
+def validate_value(value, widget_type, mandatory):
+    """Vérifie une valeur saisie ; retourne (valide, messages séparés par des virgules)."""
+    if _is_missing(value):
+        violations = ["obligatoire"] if mandatory else []
+    else:
+        violations = [rule for rule in format_rules(widget_type) if value and not _valid_format(rule, value)]
+    return not violations, ", ".join(MESSAGES[rule] for rule in violations)
+
+
+def column_violations(series, widget_type, mandatory):
+    """Masques des lignes en infraction pour chaque règle applicable à une colonne."""
+    missing = series.isna().to_numpy().copy()
+    if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+        missing |= (series == "").fillna(False).to_numpy(dtype=bool)
+    violations = {}
+    if mandatory:
+        violations["obligatoire"] = missing
+    rules = format_rules(widget_type)
+    if not rules or missing.all():
+        return violations
+
+    present = np.flatnonzero(~missing)
+    values = series.iloc[present]
+    # Chaînes Python (et non Arrow) : mêmes expressions régulières (\w Unicode) que le formulaire
+    text = values.astype(str).astype(object)
+    for rule in rules:
+        if rule == "date":
+            if pd.api.types.is_datetime64_any_dtype(values.dtype):
+                continue
+            # Chaque valeur est analysée isolément, comme dans le formulaire
+            valid = pd.to_datetime(values.astype(object), errors="coerce", format="mixed").notna().to_numpy()
+        else:
+            pattern = {"telephone": PHONE_PATTERN, "email": EMAIL_PATTERN, "nombre": NUMBER_PATTERN}[rule]
+            valid = text.str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+        mask = np.zeros(len(series), dtype=bool)
+        mask[present[~valid]] = True
+        violations[rule] = mask
+    return violations
+
+
+def audit_frame(frame, widget_types, mandatory_fields):
+    """
+    Infractions de toutes les colonnes de ``frame``, une ligne par valeur en
+    infraction : identifiant, colonne, règle, message et valeur.
+    """
+    ids = frame[ID_COLUMN].to_numpy() if ID_COLUMN in frame.columns else np.arange(len(frame))
+    parts = []
+    for column in frame.columns:
+        widget_type = widget_types.get(column, DEFAULT_WIDGET_TYPE)
+        mandatory = bool(mandatory_fields.get(column, 0))
+        for rule, mask in column_violations(frame[column], widget_type, mandatory).items():
+            rows = np.flatnonzero(mask)
+            if len(rows):
+                parts.append(pd.DataFrame({
+                    ID_COLUMN: ids[rows],
+                    "column": column,
+                    "widget_type": widget_type,
+                    "rule": rule,
+                    "message": MESSAGES[rule],
+                    "value": frame[column].iloc[rows].astype(str).to_numpy(),
+                }))
+    if not parts:
+        return pd.DataFrame(columns=[ID_COLUMN, "column", "widget_type", "rule", "message", "value"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def column_report(violations, total):
+    """Nombre d'infractions par colonne et par règle, avec la part des ``total`` lignes concernées."""
+    if violations.empty:
+        return pd.DataFrame(columns=["column", "widget_type", "violations", "rows_pct"])
+    report = violations.pivot_table(
+        index=["column", "widget_type"], columns="rule", values=ID_COLUMN, aggfunc="size", fill_value=0
+    )
+    report["violations"] = report.sum(axis=1)
+    report["rows_pct"] = (100 * report["violations"] / max(total, 1)).round(2)
+    return report.sort_values("violations", ascending=False).reset_index().rename_axis(columns=None)
+
+
+def record_report(violations):
+    """Nombre d'infractions par établissement et détail « colonne : message »."""
+    if violations.empty:
+        return pd.DataFrame(columns=[ID_COLUMN, "violations", "details"])
+    details = violations["column"] + " : " + violations["message"]
+    grouped = details.groupby(violations[ID_COLUMN], sort=False)
+    report = pd.DataFrame({"violations": grouped.size(), "details": grouped.agg("; ".join)})
+    return report.sort_values("violations", ascending=False, kind="stable").reset_index()
+
+
+def write_reports(violations, total, output_dir=REPORT_DIR, formats=REPORT_FORMATS):
+    """Écrit les rapports par colonne et par établissement ; retourne les chemins écrits."""
+    os.makedirs(output_dir, exist_ok=True)
+    reports = {"audit_colonnes": column_report(violations, total), "audit_etablissements": record_report(violations)}
+    written = []
+    for name, report in reports.items():
+        if "csv" in formats:
+            path = os.path.join(output_dir, f"{name}.csv")
+            report.to_csv(path, sep=";", index=False)
+            written.append(path)
+        if "json" in formats:
+            path = os.path.join(output_dir, f"{name}.json")
+            with open(path, "w") as f:
+                json.dump(report.to_dict(orient="records"), f, ensure_ascii=False, indent=2, default=str)
+            written.append(path)
+    return written
+
+
+def read_raw_records(records_path=RECORDS_PATH):
+    """Base JSON telle qu'enregistrée (dates non converties), journal compris."""
+    with open(records_path, "r") as f:
+        frame = pd.json_normalize(json.load(f))
+    entries, _ = read_journal(journal_path(records_path))
+    return apply_changes(frame, fold(entries))
+
+
+def read_metadata(path=METADATA_PATH):
+    """Types de widget et champs obligatoires par colonne."""
+    metadata = pd.read_csv(path, sep=";").set_index("Column Names")
+    return metadata["Type Widget"], metadata["Modification Obligatoire"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="audit", description="Audit de la qualité de la base des établissements.")
+    parser.add_argument("--records", default=RECORDS_PATH, help="Base JSON des établissements")
+    parser.add_argument("--metadata", default=METADATA_PATH, help="Description des colonnes (noms_colonnes.csv)")
+    parser.add_argument("--output-dir", default=REPORT_DIR, help="Dossier des rapports")
+    parser.add_argument("--format", nargs="+", choices=REPORT_FORMATS, default=REPORT_FORMATS, help="Formats des rapports")
+    args = parser.parse_args(argv)
+
+    widget_types, mandatory_fields = read_metadata(args.metadata)
+    frame = read_raw_records(args.records)
+    violations = audit_frame(frame, widget_types, mandatory_fields)
+    for path in write_reports(violations, len(frame), args.output_dir, args.format):
+        print(f"Rapport écrit : {path}")
+    print(f"{len(violations)} infraction(s) sur {violations[ID_COLUMN].nunique()} établissement(s) / {len(frame)}")
@@ -0,0 +1,93 @@
+"""
+Cache LRU borné des résultats de filtrage, partagé entre toutes les sessions.
+
+Les utilisateurs alternent entre quelques combinaisons de filtres : chaque
+résultat (positions des lignes retenues et indicateurs affichés) est conservé
+sous une clé canonique et réutilisé d'une session à l'autre. Le cache est borné
+en nombre d'entrées et en mémoire ; les entrées les moins récemment utilisées
+sont évincées en premier.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# Budgets par défaut, modifiables par variables d'environnement
+MAX_ENTRIES = int(os.environ.get("EHPAD_RESULT_CACHE_ENTRIES", 256))
+MAX_BYTES = int(float(os.environ.get("EHPAD_RESULT_CACHE_MB", 64)) * 1024 * 1024)
+
+# Coût forfaitaire d'une entrée (clé, objet résultat, nœud de l'OrderedDict)
+ENTRY_OVERHEAD = 512
+
+
+def _size_of(value):
+    nbytes = getattr(value, "nbytes", None)
+    return (nbytes if nbytes is not None else 0) + ENTRY_OVERHEAD
+
+
+class ResultCache:
+    """Cache LRU thread-safe avec budget d'entrées et de mémoire."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Retourne la valeur en cache (ou None) et met à jour les compteurs."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Retourne la valeur en cache ou la calcule puis la mémorise."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Compteurs du cache (succès, échecs, évictions, taille)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,221 @@
+"""
+Cube d'agrégats précalculés pour les indicateurs et les tables de synthèse.
+
+Les établissements sont regroupés en cellules selon les dimensions région ×
+département × statut juridique × combinaison des indicateurs de type (un bit
+par type de résidence) × tranche de capacité (capacité non renseignée à part).
+Chaque cellule porte le nombre d'établissements, le nombre de capacités
+renseignées, la somme et la somme des carrés des capacités. Le cube est
+construit une fois par version des données ; un état de filtres portant sur
+ces seules dimensions est évalué par quelques masques sur les cellules
+(quelques milliers), sans parcourir les lignes : nombre, capacité totale,
+moyenne, écart-type et tables par dimension.
+
+Les tranches de capacité sont bornées par ``CAPACITY_EDGES`` et chaque borne
+forme sa propre tranche : une capacité minimale ou maximale égale à une borne
+(la capacité minimale de 70 places de la page des établissements, par
+exemple) est évaluée exactement sur le cube. Une autre valeur, hors de
+l'étendue des données, fait agréger les seules lignes retenues.
+"""
+import numpy as np
+import pandas as pd
+
+from .filters import CAPACITY_COLUMN, RESIDENCE_TYPES, FilterState
+from .geo import DEPARTMENT_COLUMN, REGION_COLUMN
+
+LEGAL_STATUS_COLUMN = "legal_status"
+DIMENSIONS = [REGION_COLUMN, DEPARTMENT_COLUMN, LEGAL_STATUS_COLUMN]
+# Libellé des valeurs manquantes dans les tables de synthèse
+MISSING_LABEL = "Non renseigné"
+# Bit de chaque indicateur de type dans la combinaison d'une cellule
+TYPE_BITS = {col: 1 << bit for bit, col in enumerate(RESIDENCE_TYPES.values())}
+# Bornes des tranches de capacité (places) évaluables sur le cube
+CAPACITY_EDGES = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 120, 150, 200, 250, 300, 400, 500]
+
+
+def type_pattern(frame):
+    """
+    Combinaison des indicateurs de type de chaque ligne : bit à 1 si
+    l'indicateur n'est pas faux (vrai ou inconnu), la ligne étant alors exclue
+    lorsque ce type est désélectionné, comme dans le moteur de filtres.
+    """
+    pattern = np.zeros(len(frame), dtype=np.int64)
+    for col, bit in TYPE_BITS.items():
+        pattern |= np.where(frame[col].eq(False).fillna(False).to_numpy(dtype=bool), 0, bit)
+    return pattern
+
+
+def capacity_bucket(capacity, edges=CAPACITY_EDGES):
+    """
+    Tranche de chaque capacité : 2k+1 pour une capacité égale à la borne k,
+    2k pour une capacité strictement comprise entre les bornes k-1 et k
+    (-1 si la capacité n'est pas renseignée).
+    """
+    capacity = np.asarray(capacity, dtype=float)
+    edges = np.asarray(edges, dtype=float)
+    index = np.searchsorted(edges, capacity, side="left")
+    on_edge = edges[np.minimum(index, len(edges) - 1)] == capacity
+    return np.where(np.isnan(capacity), -1, 2 * index + on_edge).astype(np.int64)
+
+
+class CubeSlice:
+    """Cellules retenues par un état de filtres et indicateurs associés."""
+
+    __slots__ = ("cube", "mask", "count", "capacity_count", "capacity_total", "_squares")
+
+    def __init__(self, cube, mask):
+        self.cube = cube
+        self.mask = mask
+        self.count = int(cube.count[mask].sum())
+        self.capacity_count = int(cube.capacity_count[mask].sum())
+        self.capacity_total = float(cube.capacity_total[mask].sum())
+        self._squares = float(cube.capacity_squares[mask].sum())
+
+    @property
+    def nbytes(self):
+        return self.cube.nbytes + self.mask.nbytes
+
+    @property
+    def capacity_mean(self):
+        """Capacité moyenne des établissements dont la capacité est renseignée."""
+        return self.capacity_total / self.capacity_count if self.capacity_count else np.nan
+
+    @property
+    def capacity_std(self):
+        """Écart-type (corrigé) des capacités renseignées."""
+        if self.capacity_count < 2:
+            return np.nan
+        variance = (self._squares - self.capacity_total ** 2 / self.capacity_count) / (self.capacity_count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def table(self, dimension, top=None, sort_by="capacity_total", missing=True, min_count=1):
+        """
+        Table de synthèse par valeur de ``dimension`` : nombre d'établissements,
+        capacité totale, moyenne et écart-type ; les ``top`` premières lignes
+        selon ``sort_by`` si demandé. ``missing`` garde la ligne des valeurs
+        non renseignées, ``min_count`` écarte les valeurs trop peu représentées.
+        """
+        return self.cube.table(dimension, self.mask, top, sort_by, missing, min_count)
+
+
+class RollupCube:
+    """Agrégats par cellule de dimensions, construits une fois par version des données."""
+
+    def __init__(self, frame):
+        codes = []
+        self.labels = {}
+        for column in DIMENSIONS:
+            column_codes, uniques = pd.factorize(frame[column])
+            codes.append(column_codes)
+            self.labels[column] = list(uniques)
+        capacity = frame[CAPACITY_COLUMN].to_numpy(dtype=float)
+        known = ~np.isnan(capacity)
+        keys = np.column_stack(codes + [type_pattern(frame), capacity_bucket(capacity)])
+
+        cells, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        self.size = len(cells)
+        self.codes = {column: cells[:, i] for i, column in enumerate(DIMENSIONS)}
+        self.types = cells[:, len(DIMENSIONS)]
+        self.buckets = cells[:, len(DIMENSIONS) + 1]
+        self.known = self.buckets >= 0
+
+        values = np.where(known, capacity, 0.0)
+        self.count = np.bincount(inverse, minlength=self.size)
+        self.capacity_count = np.bincount(inverse, weights=known, minlength=self.size).astype(np.int64)
+        self.capacity_total = np.bincount(inverse, weights=values, minlength=self.size)
+        self.capacity_squares = np.bincount(inverse, weights=values ** 2, minlength=self.size)
+        self._code_of = {column: {value: code for code, value in enumerate(labels)} for column, labels in self.labels.items()}
+        self._capacity_range = (capacity[known].min(), capacity[known].max()) if known.any() else None
+        # Tranche formée par chaque borne
+        self._edge_bucket = {float(edge): 2 * k + 1 for k, edge in enumerate(CAPACITY_EDGES)}
+        self._all = np.ones(self.size, dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        arrays = [*self.codes.values(), self.types, self.buckets, self.known, self.count,
+                  self.capacity_count, self.capacity_total, self.capacity_squares]
+        return sum(array.nbytes for array in arrays)
+
+    def answers(self, state):
+        """
+        Vrai si l'état ne porte que sur les dimensions du cube : pas de ville
+        ni de groupe, et des bornes de capacité égales à une borne des tranches
+        ou couvrant toute l'étendue des données (seules les capacités
+        renseignées sont alors retenues).
+        """
+        if state.city is not None or state.group is not None:
+            return False
+        if self._capacity_range is None:
+            return state.capacity_min is None and state.capacity_max is None
+        low, high = self._capacity_range
+        return (
+            state.capacity_min is None or state.capacity_min <= low or float(state.capacity_min) in self._edge_bucket
+        ) and (
+            state.capacity_max is None or state.capacity_max >= high or float(state.capacity_max) in self._edge_bucket
+        )
+
+    def cells(self, state=FilterState(), legal_status=None):
+        """Masque des cellules retenues par un état de filtres (que le cube doit pouvoir évaluer)."""
+        mask = self._all
+        for column, value in (
+            (REGION_COLUMN, state.region),
+            (DEPARTMENT_COLUMN, state.department),
+            (LEGAL_STATUS_COLUMN, legal_status),
+        ):
+            if value is not None:
+                code = self._code_of[column].get(value)
+                if code is None:
+                    return np.zeros(self.size, dtype=bool)
+                mask = mask & (self.codes[column] == code)
+        if state.capacity_min is not None or state.capacity_max is not None:
+            mask = mask & self.known
+            low, high = self._capacity_range or (None, None)
+            if state.capacity_min is not None and low is not None and state.capacity_min > low:
+                mask = mask & (self.buckets >= self._edge_bucket[float(state.capacity_min)])
+            if state.capacity_max is not None and high is not None and state.capacity_max < high:
+                mask = mask & (self.buckets <= self._edge_bucket[float(state.capacity_max)])
+        excluded = sum(TYPE_BITS[col] for col in state.excluded_types)
+        if excluded:
+            mask = mask & ((self.types & excluded) == 0)
+        return mask
+
+    def slice(self, state=FilterState(), legal_status=None):
+        """Indicateurs d'un état de filtres évalués sur les cellules."""
+        return CubeSlice(self, self.cells(state, legal_status))
+
+    def table(self, dimension, mask=None, top=None, sort_by="capacity_total", missing=True, min_count=1):
+        """Agrégats des cellules ``mask`` par valeur de ``dimension`` (valeurs manquantes regroupées)."""
+        mask = self._all if mask is None else mask
+        labels = self.labels[dimension] + [MISSING_LABEL]
+        codes = self.codes[dimension][mask]
+        codes = np.where(codes < 0, len(labels) - 1, codes)
+
+        def total(weights):
+            return np.bincount(codes, weights=weights[mask], minlength=len(labels))
+
+        count = total(self.count).astype(np.int64)
+        capacity_count = total(self.capacity_count)
+        capacity_total = total(self.capacity_total)
+        squares = total(self.capacity_squares)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = capacity_total / capacity_count
+            variance = (squares - capacity_total * mean) / (capacity_count - 1)
+        std = np.where(capacity_count > 1, np.sqrt(np.clip(variance, 0.0, None)), np.nan)
+
+        table = pd.DataFrame({
+            dimension: labels,
+            "count": count,
+            "capacity_total": capacity_total,
+            "capacity_mean": np.where(capacity_count > 0, mean, np.nan),
+            "capacity_std": std,
+        })
+        keep = count >= max(min_count, 1)
+        if not missing:
+            keep[-1] = False
+        table = table[keep]
+        table = table.sort_values(sort_by, ascending=False, kind="stable", na_position="last")
+        return (table.head(top) if top else table).reset_index(drop=True)
@@ -0,0 +1,250 @@
+"""
+Stockage optionnel des établissements dans une base SQLite.
+
+Activé par la variable d'environnement ``EHPAD_BACKEND=sqlite`` (le stockage
+par défaut reste le fichier JSON et son journal). Le schéma est dérivé de
+``noms_colonnes.csv`` : une colonne par champ aplati (``coordinates.city``…),
+typée selon le widget de saisie, avec des index sur ``_id`` (clé primaire),
+``noFinesset``, ``coordinates.deptcode`` et ``capacity``.
+
+L'éditeur lit un établissement par sa clé primaire et enregistre chaque
+modification par un UPSERT d'une seule ligne, sans réécrire la base. Ce
+stockage ne sert que l'éditeur : les pages cartographiques lisent toutes leurs
+données (options des filtres, carte, indicateurs et synthèses) dans la table
+partagée ``dataset_to_use.csv``, pour ne jamais mêler deux populations sur une
+même page.
+
+La base se construit depuis le JSON avec ``python -m dashboard.data sqlite``.
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .filters import CAPACITY_COLUMN
+from .journal import (
+    ID_COLUMN, RECORDS_PATH, REVISION_COLUMN, ConflictError, apply_changes, fold, journal_path, read_journal,
+)
+
+BACKEND = os.environ.get("EHPAD_BACKEND", "json")
+DB_PATH = os.environ.get("EHPAD_SQLITE_PATH", "./data/etablissements.sqlite")
+METADATA_PATH = "./data/noms_colonnes.csv"
+
+TABLE = "etablissements"
+INDEXED_COLUMNS = ["noFinesset", "coordinates.deptcode", CAPACITY_COLUMN]
+# Les indicateurs de type sont préfixés dans la base (``types.IsEHPAD``)
+TYPE_PREFIX = "types."
+
+# Affinité SQLite par type de widget (les autres champs sont du texte)
+WIDGET_AFFINITY = {
+    "Num 8": "INTEGER",
+    "Num 16": "REAL",
+    "Numeric Input": "REAL",
+    "Radio": "INTEGER",
+}
+
+
+def sqlite_enabled():
+    return BACKEND == "sqlite"
+
+
+def quote(name):
+    """Identifiant SQL entre guillemets (les noms de colonnes contiennent des points)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+@contextmanager
+def connect(path=DB_PATH):
+    """Connexion validée en sortie de bloc (annulée en cas d'erreur) puis fermée."""
+    with closing(sqlite3.connect(path, timeout=30)) as conn:
+        with conn:
+            yield conn
+
+
+def column_affinity(column, widget_types):
+    # L'identifiant peut être numérique (base d'origine) ou un UUID (créations)
+    if column == ID_COLUMN:
+        return "NUMERIC"
+    if column == REVISION_COLUMN:
+        return "INTEGER NOT NULL DEFAULT 0"
+    return WIDGET_AFFINITY.get(widget_types.get(column), "TEXT")
+
+
+def create_schema(conn, columns, widget_types):
+    """Crée la table, ses index et le compteur de version."""
+    definitions = [
+        f"{quote(col)} {column_affinity(col, widget_types)}" + (" PRIMARY KEY" if col == ID_COLUMN else "")
+        for col in columns
+    ]
+    if REVISION_COLUMN not in columns:
+        definitions.append(f"{quote(REVISION_COLUMN)} INTEGER NOT NULL DEFAULT 0")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} ({', '.join(definitions)})")
+    for col in INDEXED_COLUMNS:
+        if col in columns:
+            name = quote(f"idx_{TABLE}_{col}")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({quote(col)})")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+    conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+
+
+def table_columns(conn):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+
+def _sql_value(value):
+    """Valeur Python/numpy/pandas convertie en type SQLite."""
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _bump_version(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+
+def data_version(path=DB_PATH):
+    """Compteur incrémenté à chaque écriture (sert de clé de cache)."""
+    with connect(path) as conn:
+        return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+
+def build_database(frame, widget_types, path=DB_PATH):
+    """(Re)construit la base à partir de la table aplatie des établissements, atomiquement."""
+    columns = [col for col in widget_types.index if col in frame.columns]
+    columns += [col for col in frame.columns if col not in columns]
+    if ID_COLUMN not in columns:
+        raise ValueError(f"Colonne {ID_COLUMN} absente des données")
+    if REVISION_COLUMN in frame.columns:
+        frame = frame.assign(**{REVISION_COLUMN: frame[REVISION_COLUMN].fillna(0).astype(int)})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with connect(tmp_path) as conn:
+        create_schema(conn, columns, widget_types)
+        placeholders = ", ".join("?" * len(columns))
+        rows = ([_sql_value(value) for value in row] for row in frame[columns].itertuples(index=False))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} ({', '.join(map(quote, columns))}) VALUES ({placeholders})", rows
+        )
+    os.replace(tmp_path, path)
+    with connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+    return len(frame)
+
+
+def read_records(widget_types, path=DB_PATH):
+    """Table complète, avec les indicateurs « Radio » en booléens."""
+    with connect(path) as conn:
+        df = pd.read_sql_query(f"SELECT * FROM {TABLE}", conn)
+    return _restore_types(df, widget_types)
+
+
+def _restore_types(df, widget_types):
+    for col in df.columns:
+        if widget_types.get(col) == "Radio":
+            df[col] = df[col].astype("boolean")
+    return df
+
+
+def fetch_record(record_id, path=DB_PATH):
+    """Établissement d'identifiant donné (recherche par clé primaire), ou None."""
+    with connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(f"SELECT * FROM {TABLE} WHERE {quote(ID_COLUMN)} = ?", (_sql_value(record_id),)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def _current_revision(conn, record_id):
+    row = conn.execute(
+        f"SELECT {quote(REVISION_COLUMN)} FROM {TABLE} WHERE {quote(ID_COLUMN)} = ?", (record_id,)
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def upsert(changes, path=DB_PATH, expected=None):
+    """
+    Enregistre des modifications (identifiant -> champs), une ligne par
+    requête, dans une transaction. Les champs inconnus du schéma sont ignorés.
+
+    ``expected`` associe à un identifiant la révision sur laquelle l'utilisateur
+    a travaillé (None pour une création) : la ligne n'est écrite que si sa
+    révision n'a pas changé (comparer-et-échanger dans la clause WHERE), sinon
+    la transaction est annulée et ``ConflictError`` est levée.
+    Retourne les nouvelles révisions.
+    """
+    expected = expected or {}
+    revisions = {}
+    revision = quote(REVISION_COLUMN)
+    with connect(path) as conn:
+        known = set(table_columns(conn))
+        if REVISION_COLUMN not in known:
+            conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {revision} INTEGER NOT NULL DEFAULT 0")
+        # Verrou d'écriture pris dès le début de la courte transaction
+        conn.execute("BEGIN IMMEDIATE")
+        conflicts = {}
+        for original_id, fields in changes.items():
+            record_id = _sql_value(original_id)
+            fields = {
+                col: _sql_value(value) for col, value in fields.items()
+                if col in known and col not in (ID_COLUMN, REVISION_COLUMN)
+            }
+            columns = [ID_COLUMN] + list(fields)
+            insert = (
+                f"INSERT INTO {TABLE} ({', '.join(map(quote, columns))}, {revision}) "
+                f"VALUES ({', '.join('?' * len(columns))}, 1)"
+            )
+            values = [record_id] + list(fields.values())
+            assignments = "".join(f"{quote(col)} = ?, " for col in fields) + f"{revision} = {revision} + 1"
+
+            if record_id not in expected:
+                updates = "".join(f"{quote(col)} = excluded.{quote(col)}, " for col in fields)
+                conn.execute(
+                    f"{insert} ON CONFLICT({quote(ID_COLUMN)}) DO UPDATE SET {updates}{revision} = {revision} + 1",
+                    values,
+                )
+            elif expected[record_id] is None:
+                cursor = conn.execute(f"{insert} ON CONFLICT({quote(ID_COLUMN)}) DO NOTHING", values)
+                if cursor.rowcount == 0:
+                    conflicts[record_id] = (None, _current_revision(conn, record_id))
+            else:
+                cursor = conn.execute(
+                    f"UPDATE {TABLE} SET {assignments} WHERE {quote(ID_COLUMN)} = ? AND {revision} = ?",
+                    list(fields.values()) + [record_id, expected[record_id]],
+                )
+                if cursor.rowcount == 0:
+                    conflicts[record_id] = (expected[record_id], _current_revision(conn, record_id))
+            revisions[original_id] = _current_revision(conn, record_id)
+        if conflicts:
+            raise ConflictError(conflicts)
+        _bump_version(conn)
+    return revisions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="sqlite", description="Construit la base SQLite depuis la base JSON des établissements.")
+    parser.add_argument("--records", default=RECORDS_PATH, help="Base JSON des établissements")
+    parser.add_argument("--metadata", default=METADATA_PATH, help="Description des colonnes (noms_colonnes.csv)")
+    parser.add_argument("--output", default=DB_PATH, help="Base SQLite à écrire")
+    args = parser.parse_args(argv)
+
+    widget_types = pd.read_csv(args.metadata, sep=";").set_index("Column Names")["Type Widget"]
+    with open(args.records, "r") as f:
+        frame = pd.json_normalize(json.load(f))
+    # Les modifications encore dans le journal sont incluses
+    entries, _ = read_journal(journal_path(args.records))
+    frame = apply_changes(frame, fold(entries))
+    count = build_database(frame, widget_types, args.output)
+    print(f"Base SQLite écrite : {args.output} ({count} établissements)")
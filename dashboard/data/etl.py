@@ -0,0 +1,204 @@
+"""
+Préparation du jeu de données des établissements (remplace le notebook
+``notebook/Fiabilisation_donnees.ipynb``).
+
+Étapes, identiques à celles du notebook : lecture du classeur Excel,
+``clean_data``, ajout de la région (fusion avec ``departements-region.json``),
+``remove_empty_columns``, suppression des colonnes de prix, puis écriture de
+``data/dataset_to_use.csv`` et de son instantané Parquet.
+
+La chaîne est incrémentale :
+- les classeurs sont lus par l'étape d'ingestion (``ingest.py``) : en
+  parallèle, en flux, et relus seulement s'ils ont changé ;
+- chaque ligne source est hachée et associée à son ``_id`` ; seules les lignes
+  nouvelles ou modifiées depuis la dernière exécution sont nettoyées et
+  enrichies, les autres sont reprises de l'état enregistré ; les ``_id``
+  disparus de la source disparaissent du résultat.
+Un changement du référentiel des régions ou de la version de la chaîne
+invalide l'état et provoque un retraitement complet.
+
+Exécution (depuis la racine du dépôt) :
+    python -m dashboard.data etl [--source CLASSEUR ...] [--full]
+"""
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .ingest import INGEST_CACHE_DIR, ingest
+from .snapshot import CACHE_DIR, CSV_PATH, SNAPSHOT_PATH, build_snapshot, file_checksum, snapshot_checksum
+
+SOURCE_PATH = "./data/ base-etablissements residence seniors V1.xlsx"
+REGIONS_PATH = "./data/departements-region.json"
+ETL_CACHE_DIR = os.path.join(CACHE_DIR, "etl")
+STATE_PATH = os.path.join(ETL_CACHE_DIR, "state.pkl")
+# À incrémenter à chaque modification des étapes pour invalider l'état
+PIPELINE_VERSION = 1
+
+ID_COLUMN = "_id"
+REGION_COLUMN = "coordinates.region"
+DEPTCODE_COLUMN = "coordinates.deptcode"
+HASH_COLUMN = "_row_hash"
+
+# Colonnes retirées du jeu de données du tableau de bord
+DROPPED_COLUMNS = [
+    'updatedAt',
+    'ehpadPrice._id', 'ehpadPrice.updatedAt', 'ehpadPrice.prixHebPermCs',
+    'ehpadPrice.prixHebPermCd', 'ehpadPrice.prixHebPermCsa',
+    'ehpadPrice.prixHebPermCda', 'ehpadPrice.prixHebTempCs',
+    'ehpadPrice.prixHebTempCd', 'ehpadPrice.prixHebTempCsa',
+    'ehpadPrice.prixHebTempCda', 'ehpadPrice.tarifGir12',
+    'ehpadPrice.tarifGir34', 'ehpadPrice.tarifGir56',
+    'ehpadPrice.autrePrestation', 'ehpadPrice.autreTarifPrest',
+    'raPrice._id', 'raPrice.updatedAt', 'raPrice.PrixF1',
+    'raPrice.PrixF1ASH', 'raPrice.PrixF1Bis', 'raPrice.PrixF1BisASH',
+    'raPrice.PrixF2', 'raPrice.PrixF2ASH', 'raPrice.autreTarifPrest',
+    'raPrice.prestObligatoire',
+]
+
+
+def clean_data(df):
+    """
+    Nettoie les données :
+    - Convertit les valeurs None en NaN pour une meilleure gestion pandas
+    """
+    return df.where(pd.notnull(df), None)
+
+
+def remove_empty_columns(df, keep=(REGION_COLUMN,)):
+    """
+    Supprime les colonnes où toutes les valeurs sont None (hors colonnes ``keep``)
+    """
+    empty = [col for col in df.columns[df.isna().all()] if col not in keep]
+    return df.drop(columns=empty)
+
+
+def read_regions(path=REGIONS_PATH):
+    regions_df = pd.read_json(path, dtype={"num_dep": str})
+    regions_df["num_dep"] = regions_df["num_dep"].astype(str)
+    return regions_df[["num_dep", "region_name"]]
+
+
+def add_region(df, regions_df):
+    """
+    Ajoute la région à partir du code du département
+    """
+    merged_df = pd.merge(df, regions_df, left_on=DEPTCODE_COLUMN, right_on="num_dep", how="left")
+    merged_df.index = df.index
+    return merged_df.drop(columns=["num_dep"]).rename(columns={"region_name": REGION_COLUMN})
+
+
+def read_sources(paths, cache_dir=INGEST_CACHE_DIR):
+    """Premières feuilles des classeurs, lues en parallèle via le cache Parquet de l'ingestion."""
+    frames = ingest([(path, None) for path in paths], cache_dir)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def row_hashes(df):
+    """Empreinte de chaque ligne (toutes colonnes, dans l'ordre des colonnes)."""
+    columns = hashlib.sha256("\x1f".join(map(str, df.columns)).encode()).hexdigest()[:16]
+    return pd.util.hash_pandas_object(df, index=False).astype(str) + columns
+
+
+def _state_version(regions_path):
+    return f"v{PIPELINE_VERSION}-{file_checksum(regions_path)}"
+
+
+def load_state(path=STATE_PATH, version=None):
+    """Lignes traitées lors de la dernière exécution (vide si absentes ou obsolètes)."""
+    if os.path.exists(path):
+        state = pd.read_pickle(path)
+        if state.get("version") == version:
+            return state["frame"]
+    return None
+
+
+def save_state(frame, version, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pd.to_pickle({"version": version, "frame": frame}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def process(raw, regions_df, previous=None):
+    """
+    Lignes nettoyées et enrichies de la source ``raw``, en reprenant de
+    ``previous`` celles dont l'``_id`` et le contenu n'ont pas changé.
+    Retourne (lignes traitées avec leur empreinte, nombre de lignes retraitées).
+    """
+    raw = raw.reset_index(drop=True)
+    hashes = row_hashes(raw)
+    keys = pd.MultiIndex.from_arrays([raw[ID_COLUMN], hashes])
+    if previous is not None and len(previous):
+        known_rows = previous.drop_duplicates([ID_COLUMN, HASH_COLUMN]).set_index([ID_COLUMN, HASH_COLUMN], drop=False)
+        known = keys.isin(known_rows.index)
+    else:
+        known_rows, known = None, np.zeros(len(raw), dtype=bool)
+
+    changed = raw[~known]
+    parts = []
+    if len(changed):
+        fresh = add_region(clean_data(changed), regions_df)
+        fresh[HASH_COLUMN] = hashes[~known]
+        parts.append(fresh)
+    if known.any():
+        reused = known_rows.loc[keys[known]].copy()
+        reused.index = raw.index[known]
+        parts.append(reused)
+    if not parts:
+        return raw.assign(**{REGION_COLUMN: None, HASH_COLUMN: hashes}), 0
+    frame = pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+    return frame, len(changed)
+
+
+def finalize(frame):
+    """Jeu de données du tableau de bord : colonnes vides et colonnes de prix retirées."""
+    frame = remove_empty_columns(frame.drop(columns=[HASH_COLUMN]))
+    return frame.drop(columns=DROPPED_COLUMNS, errors="ignore")
+
+
+def write_csv(df, path=CSV_PATH):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp_path, header=True, encoding="utf-8", index=False)
+    os.replace(tmp_path, path)
+
+
+def run(sources=(SOURCE_PATH,), csv_path=CSV_PATH, snapshot_path=SNAPSHOT_PATH, regions_path=REGIONS_PATH,
+        state_path=STATE_PATH, cache_dir=INGEST_CACHE_DIR, full=False):
+    """Exécute la chaîne ; retourne (nombre de lignes, nombre de lignes retraitées)."""
+    raw = read_sources(sources, cache_dir)
+    if ID_COLUMN not in raw.columns:
+        raise ValueError(f"Colonne {ID_COLUMN} absente de la source")
+    version = _state_version(regions_path)
+    previous = None if full else load_state(state_path, version)
+    frame, reprocessed = process(raw, read_regions(regions_path), previous)
+    save_state(frame, version, state_path)
+
+    # Le CSV n'est réécrit que si des lignes ont changé, disparu ou changé de place
+    unchanged = previous is not None and np.array_equal(frame[HASH_COLUMN].to_numpy(), previous[HASH_COLUMN].to_numpy())
+    if not unchanged or not os.path.exists(csv_path):
+        write_csv(finalize(frame), csv_path)
+    checksum = file_checksum(csv_path)
+    if snapshot_checksum(snapshot_path) != checksum:
+        build_snapshot(csv_path, snapshot_path, checksum)
+    return len(frame), reprocessed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="etl", description="Prépare le jeu de données des établissements.")
+    parser.add_argument("--source", nargs="+", default=[SOURCE_PATH], help="Classeur(s) Excel source")
+    parser.add_argument("--regions", default=REGIONS_PATH, help="Référentiel département -> région (JSON)")
+    parser.add_argument("--csv", default=CSV_PATH, help="CSV à écrire")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH, help="Instantané Parquet à écrire")
+    parser.add_argument("--full", action="store_true", help="Retraite toutes les lignes")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        rows, reprocessed = run(args.source, args.csv, args.snapshot, args.regions, full=args.full)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    print(f"{args.csv} : {rows} lignes, {reprocessed} retraitée(s) en {time.perf_counter() - start:.1f} s")
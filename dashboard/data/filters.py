@@ -0,0 +1,181 @@
+"""
+Moteur de filtres compilés pour les cartes.
+
+Au chargement, chaque critère élémentaire est précalculé sous forme de masque
+de bits compacté (``np.packbits``) : un masque par indicateur de type et par
+valeur de région, de département et de statut juridique, ainsi qu'un index
+trié des capacités pour les requêtes par intervalle. Un ``FilterState`` est
+compilé en un unique masque combiné par ET bit à bit, évalué une seule fois ;
+seul le résultat final est matérialisé en DataFrame.
+"""
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+
+from .geo import CITY_COLUMN, DEPARTMENT_COLUMN, REGION_COLUMN, group_positions
+
+# Types de résidence proposés dans les filtres et colonne indicatrice associée
+RESIDENCE_TYPES = {
+    "EHPAD": "IsEHPAD",
+    "EHPA": "IsEHPA",
+    "ESLD": "IsESLD",
+    "Résidence Autonomie": "IsRA",
+    "Accueil de Jour": "IsAJA",
+}
+
+CAPACITY_COLUMN = "capacity"
+GROUP_COLUMN = "Nom_Entreprise"
+CATEGORY_COLUMNS = [REGION_COLUMN, DEPARTMENT_COLUMN, "legal_status"]
+
+
+def excluded_types(selection):
+    """Colonnes indicatrices des types de résidence non sélectionnés."""
+    selection = selection or []
+    return frozenset(col for label, col in RESIDENCE_TYPES.items() if label not in selection)
+
+
+@dataclass(frozen=True)
+class FilterState:
+    """État des filtres de la barre latérale (None = pas de filtre)."""
+
+    region: str = None
+    department: str = None
+    city: str = None
+    capacity_min: float = None
+    capacity_max: float = None
+    # Indicateurs devant être faux (types de résidence désélectionnés)
+    excluded_types: frozenset = field(default_factory=frozenset)
+    group: str = None
+
+
+class FilterResult:
+    """Résultat d'un filtrage : positions des lignes retenues et indicateurs clés."""
+
+    __slots__ = ("positions", "count", "capacity_total")
+
+    def __init__(self, positions, capacity_total):
+        positions.flags.writeable = False
+        self.positions = positions
+        self.count = len(positions)
+        self.capacity_total = capacity_total
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes
+
+    def index_of(self, position):
+        """Rang d'une ligne de la table dans le résultat (recherche dichotomique), ou None."""
+        if position is None:
+            return None
+        index = int(np.searchsorted(self.positions, position))
+        if index < self.count and self.positions[index] == position:
+            return index
+        return None
+
+
+class FilterEngine:
+    """Index de masques de bits pour évaluer un ``FilterState`` en une passe."""
+
+    def __init__(self, frame, geo):
+        self.frame = frame
+        self.geo = geo
+        self.size = len(frame)
+
+        # Un masque par indicateur : la ligne passe si l'indicateur vaut faux
+        # (une valeur inconnue est exclue, comme avec `df[col] == 0`)
+        self._not_type = {
+            col: self._pack(frame[col].eq(False).fillna(False).to_numpy(dtype=bool))
+            for col in RESIDENCE_TYPES.values()
+        }
+        # Un masque par valeur catégorielle
+        self._category = {
+            col: {value: self._pack_positions(rows) for value, rows in group_positions(frame[col]).items()}
+            for col in CATEGORY_COLUMNS
+        }
+        # Index trié des capacités (les valeurs manquantes sont écartées)
+        capacity = frame[CAPACITY_COLUMN].to_numpy(dtype=float)
+        known = np.flatnonzero(~np.isnan(capacity))
+        order = np.argsort(capacity[known], kind="stable")
+        self._capacity_rows = known[order]
+        self._capacity_sorted = capacity[self._capacity_rows]
+        self._capacity = capacity
+
+        self._groups = None
+        self._all = self._pack(np.ones(self.size, dtype=bool))
+
+    def _pack(self, mask):
+        return np.packbits(mask)
+
+    def _pack_positions(self, positions):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[positions] = True
+        return self._pack(mask)
+
+    def _capacity_mask(self, low, high):
+        start = 0 if low is None else np.searchsorted(self._capacity_sorted, low, side="left")
+        stop = len(self._capacity_sorted) if high is None else np.searchsorted(self._capacity_sorted, high, side="right")
+        return self._pack_positions(self._capacity_rows[start:stop])
+
+    def _group_mask(self, group):
+        if self._groups is None:
+            self._groups = group_positions(self.frame[GROUP_COLUMN])
+        return self._pack_positions(self._groups.get(group, []))
+
+    def _category_mask(self, column, value):
+        masks = self._category[column]
+        if value not in masks:
+            return self._pack_positions([])
+        return masks[value]
+
+    def normalize(self, state):
+        """
+        Forme canonique d'un état : les bornes de capacité sont ramenées à
+        l'étendue des données, si bien que deux états équivalents partagent la
+        même clé de cache.
+        """
+        if not len(self._capacity_sorted):
+            return state
+        low, high = self._capacity_sorted[0], self._capacity_sorted[-1]
+        capacity_min = state.capacity_min
+        capacity_max = state.capacity_max
+        if capacity_min is not None:
+            capacity_min = float(min(max(capacity_min, low), high))
+        if capacity_max is not None:
+            capacity_max = float(max(min(capacity_max, high), low))
+        return replace(state, capacity_min=capacity_min, capacity_max=capacity_max,
+                       excluded_types=frozenset(state.excluded_types))
+
+    def compile(self, state):
+        """Liste des masques compactés correspondant aux critères actifs."""
+        masks = []
+        if state.region is not None:
+            masks.append(self._category_mask(REGION_COLUMN, state.region))
+        if state.department is not None:
+            masks.append(self._category_mask(DEPARTMENT_COLUMN, state.department))
+        if state.city is not None:
+            masks.append(self._pack_positions(self.geo.rows(CITY_COLUMN, state.city)))
+        if state.capacity_min is not None or state.capacity_max is not None:
+            masks.append(self._capacity_mask(state.capacity_min, state.capacity_max))
+        masks.extend(self._not_type[col] for col in sorted(state.excluded_types))
+        if state.group is not None:
+            masks.append(self._group_mask(state.group))
+        return masks
+
+    def mask(self, state):
+        """Masque booléen combiné (une seule évaluation de tous les critères)."""
+        masks = self.compile(state)
+        packed = np.bitwise_and.reduce(masks) if masks else self._all
+        return np.unpackbits(packed, count=self.size).astype(bool)
+
+    def positions(self, state):
+        """Positions des lignes retenues par l'état des filtres."""
+        return np.flatnonzero(self.mask(state))
+
+    def result(self, state):
+        """Positions retenues et indicateurs clés (nombre, capacité totale)."""
+        positions = self.positions(state)
+        return FilterResult(positions, float(np.nansum(self._capacity[positions])))
+
+    def select(self, state):
+        """Matérialise uniquement le résultat final du filtrage."""
+        return self.frame.take(self.positions(state))
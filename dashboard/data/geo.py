@@ -0,0 +1,101 @@
+"""
+Index géographique région → département → ville.
+
+Construit une seule fois au chargement du jeu de données, il fournit les listes
+triées des filtres « Localisation » et les positions des lignes de chaque nœud,
+ce qui remplace les parcours complets de la table par des accès dictionnaire.
+"""
+import unicodedata
+
+import numpy as np
+
+REGION_COLUMN = "coordinates.region"
+DEPARTMENT_COLUMN = "coordinates.deptname"
+CITY_COLUMN = "coordinates.city"
+
+
+def sort_key(value):
+    """Clé de tri insensible aux accents et à la casse (« Île-de-France » après « Hauts-de-France »)."""
+    normalized = unicodedata.normalize("NFKD", str(value))
+    return "".join(c for c in normalized if not unicodedata.combining(c)).casefold()
+
+
+def _sorted(values):
+    return sorted(values, key=sort_key)
+
+
+def group_positions(series):
+    """Positions des lignes pour chaque valeur non manquante d'une colonne."""
+    codes, uniques = series.factorize()
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {
+        value: order[bounds[i]:bounds[i + 1]]
+        for i, value in enumerate(uniques)
+    }
+
+
+class GeoIndex:
+    """Hiérarchie triée région → département → ville avec les positions des lignes."""
+
+    def __init__(self, frame):
+        self.size = len(frame)
+        self._rows = {
+            REGION_COLUMN: group_positions(frame[REGION_COLUMN]),
+            DEPARTMENT_COLUMN: group_positions(frame[DEPARTMENT_COLUMN]),
+            CITY_COLUMN: group_positions(frame[CITY_COLUMN]),
+        }
+        self.regions = _sorted(self._rows[REGION_COLUMN])
+        self.departments = _sorted(self._rows[DEPARTMENT_COLUMN])
+        self.cities = _sorted(self._rows[CITY_COLUMN])
+
+        # Hiérarchie : valeurs enfants présentes sous chaque nœud parent
+        pairs = frame[[REGION_COLUMN, DEPARTMENT_COLUMN, CITY_COLUMN]].astype(object)
+        self._departments_by_region = self._children(pairs, REGION_COLUMN, DEPARTMENT_COLUMN)
+        self._cities_by_region = self._children(pairs, REGION_COLUMN, CITY_COLUMN)
+        self._cities_by_department = self._children(pairs, DEPARTMENT_COLUMN, CITY_COLUMN)
+
+    @staticmethod
+    def _children(pairs, parent_col, child_col):
+        unique_pairs = pairs[[parent_col, child_col]].dropna().drop_duplicates()
+        children = {}
+        for parent, child in unique_pairs.itertuples(index=False):
+            children.setdefault(parent, []).append(child)
+        return {parent: _sorted(values) for parent, values in children.items()}
+
+    def departments_of(self, region=None):
+        """Départements d'une région (tous si aucune région)."""
+        if region is None:
+            return self.departments
+        return self._departments_by_region.get(region, [])
+
+    def cities_of(self, region=None, department=None):
+        """Villes d'un département, sinon d'une région (toutes si aucun des deux)."""
+        if department is not None:
+            return self._cities_by_department.get(department, [])
+        if region is not None:
+            return self._cities_by_region.get(region, [])
+        return self.cities
+
+    def rows(self, column, value):
+        """Positions (triées) des lignes dont la colonne vaut ``value``."""
+        return self._rows[column].get(value, np.empty(0, dtype=np.intp))
+
+    def positions(self, region=None, department=None, city=None):
+        """
+        Positions des lignes correspondant à la sélection, ou None si aucun
+        filtre géographique n'est actif.
+        """
+        selection = [
+            self.rows(column, value)
+            for column, value in (
+                (REGION_COLUMN, region), (DEPARTMENT_COLUMN, department), (CITY_COLUMN, city)
+            )
+            if value is not None
+        ]
+        if not selection:
+            return None
+        result = selection[0]
+        for rows in selection[1:]:
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
@@ -0,0 +1,96 @@
+"""
+Vue paginée de la base des établissements pour l'éditeur.
+
+Au lieu d'envoyer toute la table au navigateur à chaque rerun, on n'en extrait
+qu'une page. Les ordres de tri sont précalculés une fois par colonne (à la
+première demande) et les textes en minuscules servant aux filtres « contient »
+sont préparés de la même façon ; les positions d'une combinaison tri / filtres
+sont conservées dans un cache LRU. Chaque rerun ne matérialise ainsi que les
+lignes de la page affichée.
+"""
+import threading
+
+import numpy as np
+
+from .cache import ResultCache
+
+PAGE_SIZES = [25, 50, 100, 250]
+# Combinaisons tri / filtres conservées
+VIEW_ENTRIES = 32
+
+
+def _sort_order(series):
+    """Positions triées (tri stable) et nombre de valeurs renseignées, placées en tête."""
+    series = series.reset_index(drop=True)
+    valid = series.notna().to_numpy()
+    known = series[valid]
+    try:
+        order = known.sort_values(kind="stable").index.to_numpy()
+    except TypeError:
+        # Colonne de types mélangés : tri sur la représentation textuelle
+        order = known.astype(str).sort_values(kind="stable").index.to_numpy()
+    return np.concatenate([order, np.flatnonzero(~valid)]), len(order)
+
+
+class RecordGrid:
+    """Pagination, tri et filtres d'une table partagée, sans la copier."""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.columns = list(frame.columns)
+        self._orders = {}
+        self._texts = {}
+        self._lock = threading.Lock()
+        self._views = ResultCache(max_entries=VIEW_ENTRIES)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def order(self, column, descending=False):
+        """Ordre de tri précalculé d'une colonne (valeurs manquantes en dernier)."""
+        with self._lock:
+            cached = self._orders.get(column)
+        if cached is None:
+            cached = _sort_order(self.frame[column])
+            with self._lock:
+                self._orders[column] = cached
+        order, n_valid = cached
+        if descending:
+            return np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+        return order
+
+    def _text(self, column):
+        with self._lock:
+            text = self._texts.get(column)
+        if text is None:
+            text = self.frame[column].astype(str).str.lower()
+            with self._lock:
+                self._texts[column] = text
+        return text
+
+    def mask(self, filters):
+        """Lignes dont chaque colonne filtrée contient le texte demandé (sans casse)."""
+        mask = np.ones(len(self.frame), dtype=bool)
+        for column, text in filters:
+            mask &= self._text(column).str.contains(text.lower(), regex=False).to_numpy()
+        return mask
+
+    def positions(self, sort_by=None, descending=False, filters=()):
+        """Positions des lignes dans l'ordre affiché (mises en cache par combinaison)."""
+        filters = tuple(sorted((column, text) for column, text in dict(filters).items() if text))
+        key = (sort_by, bool(descending), filters)
+
+        def compute():
+            positions = self.order(sort_by, descending) if sort_by else np.arange(len(self.frame))
+            if filters:
+                positions = positions[self.mask(filters)[positions]]
+            positions.flags.writeable = False
+            return positions
+
+        return self._views.get_or_compute(key, compute)
+
+    def page(self, number, size, sort_by=None, descending=False, filters=()):
+        """Lignes de la page ``number`` (à partir de 1) et nombre total de lignes retenues."""
+        positions = self.positions(sort_by, descending, filters)
+        start = max(number - 1, 0) * size
+        return self.frame.take(positions[start:start + size]), len(positions)
@@ -0,0 +1,176 @@
+"""
+Lecture des classeurs Excel sources.
+
+Chaque feuille est lue en flux (openpyxl en lecture seule) par paquets de
+``CHUNK_ROWS`` lignes : la mémoire utilisée reste bornée quelle que soit la
+taille du classeur. Chaque paquet est écrit dans un fichier Parquet du cache
+``data/cache/ingest/<feuille>-<mtime>-<empreinte>/`` ; une feuille déjà lue
+n'est plus relue tant que le fichier source ne change pas (date de
+modification et empreinte du contenu). Les feuilles sont lues en parallèle,
+une par processus.
+
+Les noms de colonnes sont normalisés comme dans ``ImportToMongoDB.ipynb``
+(espaces et retours à la ligne remplacés par « _ ») et les colonnes sans
+en-tête (numéros de ligne) sont ignorées.
+
+Lecture manuelle (depuis la racine du dépôt) :
+    python -m dashboard.data ingest [--source CLASSEUR[:FEUILLE] ...] [--workers N]
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .snapshot import CACHE_DIR
+
+INGEST_CACHE_DIR = os.path.join(CACHE_DIR, "ingest")
+# Classeurs sources et feuille à lire (None : première feuille)
+SOURCES = [
+    ("./data/7000 EHPAD/base-etablissement senior sup7000.xlsx", None),
+    ("./data/7000 EHPAD/base-etablissement senior 7051 routage catalan.xlsx", None),
+    ("./data/7000 EHPAD/Liste des EHPAD AdresseMail.xlsx", None),
+    ("./data/EPHAD FRANCE .xlsx", "Résultats"),
+]
+CHUNK_ROWS = 5000
+# À incrémenter à chaque modification de la lecture pour invalider le cache
+INGEST_VERSION = 1
+
+
+def normalize_column(column):
+    """
+    Nom de colonne sans espaces ni retours à la ligne (comme ImportToMongoDB.ipynb).
+    Les blancs de début et de fin sont retirés avant, ce qui préserve « _id ».
+    """
+    return re.sub(r'\s+|\n', '_', str(column).strip())
+
+
+def _content_checksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256(f"v{INGEST_VERSION}".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sheet_stem(path, sheet=None):
+    stem = normalize_column(os.path.splitext(os.path.basename(path))[0])
+    return stem if sheet is None else f"{stem}-{normalize_column(sheet)}"
+
+
+def sheet_cache_path(path, sheet=None, cache_dir=INGEST_CACHE_DIR):
+    """Dossier de cache d'une feuille, propre à la date de modification et au contenu du fichier."""
+    checksum = _content_checksum(path)
+    return os.path.join(cache_dir, f"{_sheet_stem(path, sheet)}-{os.stat(path).st_mtime_ns}-{checksum[:16]}")
+
+
+def _remove_stale(path, sheet, cache_dir, current):
+    """Supprime les caches des versions précédentes de la feuille."""
+    stale = re.compile(re.escape(_sheet_stem(path, sheet)) + r"-\d+-[0-9a-f]{16}")
+    for name in os.listdir(cache_dir):
+        if stale.fullmatch(name) and os.path.join(cache_dir, name) != current:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def _chunk_table(header, rows):
+    """Paquet de lignes en table Arrow (colonne de types mélangés convertie en texte)."""
+    import pyarrow as pa
+
+    arrays = []
+    for index in range(len(header)):
+        values = [row[index] if index < len(row) else None for row in rows]
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=header)
+
+
+def parse_sheet(path, sheet=None, cache_dir=INGEST_CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    """Lit une feuille en flux vers son cache Parquet (un fichier par paquet) ; retourne le dossier."""
+    import openpyxl
+    import pyarrow.parquet as pq
+
+    target = sheet_cache_path(path, sheet, cache_dir)
+    if os.path.isdir(target):
+        return target
+
+    tmp_dir = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        # Colonnes retenues : celles qui ont un en-tête
+        keep = [i for i, name in enumerate(header) if name is not None]
+        names = [normalize_column(header[i]) for i in keep]
+        chunk, part = [], 0
+        for row in rows:
+            if any(value is not None for value in row):
+                chunk.append([row[i] if i < len(row) else None for i in keep])
+            if len(chunk) >= chunk_rows:
+                pq.write_table(_chunk_table(names, chunk), os.path.join(tmp_dir, f"part-{part:05d}.parquet"))
+                chunk, part = [], part + 1
+        if chunk or part == 0:
+            pq.write_table(_chunk_table(names, chunk), os.path.join(tmp_dir, f"part-{part:05d}.parquet"))
+    finally:
+        workbook.close()
+
+    try:
+        os.replace(tmp_dir, target)
+    except OSError:
+        # Feuille écrite entre-temps par un autre processus
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _remove_stale(path, sheet, cache_dir, target)
+    return target
+
+
+def read_sheet(cache_path):
+    """Relit une feuille depuis son cache Parquet."""
+    parts = sorted(name for name in os.listdir(cache_path) if name.endswith(".parquet"))
+    frames = [pd.read_parquet(os.path.join(cache_path, name)) for name in parts]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def ingest(sources=SOURCES, cache_dir=INGEST_CACHE_DIR, workers=None, chunk_rows=CHUNK_ROWS):
+    """
+    Lit les feuilles ``sources`` (liste de (classeur, feuille)) en parallèle ;
+    retourne les DataFrame dans l'ordre des sources.
+    """
+    sources = [(path, sheet) for path, sheet in sources]
+    workers = workers or min(len(sources), os.cpu_count() or 1)
+    if workers <= 1 or len(sources) == 1:
+        paths = [parse_sheet(path, sheet, cache_dir, chunk_rows) for path, sheet in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(parse_sheet, path, sheet, cache_dir, chunk_rows) for path, sheet in sources]
+            paths = [future.result() for future in futures]
+    return [read_sheet(path) for path in paths]
+
+
+def parse_source(text):
+    """« classeur.xlsx:Feuille » -> (classeur, feuille) ; sans feuille, la première est lue."""
+    if os.path.exists(text) or ":" not in text:
+        return text, None
+    path, _, sheet = text.rpartition(":")
+    return path, sheet or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ingest", description="Lit les classeurs Excel sources vers le cache Parquet.")
+    parser.add_argument("--source", nargs="+", type=parse_source, default=SOURCES,
+                        help="Classeur(s) à lire, éventuellement suivis de :FEUILLE")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : un par feuille)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Lignes lues par paquet")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    frames = ingest(args.source, workers=args.workers, chunk_rows=args.chunk_rows)
+    for (path, sheet), frame in zip(args.source, frames):
+        print(f"{path}{f' [{sheet}]' if sheet else ''} : {len(frame)} lignes, {len(frame.columns)} colonnes")
+    print(f"Lecture terminée en {time.perf_counter() - start:.1f} s")
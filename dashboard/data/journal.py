@@ -0,0 +1,430 @@
+"""
+Journal des modifications de la base des établissements.
+
+Plutôt que de réécrire tout ``base-etablissement.json`` à chaque création ou
+modification, l'éditeur ajoute une ligne JSON par changement dans un journal
+(``*.journal.jsonl``), écrite en un seul appel puis synchronisée sur disque
+(``fsync``). Une ligne incomplète en fin de journal (arrêt brutal pendant
+l'écriture) est ignorée à la relecture.
+
+Au chargement, la base est rejouée : instantané JSON puis changements du
+journal. Le compactage replie le journal dans l'instantané (écriture atomique
+par fichier temporaire et ``os.replace``) puis vide le journal ; il est lancé
+à la demande (``python -m dashboard.data compact``) ou en tâche de fond lorsque
+le journal dépasse ``COMPACT_BYTES``. Les changements sont des « upserts » de
+valeurs complètes : rejouer un changement déjà compacté est sans effet.
+
+Chaque établissement porte un numéro de révision (``_rev``) incrémenté à chaque
+changement. Une écriture (``commit``) indique la révision sur laquelle
+l'utilisateur a travaillé : elle n'est acceptée que si la révision courante est
+toujours la même (comparer-et-échanger), sinon ``ConflictError`` est levée. Le
+verrou de fichier n'est tenu que le temps de cette vérification et de l'ajout
+au journal (ou du compactage).
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+RECORDS_PATH = "./data/base-etablissement.json"
+ID_COLUMN = "_id"
+REVISION_COLUMN = "_rev"
+# Taille du journal au-delà de laquelle un compactage est lancé en tâche de fond
+COMPACT_BYTES = int(float(os.environ.get("EHPAD_JOURNAL_COMPACT_MB", 1)) * 1024 * 1024)
+
+# Sérialise les écritures du journal et le compactage au sein du processus
+_lock = threading.Lock()
+# Un seul compactage à la fois
+_compact_lock = threading.Lock()
+_compacting = threading.Event()
+# Révisions lues dans le journal, mises à jour incrémentalement : chemin -> état
+_revisions = {}
+
+
+class ConflictError(Exception):
+    """Un établissement a été modifié (ou créé) entre-temps par un autre utilisateur."""
+
+    def __init__(self, conflicts):
+        # identifiant -> (révision attendue, révision courante)
+        self.conflicts = conflicts
+        details = ", ".join(
+            f"{record_id} (attendue {expected}, actuelle {current})"
+            for record_id, (expected, current) in conflicts.items()
+        )
+        super().__init__(f"Modification concurrente : {details}")
+
+
+@contextmanager
+def file_lock(path):
+    """Verrou exclusif inter-processus sur ``path`` (fichier ``.lock`` associé)."""
+    with open(f"{path}.lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def journal_path(records_path=RECORDS_PATH):
+    """Chemin du journal associé à une base JSON."""
+    return os.path.splitext(records_path)[0] + ".journal.jsonl"
+
+
+def json_default(value):
+    """Sérialise les dates et les scalaires numpy restants."""
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def _clean(value):
+    """Remplace les valeurs manquantes (NaN, NaT) par None."""
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    return value
+
+
+def _fsync_dir(path):
+    """Synchronise le répertoire (création ou renommage de fichier), si possible."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path, data):
+    """Écrit ``data`` (octets) dans un fichier temporaire synchronisé, puis le renomme."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def append_changes(changes, path, revisions=None):
+    """
+    Ajoute au journal un changement par établissement : ``changes`` associe un
+    identifiant aux champs modifiés (clés aplaties, ex. ``coordinates.city``) ;
+    ``revisions`` donne la nouvelle révision de chaque établissement.
+    """
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    revisions = revisions or {}
+    lines = [
+        json.dumps(
+            {"op": "upsert", ID_COLUMN: record_id, "rev": revisions.get(record_id), "at": now,
+             "fields": {key: _clean(value) for key, value in fields.items()}},
+            default=json_default, ensure_ascii=False,
+        ) + "\n"
+        for record_id, fields in changes.items()
+    ]
+    data = "".join(lines).encode("utf-8")
+    with _lock:
+        created = not os.path.exists(path)
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Une écriture interrompue laisse une ligne sans fin : on la clôt
+            size = os.fstat(fd).st_size
+            if size and os.lseek(fd, size - 1, os.SEEK_SET) >= 0 and os.read(fd, 1) != b"\n":
+                data = b"\n" + data
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    if created:
+        _fsync_dir(path)
+    return len(lines)
+
+
+def read_journal(path):
+    """
+    Changements du journal et nombre d'octets lus. Une dernière ligne
+    incomplète est laissée de côté et une ligne illisible (écriture
+    interrompue puis close) est ignorée.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, "rb") as f:
+        data = f.read()
+    return _parse(data)
+
+
+def _parse(data):
+    entries = []
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            pass
+        offset += len(line)
+    return entries, offset
+
+
+def fold(entries):
+    """Regroupe les changements par identifiant (le plus récent l'emporte), dans l'ordre d'apparition."""
+    changes = {}
+    for entry in entries:
+        if entry.get("op") == "upsert":
+            fields = changes.setdefault(entry[ID_COLUMN], {})
+            fields.update(entry["fields"])
+            if entry.get("rev") is not None:
+                fields[REVISION_COLUMN] = entry["rev"]
+    return changes
+
+
+def record_key(record_id):
+    """
+    Clé de comparaison des identifiants (numpy, flottants entiers et chaînes) :
+    une chaîne numérique (« 17 », saisie dans un formulaire) désigne le même
+    établissement que l'entier 17.
+    """
+    if hasattr(record_id, "item"):
+        record_id = record_id.item()
+    if isinstance(record_id, float) and record_id.is_integer():
+        return int(record_id)
+    if isinstance(record_id, str):
+        text = record_id.strip()
+        if text.isascii() and text.lstrip("-").isdigit():
+            return int(text)
+    return record_id
+
+
+def apply_changes(frame, changes, id_column=ID_COLUMN):
+    """
+    Applique des changements regroupés à une table aplatie, sans la modifier :
+    seules les colonnes touchées sont recopiées, les nouveaux établissements
+    sont ajoutés en fin de table.
+    """
+    if not changes:
+        return frame
+    positions = {}
+    for position, record_id in enumerate(frame[id_column].tolist()):
+        positions.setdefault(record_key(record_id), position)
+
+    updates = {}
+    new_records = []
+    for record_id, fields in changes.items():
+        position = positions.get(record_key(record_id))
+        if position is None:
+            new_records.append({**fields, id_column: record_id})
+            continue
+        for column, value in fields.items():
+            updates.setdefault(column, []).append((position, value))
+
+    frame = frame.copy(deep=False)
+    for column, values in updates.items():
+        if column in frame.columns:
+            data = frame[column].to_numpy(dtype=object, copy=True)
+        else:
+            data = np.full(len(frame), None, dtype=object)
+        for position, value in values:
+            data[position] = value
+        frame[column] = pd.Series(data, index=frame.index).infer_objects()
+
+    if new_records:
+        frame = pd.concat([frame, pd.json_normalize(new_records)], ignore_index=True)
+    return frame
+
+
+def journal_revisions(path):
+    """
+    Révision la plus récente de chaque établissement présent dans le journal.
+    Seule la partie ajoutée depuis le dernier appel est relue ; l'état repart
+    de zéro si le journal a été remplacé (compactage). À appeler sous ``file_lock``.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _revisions.pop(path, None)
+        return {}
+    identity = (stat.st_dev, stat.st_ino)
+    state = _revisions.get(path)
+    if state is None or state[0] != identity or stat.st_size < state[1]:
+        state = _revisions[path] = [identity, 0, {}]
+    if stat.st_size > state[1]:
+        with open(path, "rb") as f:
+            f.seek(state[1])
+            entries, consumed = _parse(f.read())
+        for entry in entries:
+            if entry.get("op") == "upsert":
+                state[2][record_key(entry[ID_COLUMN])] = entry.get("rev") or 0
+        state[1] += consumed
+    return state[2]
+
+
+def commit(changes, path, expected=None, base_revisions=None):
+    """
+    Ajoute des changements au journal par comparer-et-échanger. ``expected``
+    associe à un identifiant la révision sur laquelle l'utilisateur a travaillé
+    (None pour une création : l'établissement ne doit pas exister) ; les
+    identifiants absents ne sont pas vérifiés. ``base_revisions`` donne les
+    révisions de la base compactée (identifiant -> révision). Lève
+    ``ConflictError`` sans rien écrire si une révision a changé.
+    Retourne les nouvelles révisions.
+    """
+    expected = expected or {}
+    with file_lock(path):
+        journal = journal_revisions(path)
+        base = base_revisions() if base_revisions is not None else {}
+
+        def current(record_id):
+            key = record_key(record_id)
+            return journal[key] if key in journal else base.get(key)
+
+        conflicts = {
+            record_id: (revision, current(record_id))
+            for record_id, revision in expected.items()
+            if current(record_id) != revision
+        }
+        if conflicts:
+            raise ConflictError(conflicts)
+        revisions = {record_id: (current(record_id) or 0) + 1 for record_id in changes}
+        append_changes(changes, path, revisions)
+    return revisions
+
+
+def _assign(record, key, value):
+    """Affecte une clé aplatie dans un enregistrement, en respectant sa structure (imbriquée ou non)."""
+    if key in record or "." not in key:
+        record[key] = value
+        return
+    head, rest = key.split(".", 1)
+    child = record.get(head)
+    if isinstance(child, dict):
+        _assign(child, rest, value)
+    else:
+        record[key] = value
+
+
+def _nest(fields):
+    """Enregistrement imbriqué (comme dans la base d'origine) à partir de clés aplaties."""
+    record = {}
+    for key, value in fields.items():
+        *parents, leaf = key.split(".")
+        node = record
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return record
+
+
+def merge_changes(records, changes):
+    """Applique des changements (identifiant -> champs aplatis) à la liste des enregistrements, en place."""
+    positions = {}
+    for position, record in enumerate(records):
+        positions.setdefault(record_key(record.get(ID_COLUMN)), position)
+    for record_id, fields in changes.items():
+        position = positions.get(record_key(record_id))
+        if position is None:
+            records.append(_nest({ID_COLUMN: record_id, **fields}))
+            continue
+        for key, value in fields.items():
+            _assign(records[position], key, value)
+    return records
+
+
+def write_records(records, path):
+    """Écrit la base JSON de façon atomique."""
+    data = json.dumps(records, indent=4, default=json_default, ensure_ascii=False)
+    _write_atomic(path, data.encode("utf-8"))
+
+
+def reset_journal(path):
+    """Vide le journal (après une réécriture complète de la base)."""
+    with file_lock(path), _lock:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def compact(records_path=RECORDS_PATH, path=None):
+    """
+    Replie le journal dans la base JSON puis retire les changements repliés.
+    Retourne le nombre de changements compactés.
+    """
+    path = path or journal_path(records_path)
+    with _compact_lock, file_lock(path):
+        return _compact(records_path, path)
+
+
+def _compact(records_path, path):
+    _revisions.pop(path, None)
+    entries, offset = read_journal(path)
+    if not entries:
+        return 0
+    with open(records_path, "r") as f:
+        records = json.load(f)
+
+    write_records(merge_changes(records, fold(entries)), records_path)
+
+    # Les changements ajoutés pendant le compactage sont conservés
+    with _lock:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remainder = f.read()
+        if remainder:
+            _write_atomic(path, remainder)
+        else:
+            os.remove(path)
+    return len(entries)
+
+
+def compact_in_background(records_path=RECORDS_PATH, threshold=COMPACT_BYTES):
+    """Lance un compactage en tâche de fond si le journal dépasse le seuil."""
+    path = journal_path(records_path)
+    if not os.path.exists(path) or os.path.getsize(path) < threshold or _compacting.is_set():
+        return False
+    _compacting.set()
+
+    def run():
+        try:
+            compact(records_path, path)
+        finally:
+            _compacting.clear()
+
+    threading.Thread(target=run, name="journal-compaction", daemon=True).start()
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="compact", description="Replie le journal des modifications dans la base JSON.")
+    parser.add_argument("--records", default=RECORDS_PATH, help="Base JSON des établissements")
+    args = parser.parse_args(argv)
+
+    count = compact(args.records)
+    if count:
+        print(f"{count} changement(s) compacté(s) dans {args.records}")
+    else:
+        print(f"Journal vide : {journal_path(args.records)}")
@@ -0,0 +1,437 @@
+"""
+Collections MongoDB : chargement et requêtes des pages cartographiques.
+
+Chargement (remplace les ``insert_many`` de ``notebook/ImportToMongoDB.ipynb``).
+
+Les documents sont envoyés par lots de ``BATCH_SIZE`` en écritures groupées non
+ordonnées (``bulk_write(ordered=False)``) de remplacements avec ``upsert`` :
+chaque document est identifié par son ``_id`` (à défaut son ``noFinesset``), si
+bien qu'un nouveau chargement remplace les documents au lieu de les dupliquer
+et qu'un chargement interrompu peut simplement être relancé. Les index sont
+créés avant le chargement ; plusieurs lots sont écrits en parallèle et la
+progression (documents, débit) est affichée au fil de l'eau.
+
+L'URI de connexion est lue dans ``EHPAD_MONGO_URI`` (jamais dans le code) ;
+l'URI ``mongomock://`` utilise une base en mémoire (paquet mongomock) pour les
+essais, où chaque document est écrit par ``replace_one``. La base JSON des
+établissements est lue au fil du fichier, un lot après l'autre. Chargement
+(depuis la racine du dépôt) :
+    python -m dashboard.data mongo [--uri URI] [--collection etablissements dirigeants]
+
+Requêtes (``EHPAD_BACKEND=mongo``) : les filtres de la barre latérale sont
+traduits en un ``$match`` (servi par les index composés créés au chargement,
+champs d'égalité puis capacité) et seuls les champs tracés sont projetés ;
+la table de la carte des zones est agrégée par ``$group`` côté serveur.
+La table des établissements des pages (options des filtres, recherche, détails
+du point sélectionné) est lue dans la même collection (``read_frame``), et
+relue après chaque chargement (``collection_version``) : les points tracés et
+leurs détails viennent toujours des mêmes documents.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from .database import BACKEND, TYPE_PREFIX
+from .filters import CAPACITY_COLUMN
+from .geo import CITY_COLUMN, DEPARTMENT_COLUMN, REGION_COLUMN
+from .ingest import ingest
+from .journal import ID_COLUMN, RECORDS_PATH, fold, journal_path, merge_changes, read_journal, record_key
+from .snapshot import BOOL_COLUMNS, COLUMNS, apply_schema
+from .zones import RADIUS_COLUMN, ZONE_KEYS, classify_regions, zone_radius
+
+MONGO_URI = os.environ.get("EHPAD_MONGO_URI", "mongodb://localhost:27017/")
+DATABASE = "Ehpad"
+ESTABLISHMENTS = "base-emplacement"
+EXECUTIVES = "dirigeant"
+EXECUTIVES_SOURCE = ("./data/EPHAD FRANCE .xlsx", "Résultats")
+BATCH_SIZE = 1000
+WORKERS = 4
+# Taille des lectures de la base JSON (caractères)
+CHUNK_SIZE = 1 << 20
+# Collection des versions : date du dernier chargement de chaque collection
+VERSIONS = "versions"
+
+# Champs des documents d'établissement lus dans les colonnes du CSV du tableau de bord
+# (les autres colonnes portent le même nom, une fois les documents aplatis)
+DOCUMENT_FIELDS = {
+    **{col: TYPE_PREFIX + col for col in BOOL_COLUMNS},
+    "prixMin": "pricing.prixMin",
+}
+
+# Champs identifiant un document, par ordre de préférence
+KEY_FIELDS = {
+    ESTABLISHMENTS: ["_id", "noFinesset"],
+    EXECUTIVES: ["_id"],
+}
+# Index créés avant le chargement : champ simple, ou index composé (égalités puis capacité)
+# couvrant chaque combinaison de filtres de localisation de la barre latérale
+INDEXES = {
+    ESTABLISHMENTS: [
+        "noFinesset",
+        [(REGION_COLUMN, 1), (DEPARTMENT_COLUMN, 1), (CITY_COLUMN, 1), (CAPACITY_COLUMN, 1)],
+        [(DEPARTMENT_COLUMN, 1), (CITY_COLUMN, 1), (CAPACITY_COLUMN, 1)],
+        [(CITY_COLUMN, 1), (CAPACITY_COLUMN, 1)],
+        [(CAPACITY_COLUMN, 1)],
+        [("title", 1), ("noFinesset", 1)],
+        "legal_status",
+    ],
+    EXECUTIVES: ["Nom_de_l'entreprise", "Ville"],
+}
+
+
+def mongo_enabled():
+    return BACKEND == "mongo"
+
+
+def get_client(uri=MONGO_URI):
+    """Client MongoDB ; ``mongomock://`` donne une base en mémoire pour les essais."""
+    if uri.startswith("mongomock://"):
+        import mongomock
+
+        return mongomock.MongoClient()
+    from pymongo import MongoClient
+
+    return MongoClient(uri)
+
+
+def _bson_value(value):
+    """Valeur compatible BSON (NaN -> None, types numpy et pandas -> types Python)."""
+    if isinstance(value, dict):
+        return {key: _bson_value(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [_bson_value(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """Éléments d'un tableau JSON lus au fil du fichier, sans le charger en entier."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} : tableau JSON attendu")
+        position = 1
+        eof = False
+        while True:
+            # Séparateurs entre deux éléments
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                # Un élément n'est complet que s'il est suivi d'autres caractères (ou de la fin du fichier)
+                item, end = decoder.raw_decode(buffer, position)
+                if end == len(buffer) and not eof:
+                    raise ValueError("élément incomplet")
+            except ValueError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item
+            position = end
+
+
+def establishment_documents(records_path=RECORDS_PATH):
+    """
+    Établissements de la base JSON, lus au fil du fichier, modifications du
+    journal comprises (les établissements créés depuis le journal en dernier).
+    """
+    entries, _ = read_journal(journal_path(records_path))
+    changes = {record_key(record_id): (record_id, fields) for record_id, fields in fold(entries).items()}
+    for record in iter_json_array(records_path):
+        change = changes.pop(record_key(record.get(ID_COLUMN)), None)
+        if change is not None:
+            merge_changes([record], dict([change]))
+        yield _bson_value(record)
+    for change in changes.values():
+        yield _bson_value(merge_changes([], dict([change]))[0])
+
+
+def executive_id(name, postcode, city):
+    """Identifiant stable d'une entreprise (le chargement reste idempotent)."""
+    text = "\x1f".join("" if pd.isna(v) else str(v) for v in (name, postcode, city))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:24]
+
+
+def executive_documents(frame):
+    """
+    Une entreprise par document avec la liste de ses dirigeants, comme dans
+    ImportToMongoDB.ipynb : une ligne avec un nom d'entreprise ouvre une
+    entreprise, les lignes suivantes sans nom y ajoutent des dirigeants.
+    """
+    company = frame["Nom_de_l'entreprise"].notna().cumsum()
+    has_leader = frame["Dirigeant_Nom"].notna()
+    leaders = dict(list(frame[has_leader].groupby(company[has_leader])))
+    first = ~company.duplicated()
+    documents = []
+    for key, (_, head) in zip(company[first], frame[first].iterrows()):
+        group = leaders.get(key)
+        documents.append(_bson_value({
+            "_id": executive_id(head["Nom_de_l'entreprise"], head["Code_postal"], head["Ville"]),
+            "Nom_de_l'entreprise": head["Nom_de_l'entreprise"],
+            "Ville": head["Ville"],
+            "Code_postal": head["Code_postal"],
+            "NAF_code": head["NAF_Rév._2,_code_principal_(code)"],
+            "Date_de_création": head["Date_de_création"],
+            "Adresse": head["Numéro_et_voie"],
+            "Téléphone": head["Numéro_de_téléphone"],
+            "Effectif_moyen": head["Effectif_moyen_du_personnel_Dernière_année_disp."],
+            "Chiffre_d'affaires_kEUR": head["Chiffre_d'affaires_kEUR_Dernière_année_disp."],
+            "Fonds_propres_kEUR": head["Fonds_propres_kEUR_Dernière_année_disp."],
+            "Dirigeants": [] if group is None else [
+                {
+                    "Salutation": row["Dirigeant_Salutation"],
+                    "Prénom": row["Dirigeant_Prénom"],
+                    "Nom": row["Dirigeant_Nom"],
+                    "Aussi_actionnaire": row["Dirigeant_Aussi_actionnaire"],
+                    "Fonction": row["Dirigeant_Intitulé_de_la_fonction"],
+                    "Date_de_naissance": row["Dirigeant_Date_de_naissance"],
+                    "Âge": row["Dirigeant_Age"],
+                    "Tranche_d'âge": row["Dirigeant_Tranche_d'âge"],
+                }
+                for _, row in group.iterrows()
+            ],
+        }))
+    return documents
+
+
+def ensure_indexes(collection, indexes):
+    for keys in indexes:
+        collection.create_index(keys)
+
+
+def batches(documents, size=BATCH_SIZE):
+    iterator = iter(documents)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def document_filter(document, key_fields):
+    """Filtre identifiant le document (premier champ clé renseigné)."""
+    for field in key_fields:
+        if document.get(field) is not None:
+            return {field: document[field]}
+    raise ValueError(f"Document sans identifiant ({', '.join(key_fields)})")
+
+
+def _is_mongomock(collection):
+    return type(collection).__module__.split(".")[0] == "mongomock"
+
+
+def _replace_each(collection, batch, key_fields):
+    # mongomock ne sait pas rejouer les ReplaceOne des versions récentes de pymongo
+    from mongomock import PyMongoError
+
+    upserted = modified = errors = 0
+    for document in batch:
+        try:
+            result = collection.replace_one(document_filter(document, key_fields), document, upsert=True)
+        except PyMongoError:
+            errors += 1
+            continue
+        upserted += result.upserted_id is not None
+        modified += result.modified_count
+    return len(batch), upserted, modified, errors
+
+
+def write_batch(collection, batch, key_fields):
+    """Remplace ou insère un lot ; retourne (documents, insérés, modifiés, erreurs)."""
+    if _is_mongomock(collection):
+        return _replace_each(collection, batch, key_fields)
+    from pymongo import ReplaceOne
+    from pymongo.errors import BulkWriteError
+
+    requests = [ReplaceOne(document_filter(doc, key_fields), doc, upsert=True) for doc in batch]
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        details = result.bulk_api_result
+        errors = 0
+    except BulkWriteError as e:
+        # Lot non ordonné : les autres documents du lot ont été écrits
+        details = e.details
+        errors = len(details.get("writeErrors", []))
+    return len(batch), details.get("nUpserted", 0), details.get("nModified", 0), errors
+
+
+def load(collection, documents, key_fields, batch_size=BATCH_SIZE, workers=WORKERS, total=None, progress=None):
+    """
+    Charge les documents par lots, ``workers`` lots à la fois (au plus deux fois
+    plus en attente, pour borner la mémoire). Retourne les compteurs du chargement.
+    """
+    stats = {"documents": 0, "upserted": 0, "modified": 0, "errors": 0}
+    start = time.perf_counter()
+
+    def collect(futures):
+        for future in futures:
+            count, upserted, modified, errors = future.result()
+            stats["documents"] += count
+            stats["upserted"] += upserted
+            stats["modified"] += modified
+            stats["errors"] += errors
+            if progress:
+                progress(stats["documents"], total, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for batch in batches(documents, batch_size):
+            pending.add(pool.submit(write_batch, collection, batch, key_fields))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def load_collection(db, name, documents, batch_size=BATCH_SIZE, workers=WORKERS, progress=None):
+    collection = db[name]
+    ensure_indexes(collection, INDEXES.get(name, []))
+    # Les établissements sont lus au fil du fichier : leur nombre n'est pas connu d'avance
+    total = len(documents) if hasattr(documents, "__len__") else None
+    stats = load(collection, documents, KEY_FIELDS[name], batch_size, workers, total, progress)
+    # Nouvelle version : les tables lues dans la collection par le tableau de bord sont rechargées
+    db[VERSIONS].replace_one(
+        {ID_COLUMN: name}, {ID_COLUMN: name, "loaded_at": time.time(), "documents": stats["documents"]}, upsert=True
+    )
+    return stats
+
+
+def collection_version(collection):
+    """Date du dernier chargement de la collection (None si elle n'a pas été chargée par ``load_collection``)."""
+    version = collection.database[VERSIONS].find_one({ID_COLUMN: collection.name})
+    return version["loaded_at"] if version else None
+
+
+def read_frame(collection):
+    """
+    Tous les établissements de la collection, aplatis et typés comme le CSV
+    du tableau de bord (mêmes colonnes, mêmes types).
+    """
+    fields = {DOCUMENT_FIELDS.get(col, col): col for col in COLUMNS}
+    documents = list(collection.find({}, projection(fields)))
+    return apply_schema(pd.json_normalize(documents).reindex(columns=list(fields)).rename(columns=fields))
+
+
+def match_filter(state):
+    """Traduit un ``FilterState`` en filtre ``$match``."""
+    match = {}
+    for column, value in (
+        (REGION_COLUMN, state.region),
+        (DEPARTMENT_COLUMN, state.department),
+        (CITY_COLUMN, state.city),
+    ):
+        if value is not None:
+            match[column] = value
+    capacity = {}
+    if state.capacity_min is not None:
+        capacity["$gte"] = state.capacity_min
+    if state.capacity_max is not None:
+        capacity["$lte"] = state.capacity_max
+    if capacity:
+        match[CAPACITY_COLUMN] = capacity
+    # Une valeur inconnue est exclue, comme dans le moteur de filtres en mémoire
+    for column in sorted(state.excluded_types):
+        match[TYPE_PREFIX + column] = False
+    if state.group is not None:
+        # « titre - n° FINESS » (le numéro FINESS ne contient pas de tiret)
+        title, _, finess = state.group.rpartition(" - ")
+        match.update({"title": title, "noFinesset": finess})
+    return match
+
+
+def projection(columns):
+    """Projection des seuls champs demandés (``_id`` exclu s'il n'est pas demandé)."""
+    fields = {column: 1 for column in columns}
+    fields.setdefault(ID_COLUMN, 0)
+    return fields
+
+
+def select(collection, state, columns):
+    """Champs ``columns`` des documents retenus par l'état des filtres, en colonnes aplaties."""
+    documents = list(collection.find(match_filter(state), projection(columns)))
+    return pd.json_normalize(documents).reindex(columns=columns)
+
+
+def zone_table(collection, state, columns):
+    """
+    Table agrégée par établissement de la carte des zones (capacité sommée par
+    groupe de clés), calculée par MongoDB sur les seuls documents filtrés.
+    """
+    keys = {f"k{i}": f"${column}" for i, column in enumerate(ZONE_KEYS)}
+    not_null = {column: {"$ne": None} for column in ZONE_KEYS}
+    pipeline = [
+        {"$match": {"$and": [match_filter(state), not_null]}},
+        {"$group": {"_id": keys, CAPACITY_COLUMN: {"$sum": f"${CAPACITY_COLUMN}"}}},
+        {"$sort": {f"_id.{key}": 1 for key in keys}},
+    ]
+    rows = [
+        {**{column: group["_id"][f"k{i}"] for i, column in enumerate(ZONE_KEYS)}, CAPACITY_COLUMN: group[CAPACITY_COLUMN]}
+        for group in collection.aggregate(pipeline)
+    ]
+    table = pd.DataFrame(rows, columns=ZONE_KEYS + [CAPACITY_COLUMN])
+    table[CAPACITY_COLUMN] = table[CAPACITY_COLUMN].astype(float).fillna(0.0)
+    table[RADIUS_COLUMN] = zone_radius(table[CAPACITY_COLUMN])
+    table = table.rename(columns=columns)
+    table["region_geographique"] = classify_regions(table["latitude"], table["longitude"])
+    return table
+
+
+def _print_progress(label):
+    def progress(done, total, elapsed):
+        rate = done / elapsed if elapsed else 0.0
+        count = done if total is None else f"{done}/{total}"
+        print(f"{label} : {count} documents ({rate:.0f} doc/s)", flush=True)
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mongo", description="Charge les collections MongoDB (upserts par lots).")
+    parser.add_argument("--uri", default=MONGO_URI, help="URI MongoDB (défaut : EHPAD_MONGO_URI)")
+    parser.add_argument("--database", default=DATABASE, help="Base MongoDB")
+    parser.add_argument("--collection", nargs="+", choices=["etablissements", "dirigeants"],
+                        default=["etablissements", "dirigeants"], help="Collections à charger")
+    parser.add_argument("--records", default=RECORDS_PATH, help="Base JSON des établissements")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Documents par lot")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Lots écrits en parallèle")
+    args = parser.parse_args(argv)
+
+    db = get_client(args.uri)[args.database]
+    sources = {
+        "etablissements": (ESTABLISHMENTS, lambda: establishment_documents(args.records)),
+        "dirigeants": (EXECUTIVES, lambda: executive_documents(ingest([EXECUTIVES_SOURCE])[0])),
+    }
+    failed = False
+    for choice in args.collection:
+        name, documents = sources[choice]
+        stats = load_collection(db, name, documents(), args.batch_size, args.workers, _print_progress(name))
+        rate = stats["documents"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(
+            f"{name} : {stats['documents']} documents en {stats['seconds']:.1f} s ({rate:.0f} doc/s), "
+            f"{stats['upserted']} insérés, {stats['modified']} modifiés, {stats['errors']} erreur(s)"
+        )
+        failed = failed or stats["errors"] > 0
+    if failed:
+        raise SystemExit(1)
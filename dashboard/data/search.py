@@ -0,0 +1,113 @@
+"""
+Index de recherche instantanée sur les établissements.
+
+Chaque ligne est indexée par son nom, son numéro FINESS, son identifiant et sa
+ville, normalisés sans accents ni casse. Le vocabulaire des mots est trié (pour
+la recherche par préfixe des saisies courtes) et chaque trigramme pointe vers
+les mots qui le contiennent (pour la recherche dans le mot à partir de trois
+caractères). Une requête ne parcourt que les listes des mots concernés et
+retourne les ``k`` meilleures lignes : mot identique, puis début de mot, puis
+sous-chaîne.
+"""
+import bisect
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from .geo import CITY_COLUMN, sort_key
+
+SEARCH_COLUMNS = ["title", "noFinesset", "_id", CITY_COLUMN]
+TOP_K = 20
+# Score d'un mot de la requête selon la façon dont il correspond à un mot indexé
+EXACT_SCORE, PREFIX_SCORE, SUBSTRING_SCORE = 3, 2, 1
+
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Texte sans accents, en minuscules, réduit aux lettres et chiffres séparés par des espaces."""
+    return _SEPARATORS.sub(" ", sort_key(text)).strip()
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def _label(value):
+    """Représentation textuelle d'une valeur (les identifiants flottants entiers sans « .0 »)."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class SearchIndex:
+    """Index préfixe / trigrammes des lignes d'une table."""
+
+    def __init__(self, frame, columns=SEARCH_COLUMNS):
+        parts = [
+            frame[col].astype(object).map(_label, na_action="ignore").fillna("").tolist()
+            for col in columns if col in frame.columns
+        ]
+        texts = [normalize(" ".join(row)) for row in zip(*parts)]
+        self.size = len(texts)
+
+        word_rows = defaultdict(list)
+        for row, text in enumerate(texts):
+            for word in set(text.split()):
+                word_rows[word].append(row)
+        self.vocabulary = sorted(word_rows)
+        self._postings = [np.array(word_rows[word], dtype=np.int64) for word in self.vocabulary]
+
+        gram_words = defaultdict(list)
+        for index, word in enumerate(self.vocabulary):
+            for gram in trigrams(word):
+                gram_words[gram].append(index)
+        self._grams = {gram: np.array(words, dtype=np.int64) for gram, words in gram_words.items()}
+
+    def _matching_words(self, term):
+        """Indices des mots du vocabulaire contenant ``term`` (préfixe si la saisie est courte)."""
+        if len(term) < 3:
+            start = bisect.bisect_left(self.vocabulary, term)
+            stop = bisect.bisect_left(self.vocabulary, term + "\uffff")
+            return np.arange(start, stop)
+        postings = [self._grams.get(gram) for gram in trigrams(term)]
+        if any(p is None for p in postings):
+            return np.empty(0, dtype=np.int64)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        return np.array([i for i in candidates if term in self.vocabulary[i]], dtype=np.int64)
+
+    def search(self, query, k=TOP_K, positions=None):
+        """
+        Positions des ``k`` lignes correspondant le mieux à la requête, restreintes
+        à ``positions`` (tableau trié) si fourni. Chaque mot de la requête doit
+        correspondre à un mot de la ligne.
+        """
+        terms = normalize(query).split()
+        if not terms:
+            rows = np.arange(self.size) if positions is None else np.asarray(positions)
+            return rows[:k]
+
+        total = np.zeros(self.size, dtype=np.int64)
+        matched = np.ones(self.size, dtype=bool)
+        for term in terms:
+            scores = np.zeros(self.size, dtype=np.int64)
+            for index in self._matching_words(term):
+                word = self.vocabulary[index]
+                score = EXACT_SCORE if word == term else PREFIX_SCORE if word.startswith(term) else SUBSTRING_SCORE
+                rows = self._postings[index]
+                scores[rows] = np.maximum(scores[rows], score)
+            matched &= scores > 0
+            total += scores
+
+        if positions is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[positions] = True
+            matched &= allowed
+        rows = np.flatnonzero(matched)
+        # Meilleur score d'abord, puis ordre de la table
+        order = np.lexsort((rows, -total[rows]))
+        return rows[order[:k]]
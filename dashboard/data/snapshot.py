@@ -0,0 +1,163 @@
+"""
+Instantané colonnaire (Parquet) du jeu de données des établissements.
+
+Le CSV ``data/dataset_to_use.csv`` reste la source de vérité. Ce module en
+produit une copie Parquet aux types explicites (catégories, booléens, flottants)
+afin que les pages n'aient plus à refaire l'analyse du CSV et l'inférence des
+types à chaque démarrage. L'empreinte SHA-256 du CSV est enregistrée dans les
+métadonnées du fichier Parquet : si le CSV change, l'instantané est reconstruit
+automatiquement au chargement suivant.
+
+Construction manuelle (depuis la racine du dépôt) :
+    python -m dashboard.data snapshot [--force]
+"""
+import argparse
+import hashlib
+import os
+
+import pandas as pd
+
+CSV_PATH = "./data/dataset_to_use.csv"
+CACHE_DIR = "./data/cache"
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, "dataset_to_use.parquet")
+
+# Clé des métadonnées Parquet contenant l'empreinte du CSV source
+CHECKSUM_KEY = b"ehpad.source_sha256"
+# À incrémenter à chaque modification du schéma pour invalider les instantanés
+SCHEMA_VERSION = 1
+
+# Colonnes du CSV source, dans l'ordre du fichier
+COLUMNS = [
+    "_id", "title", "noFinesset", "capacity", "legal_status",
+    "IsEHPAD", "IsEHPA", "IsESLD", "IsRA", "IsAJA", "IsHCOMPL", "IsHTEMPO", "IsACC_JOUR",
+    "IsACC_NUIT", "IsHAB_AIDE_SOC", "IsCONV_APL", "IsALZH", "IsUHR", "IsPASA", "IsPUV",
+    "IsF1", "IsF1Bis", "IsF2", "prixMin",
+    "coordinates.street", "coordinates.postcode", "coordinates.deptcode", "coordinates.deptname",
+    "coordinates.city", "coordinates.phone", "coordinates.emailContact", "coordinates.gestionnaire",
+    "coordinates.website", "coordinates.latitude", "coordinates.longitude", "coordinates.region",
+]
+
+CATEGORY_COLUMNS = [
+    "coordinates.region", "coordinates.deptname", "coordinates.city", "legal_status"
+]
+BOOL_COLUMNS = [
+    "IsEHPAD", "IsEHPA", "IsESLD", "IsRA", "IsAJA", "IsHCOMPL", "IsHTEMPO",
+    "IsACC_JOUR", "IsACC_NUIT", "IsHAB_AIDE_SOC", "IsCONV_APL", "IsALZH", "IsUHR",
+    "IsPASA", "IsPUV", "IsF1", "IsF1Bis", "IsF2"
+]
+FLOAT_COLUMNS = [
+    "capacity", "prixMin", "coordinates.postcode",
+    "coordinates.latitude", "coordinates.longitude"
+]
+
+# Types imposés à la lecture du CSV (les identifiants gardent leurs zéros en tête)
+CSV_DTYPES = {
+    "_id": "Int64",
+    "noFinesset": str,
+    "coordinates.deptcode": str,
+    **{col: "float64" for col in FLOAT_COLUMNS},
+    **{col: "boolean" for col in BOOL_COLUMNS},
+    **{col: "category" for col in CATEGORY_COLUMNS},
+}
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """Calcule l'empreinte SHA-256 d'un fichier, préfixée par la version du schéma."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return f"v{SCHEMA_VERSION}-{digest.hexdigest()}"
+
+
+def read_source(csv_path=CSV_PATH):
+    """
+    Lit le CSV source en appliquant le schéma explicite.
+    Les indicateurs Is* sont des booléens nullables : une valeur absente reste
+    inconnue (NA) et est exclue par les filtres de type, comme avant.
+    """
+    return pd.read_csv(csv_path, encoding="utf-8", dtype=CSV_DTYPES)
+
+
+def apply_schema(frame):
+    """
+    Type une table aplatie d'autre provenance (documents MongoDB) comme la
+    lecture du CSV : mêmes colonnes, dans le même ordre, et mêmes types.
+    """
+    frame = frame.reindex(columns=COLUMNS)
+    for col in FLOAT_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    for col, dtype in CSV_DTYPES.items():
+        if dtype is str:
+            # Les valeurs absentes restent absentes, comme à la lecture du CSV
+            frame[col] = frame[col].map(lambda value: value if pd.isna(value) else str(value)).astype(object)
+        elif col not in FLOAT_COLUMNS:
+            frame[col] = frame[col].astype(dtype)
+    return frame
+
+
+def snapshot_checksum(snapshot_path=SNAPSHOT_PATH):
+    """Retourne l'empreinte du CSV enregistrée dans l'instantané, ou None."""
+    if not os.path.exists(snapshot_path):
+        return None
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(snapshot_path).metadata or {}
+    checksum = metadata.get(CHECKSUM_KEY)
+    return checksum.decode() if checksum else None
+
+
+def build_snapshot(csv_path=CSV_PATH, snapshot_path=SNAPSHOT_PATH, checksum=None):
+    """
+    Écrit l'instantané Parquet du CSV et retourne le DataFrame typé.
+    L'écriture passe par un fichier temporaire pour rester atomique.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    checksum = checksum or file_checksum(csv_path)
+    df = read_source(csv_path)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[CHECKSUM_KEY] = checksum.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, snapshot_path)
+    return df
+
+
+def load_snapshot(csv_path=CSV_PATH, snapshot_path=SNAPSHOT_PATH, checksum=None):
+    """
+    Charge le jeu de données depuis l'instantané Parquet.
+    L'instantané est (re)construit s'il est absent ou si le CSV a changé.
+    Sans pyarrow, on se rabat sur la lecture typée du CSV.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return read_source(csv_path)
+
+    checksum = checksum or file_checksum(csv_path)
+    if snapshot_checksum(snapshot_path) != checksum:
+        return build_snapshot(csv_path, snapshot_path, checksum)
+    return pd.read_parquet(snapshot_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="snapshot", description="Construit l'instantané Parquet du jeu de données.")
+    parser.add_argument("--csv", default=CSV_PATH, help="CSV source")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help="Fichier Parquet à écrire")
+    parser.add_argument("--force", action="store_true", help="Reconstruit même si l'instantané est à jour")
+    args = parser.parse_args(argv)
+
+    checksum = file_checksum(args.csv)
+    if not args.force and snapshot_checksum(args.output) == checksum:
+        print(f"Instantané à jour : {args.output}")
+        return
+    df = build_snapshot(args.csv, args.output, checksum)
+    print(f"Instantané écrit : {args.output} ({len(df)} lignes, empreinte {checksum[:15]})")
+
@@ -0,0 +1,428 @@
+"""
+Couche d'accès aux données partagée par toutes les pages.
+
+Les tables sont chargées une seule fois par processus (``st.cache_resource``) et
+partagées entre toutes les sessions : les pages ne doivent jamais les modifier
+en place, mais travailler sur des sélections ou des copies. Le cache est indexé
+par la date de modification des fichiers sources, ce qui recharge les données
+automatiquement lorsqu'ils changent ; ``invalidate`` permet de forcer le
+rechargement (par exemple après une sauvegarde).
+
+Les indicateurs et tables de synthèse sont lus dans un cube d'agrégats
+construit avec la table (voir ``cube``).
+
+Les modifications de l'éditeur sont ajoutées au journal (voir ``journal``) :
+la base de l'éditeur est l'instantané JSON, analysé une seule fois, sur lequel
+on rejoue les changements du journal. Avec ``EHPAD_BACKEND=sqlite``, seul
+l'éditeur passe par la base SQLite (voir ``database``) ; avec
+``EHPAD_BACKEND=mongo``, les deux cartes sont filtrées par MongoDB (voir ``mongo``)
+et la table partagée des établissements est lue dans la même collection.
+"""
+import json
+import os
+
+import pandas as pd
+import streamlit as st
+
+from . import database, mongo
+from .audit import audit_frame, read_raw_records
+from .cache import ResultCache
+from .cube import DIMENSIONS, RollupCube
+from .database import METADATA_PATH
+from .filters import CAPACITY_COLUMN, RESIDENCE_TYPES, FilterEngine
+from .geo import GeoIndex
+from .grid import RecordGrid
+from .journal import RECORDS_PATH, REVISION_COLUMN, apply_changes, commit, compact_in_background, fold
+from .journal import journal_path, read_journal, record_key, reset_journal, write_records
+from .search import SearchIndex
+from .snapshot import CSV_PATH, file_checksum, load_snapshot
+from .zones import ZoneTable
+
+# Identifiant stable d'un établissement (transporté par les points de la carte)
+ROW_ID = "_id"
+
+# Renommage des colonnes pour l'affichage sur la carte des établissements
+MAP_COLUMNS = {
+    "title": "Société",
+    "coordinates.city": "Ville",
+    "coordinates.deptname": "Département",
+    "coordinates.region": "Région",
+    "capacity": "Capacité",
+}
+
+# Champs lus pour la carte des établissements (colonnes affichées, position et identifiant)
+MAP_FIELDS = [ROW_ID, *MAP_COLUMNS, "coordinates.latitude", "coordinates.longitude"]
+
+# Champs agrégés par le cube de synthèse (hors indicateurs de type)
+SUMMARY_FIELDS = [*DIMENSIONS, CAPACITY_COLUMN]
+
+# Renommage des colonnes des tables de synthèse
+SUMMARY_COLUMNS = {
+    "coordinates.region": "Région",
+    "coordinates.deptname": "Département",
+    "legal_status": "Statut juridique",
+    "count": "Établissements",
+    "capacity_total": "Nombre de places",
+    "capacity_mean": "Places en moyenne",
+    "capacity_std": "Écart-type",
+}
+
+# Renommage des colonnes pour la carte des zones
+ZONE_COLUMNS = {
+    "title": "Société",
+    "coordinates.region": "region",
+    "coordinates.deptname": "nom_departement",
+    "coordinates.deptcode": "no_departement",
+    "coordinates.city": "ville",
+    "coordinates.latitude": "latitude",
+    "coordinates.longitude": "longitude",
+    "capacity": "Nombre de Place",
+}
+
+
+class Dataset:
+    """Table des établissements partagée en lecture seule, avec sa version et ses index."""
+
+    def __init__(self, frame, version):
+        self.frame = frame
+        self.version = version
+        self.geo = GeoIndex(frame)
+        self.filters = FilterEngine(frame, self.geo)
+        # Résultats de filtrage partagés entre toutes les sessions
+        self.results = ResultCache()
+        # Table agrégée par établissement pour la carte des zones
+        self.zones = ZoneTable(frame, ZONE_COLUMNS)
+        # Agrégats par région, département, statut juridique et types de résidence
+        self.cube = RollupCube(frame)
+        self._search = None
+        # Index de hachage identifiant -> position de la ligne
+        self.row_positions = {
+            int(row_id): position
+            for position, row_id in enumerate(frame[ROW_ID])
+            if not pd.isna(row_id)
+        }
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def search(self):
+        """Index de recherche instantanée (construit à la première recherche)."""
+        if self._search is None:
+            self._search = SearchIndex(self.frame)
+        return self._search
+
+    def position_of(self, row_id):
+        """Position de l'établissement d'identifiant donné, ou None."""
+        try:
+            return self.row_positions.get(int(row_id))
+        except (TypeError, ValueError):
+            return None
+
+    def query(self, state):
+        """Résultat (mis en cache) d'un état de filtres."""
+        state = self.filters.normalize(state)
+        return self.results.get_or_compute(state, lambda: self.filters.result(state))
+
+    def summary(self, state):
+        """
+        Indicateurs et tables de synthèse d'un état de filtres : lus dans le
+        cube si l'état ne porte que sur ses dimensions, sinon agrégés (et mis
+        en cache) sur les seules lignes retenues.
+        """
+        state = self.filters.normalize(state)
+        if self.cube.answers(state):
+            return self.cube.slice(state)
+        return self.results.get_or_compute(
+            ("cube", state), lambda: RollupCube(self.frame.take(self.query(state).positions)).slice()
+        )
+
+
+class MapRows:
+    """Lignes retenues pour la carte des établissements et indicateurs clés."""
+
+    def __init__(self, frame, capacity_total, index_of):
+        self.frame = frame
+        self.count = len(frame)
+        self.capacity_total = capacity_total
+        # Rang d'un établissement (par identifiant) dans ``frame``, ou None
+        self.index_of = index_of
+
+
+def _file_key(path):
+    """Clé de cache bon marché : date de modification et taille du fichier."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def add_derived_columns(df):
+    """Ajoute les colonnes calculées utilisées par les pages."""
+    df["Nom_Entreprise"] = df["title"] + " - " + df["noFinesset"]
+    return df
+
+
+@st.cache_resource(show_spinner="Chargement des établissements...")
+def _load_dataset(path, file_key):
+    version = file_checksum(path)
+    df = add_derived_columns(load_snapshot(path, checksum=version))
+    return Dataset(df, version)
+
+
+@st.cache_resource(show_spinner="Chargement des établissements...", max_entries=2)
+def _load_mongo_dataset(uri, database_name, version):
+    frame = add_derived_columns(mongo.read_frame(_mongo_collection(uri, database_name)))
+    return Dataset(frame, f"mongo-{version}")
+
+
+def get_dataset(path=CSV_PATH):
+    """
+    Retourne la table partagée des établissements (chargée une fois par processus).
+    Avec ``EHPAD_BACKEND=mongo``, elle est lue dans la collection interrogée
+    par les cartes, et non dans le CSV : les options des filtres et les
+    détails du point sélectionné viennent des mêmes documents que les points
+    tracés. Elle est relue après chaque chargement de la collection.
+    """
+    if mongo.mongo_enabled():
+        version = mongo.collection_version(get_mongo_collection())
+        return _load_mongo_dataset(mongo.MONGO_URI, mongo.DATABASE, version)
+    return _load_dataset(path, _file_key(path))
+
+
+def get_frame(path=CSV_PATH):
+    """Raccourci vers le DataFrame partagé des établissements."""
+    return get_dataset(path).frame
+
+
+@st.cache_resource
+def _load_metadata(path, file_key):
+    metadata = pd.read_csv(path, sep=";").set_index("Column Names")
+    return metadata["Type Widget"], metadata["Modification Obligatoire"]
+
+
+def get_column_metadata(path=METADATA_PATH):
+    """Retourne les types de widget et les champs obligatoires par colonne."""
+    return _load_metadata(path, _file_key(path))
+
+
+def _convert_dates(df):
+    """Convertit les champs Date de la base de l'éditeur."""
+    widget_types, _ = get_column_metadata()
+    date_cols = [col for col, wt in widget_types.items() if "Date" in wt and col in df.columns]
+    for col in date_cols:
+        df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
+@st.cache_resource(show_spinner="Chargement de la base des établissements...", max_entries=1)
+def _load_base(path, file_key):
+    with open(path, "r") as f:
+        data = json.load(f)
+    return _convert_dates(pd.json_normalize(data))
+
+
+@st.cache_resource(max_entries=2)
+def _load_records(path, file_key, journal_key):
+    # Instantané partagé, puis rejeu du journal sur une copie
+    base = _load_base(path, file_key)
+    entries, _ = read_journal(journal_path(path))
+    if not entries:
+        return base
+    return _convert_dates(apply_changes(base, fold(entries)))
+
+
+@st.cache_resource(max_entries=1)
+def _base_revisions(path, file_key):
+    # Révision de chaque établissement de la base compactée (0 si jamais modifié)
+    base = _load_base(path, file_key)
+    if REVISION_COLUMN in base.columns:
+        revisions = base[REVISION_COLUMN].fillna(0).astype(int).tolist()
+    else:
+        revisions = [0] * len(base)
+    return {record_key(record_id): revision for record_id, revision in zip(base[ROW_ID].tolist(), revisions)}
+
+
+def _journal_key(path):
+    journal = journal_path(path)
+    return _file_key(journal) if os.path.exists(journal) else None
+
+
+@st.cache_resource(show_spinner="Chargement de la base des établissements...", max_entries=2)
+def _load_database(db_path, version):
+    widget_types, _ = get_column_metadata()
+    return _convert_dates(database.read_records(widget_types, db_path))
+
+
+def _ensure_database(path=RECORDS_PATH, db_path=database.DB_PATH):
+    """Construit la base SQLite depuis le JSON (et son journal) si elle n'existe pas encore."""
+    if not os.path.exists(db_path):
+        widget_types, _ = get_column_metadata()
+        database.build_database(_load_records(path, _file_key(path), _journal_key(path)), widget_types, db_path)
+
+
+def get_records(path=RECORDS_PATH):
+    """Retourne la base complète (JSON aplati, journal rejoué) utilisée par l'éditeur."""
+    if database.sqlite_enabled():
+        _ensure_database(path)
+        return _load_database(database.DB_PATH, database.data_version())
+    return _load_records(path, _file_key(path), _journal_key(path))
+
+
+def _records_key(path):
+    """Version courante de la base de l'éditeur, pour les structures qui en dérivent."""
+    if database.sqlite_enabled():
+        _ensure_database(path)
+        return "sqlite", database.data_version()
+    return "json", _file_key(path), _journal_key(path)
+
+
+@st.cache_resource(max_entries=2)
+def _load_grid(path, records_key):
+    return RecordGrid(get_records(path))
+
+
+def get_record_grid(path=RECORDS_PATH):
+    """Vue paginée (tri et filtres précalculés) de la base de l'éditeur."""
+    return _load_grid(path, _records_key(path))
+
+
+@st.cache_resource(show_spinner="Audit de la base des établissements...", max_entries=1)
+def _load_audit(path, records_key):
+    widget_types, mandatory_fields = get_column_metadata()
+    # Base JSON brute : les dates non analysables n'ont pas encore été converties en NaT
+    frame = get_records(path) if records_key[0] == "sqlite" else read_raw_records(path)
+    return audit_frame(frame, widget_types, mandatory_fields), len(frame)
+
+
+def get_audit(path=RECORDS_PATH):
+    """Infractions de la base de l'éditeur aux règles du formulaire, et nombre d'établissements audités."""
+    return _load_audit(path, _records_key(path))
+
+
+@st.cache_resource(max_entries=2)
+def _load_search(path, records_key):
+    return SearchIndex(get_records(path))
+
+
+def get_record_search(path=RECORDS_PATH):
+    """Index de recherche instantanée sur la base de l'éditeur."""
+    return _load_search(path, _records_key(path))
+
+
+def get_record(record_id, path=RECORDS_PATH):
+    """Un établissement (dictionnaire de champs aplatis) par son identifiant, ou None."""
+    if database.sqlite_enabled():
+        _ensure_database(path)
+        return database.fetch_record(record_id)
+    df = get_records(path)
+    rows = df[df[ROW_ID] == record_id]
+    return rows.iloc[0].to_dict() if len(rows) else None
+
+
+def record_revision(entry):
+    """Révision d'un établissement (0 s'il n'a jamais été modifié)."""
+    revision = entry.get(REVISION_COLUMN) if entry else None
+    return 0 if revision is None or pd.isna(revision) else int(revision)
+
+
+def save_changes(changes, expected=None, path=RECORDS_PATH):
+    """
+    Enregistre des modifications d'établissements sans réécrire la base :
+    ``changes`` associe un identifiant aux champs modifiés. Les changements
+    vont au journal, ou sont écrits ligne à ligne dans la base SQLite.
+
+    ``expected`` associe à un identifiant la révision lue par l'utilisateur
+    (None pour une création) ; ``ConflictError`` est levée si un autre
+    utilisateur a enregistré entre-temps. Retourne les nouvelles révisions.
+    """
+    if database.sqlite_enabled():
+        _ensure_database(path)
+        return database.upsert(changes, expected=expected)
+    revisions = commit(changes, journal_path(path), expected, lambda: _base_revisions(path, _file_key(path)))
+    invalidate_records()
+    compact_in_background(path)
+    return revisions
+
+
+@st.cache_resource
+def _mongo_collection(uri, database_name):
+    # Un seul client (et son pool de connexions) partagé par toutes les sessions
+    collection = mongo.get_client(uri)[database_name][mongo.ESTABLISHMENTS]
+    mongo.ensure_indexes(collection, mongo.INDEXES[mongo.ESTABLISHMENTS])
+    return collection
+
+
+def get_mongo_collection():
+    """Collection MongoDB des établissements (client partagé entre les sessions)."""
+    return _mongo_collection(mongo.MONGO_URI, mongo.DATABASE)
+
+
+def get_map_rows(dataset, state):
+    """
+    Lignes de la carte des établissements pour un état de filtres : découpées
+    dans la table partagée, ou filtrées par MongoDB qui ne transfère que les
+    champs tracés (``MAP_FIELDS``) ; ``dataset`` est alors lu dans la même
+    collection (voir ``get_dataset``).
+    """
+    if mongo.mongo_enabled():
+        frame = mongo.select(get_mongo_collection(), dataset.filters.normalize(state), MAP_FIELDS)
+        # Index de hachage identifiant -> rang, construit une fois par résultat
+        ranks = {record_key(row_id): rank for rank, row_id in enumerate(frame[ROW_ID].tolist())}
+        return MapRows(frame, float(frame["capacity"].sum()), lambda row_id: ranks.get(record_key(row_id)))
+    result = dataset.query(state)
+    return MapRows(
+        dataset.frame.take(result.positions),
+        result.capacity_total,
+        lambda row_id: result.index_of(dataset.position_of(row_id)),
+    )
+
+
+def get_summary(dataset, state):
+    """
+    Indicateurs et tables de synthèse d'un état de filtres : cube de la table
+    partagée, ou cube des seuls documents filtrés par MongoDB.
+    """
+    if mongo.mongo_enabled():
+        fields = {database.TYPE_PREFIX + col: col for col in RESIDENCE_TYPES.values()}
+        frame = mongo.select(get_mongo_collection(), dataset.filters.normalize(state), [*SUMMARY_FIELDS, *fields])
+        return RollupCube(frame.rename(columns=fields)).slice()
+    return dataset.summary(state)
+
+
+def get_zone_table(dataset, state):
+    """
+    Table agrégée par établissement de la carte des zones pour un état de
+    filtres : découpée dans la table précalculée, ou calculée par MongoDB.
+    """
+    if mongo.mongo_enabled():
+        return mongo.zone_table(get_mongo_collection(), dataset.filters.normalize(state), ZONE_COLUMNS)
+    return dataset.zones.slice(dataset.query(state).positions)
+
+
+def save_records(df, path=RECORDS_PATH):
+    """Réécrit la base complète au format JSON (atomiquement), vide le journal puis invalide le cache."""
+    # Nettoyage des valeurs NaN/NaT (les dates sont converties à la sérialisation)
+    df = df.astype(object).where(df.notna(), None)
+    write_records(df.to_dict(orient="records"), path)
+    reset_journal(journal_path(path))
+    invalidate_records()
+
+
+def invalidate_records():
+    """Force le rejeu du journal de l'éditeur au prochain accès."""
+    _load_records.clear()
+    _load_grid.clear()
+    _load_search.clear()
+    _load_audit.clear()
+
+
+def invalidate():
+    """Vide tous les caches de données partagés."""
+    _load_dataset.clear()
+    _load_mongo_dataset.clear()
+    _load_metadata.clear()
+    _load_base.clear()
+    _load_records.clear()
+    _load_database.clear()
+    _load_grid.clear()
+    _load_search.clear()
+    _load_audit.clear()
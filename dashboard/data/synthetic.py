@@ -0,0 +1,138 @@
+"""
+Jeux de données synthétiques à grande échelle pour les bancs d'essai.
+
+Le schéma réel est conservé : en-tête de ``dataset_to_use.csv`` pour la table
+des cartes et colonnes de ``noms_colonnes.csv`` pour la base JSON de
+l'éditeur. Les établissements synthétiques sont tirés (avec remise) parmi les
+établissements réels, ce qui préserve la répartition par région, département,
+ville, type et statut juridique ; leurs coordonnées sont décalées d'un bruit
+gaussien de quelques kilomètres autour de l'établissement tiré, et chacun
+reçoit un identifiant et un numéro FINESS propres.
+
+Le jeu est écrit dans ``<racine>/data/`` avec les mêmes noms de fichiers que
+le dépôt : les pages lancées depuis ``<racine>`` le lisent sans modification.
+    python -m dashboard.data synthetic --rows 100000 [--output DOSSIER] [--seed N]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from .database import METADATA_PATH
+from .etl import REGIONS_PATH
+from .journal import ID_COLUMN, RECORDS_PATH
+from .snapshot import CACHE_DIR, CSV_PATH
+
+SYNTHETIC_DIR = os.path.join(CACHE_DIR, "synthetic")
+# Écart-type du décalage des coordonnées autour de l'établissement tiré
+JITTER_KM = 5.0
+KM_PER_DEGREE = 111.32
+# Numéros FINESS synthétiques (9 chiffres, hors des plages réelles)
+FINESS_START = 990000000
+
+
+def synthetic_root(rows, seed=0, base_dir=SYNTHETIC_DIR):
+    """Dossier racine d'un jeu synthétique (contenant ``data/``)."""
+    return os.path.join(base_dir, "real" if rows is None else f"{rows}-{seed}")
+
+
+def scale_frame(frame, rows, seed=0, jitter_km=JITTER_KM):
+    """Table de ``rows`` établissements tirés de ``frame``, coordonnées décalées, identifiants uniques."""
+    rng = np.random.default_rng(seed)
+    scaled = frame.take(rng.integers(0, len(frame), rows)).reset_index(drop=True)
+    scaled[ID_COLUMN] = np.arange(1, rows + 1)
+    scaled["noFinesset"] = FINESS_START + np.arange(rows)
+
+    latitude = scaled["coordinates.latitude"].to_numpy(dtype=float)
+    longitude = scaled["coordinates.longitude"].to_numpy(dtype=float)
+    scale = jitter_km / KM_PER_DEGREE
+    scaled["coordinates.latitude"] = np.clip(latitude + rng.normal(0.0, scale, rows), -90.0, 90.0)
+    scaled["coordinates.longitude"] = longitude + rng.normal(0.0, scale, rows) / np.maximum(np.cos(np.radians(latitude)), 0.1)
+    return scaled
+
+
+def editor_columns(frame, metadata_columns):
+    """
+    Colonne de ``frame`` alimentant chaque colonne de l'éditeur : même nom,
+    ou dernier segment du nom (« types.IsEHPAD » -> « IsEHPAD ») s'il ne
+    désigne pas lui-même une colonne de l'éditeur (« ehpadPrice._id ») ; None sinon.
+    """
+    sources = {}
+    for column in metadata_columns:
+        leaf = column.rsplit(".", 1)[-1]
+        if column in frame.columns:
+            sources[column] = column
+        elif leaf in frame.columns and leaf not in metadata_columns:
+            sources[column] = leaf
+        else:
+            sources[column] = None
+    return sources
+
+
+def _nest(record):
+    nested = {}
+    for column, value in record.items():
+        *parents, leaf = column.split(".")
+        node = nested
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return nested
+
+
+def editor_records(frame, metadata_columns):
+    """Base de l'éditeur (documents imbriqués comme ``base-etablissement.json``) tirée de ``frame``."""
+    sources = editor_columns(frame, metadata_columns)
+    flat = pd.DataFrame({
+        column: frame[source] if source is not None else None for column, source in sources.items()
+    }).astype(object)
+    flat = flat.where(flat.notna(), None)
+    return [_nest(record) for record in flat.to_dict(orient="records")]
+
+
+def write_dataset(root, rows, seed=0, jitter_km=JITTER_KM, csv_path=CSV_PATH, metadata_path=METADATA_PATH,
+                  regions_path=REGIONS_PATH):
+    """
+    Écrit le jeu synthétique (table des cartes, base de l'éditeur, référentiels)
+    dans ``<root>/data/`` ; avec ``rows=None``, les établissements réels sont repris tels quels.
+    """
+    data_dir = os.path.join(root, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    frame = pd.read_csv(csv_path)
+    if rows is not None:
+        frame = scale_frame(frame, rows, seed, jitter_km)
+    frame.to_csv(os.path.join(data_dir, os.path.basename(CSV_PATH)), header=True, encoding="utf-8", index=False)
+
+    metadata_columns = pd.read_csv(metadata_path, sep=";")["Column Names"].tolist()
+    with open(os.path.join(data_dir, os.path.basename(RECORDS_PATH)), "w") as f:
+        json.dump(editor_records(frame, metadata_columns), f, ensure_ascii=False)
+    for path in (metadata_path, regions_path):
+        shutil.copy(path, os.path.join(data_dir, os.path.basename(path)))
+    return data_dir
+
+
+def ensure_dataset(rows, seed=0, base_dir=SYNTHETIC_DIR):
+    """Racine du jeu synthétique demandé, écrit s'il n'existe pas encore."""
+    root = synthetic_root(rows, seed, base_dir)
+    # Le référentiel des colonnes est écrit en dernier
+    if not os.path.exists(os.path.join(root, "data", os.path.basename(METADATA_PATH))):
+        write_dataset(root, rows, seed)
+    return root
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="synthetic", description="Génère un jeu d'établissements synthétique.")
+    parser.add_argument("--rows", type=int, required=True, help="Nombre d'établissements")
+    parser.add_argument("--output", default=None, help=f"Dossier racine (défaut : {SYNTHETIC_DIR}/<lignes>-<graine>)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du tirage")
+    parser.add_argument("--jitter-km", type=float, default=JITTER_KM, help="Écart-type du décalage des coordonnées")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    root = args.output or synthetic_root(args.rows, args.seed)
+    data_dir = write_dataset(root, args.rows, args.seed, args.jitter_km)
+    print(f"{data_dir} : {args.rows} établissements en {time.perf_counter() - start:.1f} s")
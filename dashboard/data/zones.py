@@ -0,0 +1,79 @@
+"""
+Table agrégée par établissement pour la carte des zones.
+
+Le regroupement à 8 clés (nom, FINESS, localisation, coordonnées) est calculé
+une seule fois au chargement : chaque ligne source reçoit l'identifiant de son
+groupe, et la classification métropole / autre est faite par une boîte
+englobante vectorisée. À chaque rerun, on ne fait plus que découper cette
+table selon les lignes filtrées et sommer les capacités par ``np.bincount``.
+Le rayon des points de la carte (``exits_radius``) est calculé sur la colonne
+des capacités sommées, sans boucle Python.
+"""
+import numpy as np
+
+ZONE_KEYS = [
+    "title", "noFinesset", "coordinates.region", "coordinates.deptname", "coordinates.deptcode",
+    "coordinates.city", "coordinates.latitude", "coordinates.longitude",
+]
+CAPACITY_COLUMN = "capacity"
+# Rayon des points de la carte des zones (surface proportionnelle au nombre de places)
+RADIUS_COLUMN = "exits_radius"
+
+# Boîte englobante de la France métropolitaine (bornes exclues)
+METROPOLE_LAT = (41, 51)
+METROPOLE_LON = (-5, 10)
+
+
+def classify_regions(lat, lon):
+    """Classe chaque point en « France Metropolitaine » ou « Autre »."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    metropole = (
+        (lon > METROPOLE_LON[0]) & (lon < METROPOLE_LON[1])
+        & (lat > METROPOLE_LAT[0]) & (lat < METROPOLE_LAT[1])
+    )
+    return np.where(metropole, "France Metropolitaine", "Autre")
+
+
+def zone_radius(capacity):
+    """Rayon de chaque point : racine carrée du nombre de places (0 si inconnu)."""
+    capacity = np.nan_to_num(np.asarray(capacity, dtype=float), nan=0.0)
+    return np.sqrt(np.maximum(capacity, 0.0))
+
+
+class ZoneTable:
+    """Groupes d'établissements précalculés, découpés à la demande."""
+
+    def __init__(self, frame, columns):
+        self.size = len(frame)
+        keys = frame[ZONE_KEYS]
+        valid = keys.notna().all(axis=1).to_numpy()
+
+        # Identifiant de groupe par ligne source (-1 si une clé manque, comme groupby)
+        group_ids = keys[valid].groupby(ZONE_KEYS, sort=True, observed=True).ngroup().to_numpy()
+        self.group_of_row = np.full(self.size, -1, dtype=np.int64)
+        self.group_of_row[valid] = group_ids
+        self.n_groups = int(group_ids.max()) + 1 if len(group_ids) else 0
+
+        # Une ligne de clés par groupe, dans l'ordre du regroupement
+        first_rows = np.flatnonzero(valid)[np.unique(group_ids, return_index=True)[1]]
+        table = frame[ZONE_KEYS].take(first_rows).rename(columns=columns).reset_index(drop=True)
+        table["region_geographique"] = classify_regions(
+            frame["coordinates.latitude"].to_numpy()[first_rows],
+            frame["coordinates.longitude"].to_numpy()[first_rows],
+        )
+        self.table = table
+        self.capacity_column = columns.get(CAPACITY_COLUMN, CAPACITY_COLUMN)
+        self._capacity = np.nan_to_num(frame[CAPACITY_COLUMN].to_numpy(dtype=float), nan=0.0)
+
+    def slice(self, positions):
+        """Table agrégée (capacité sommée par groupe, rayon des points) pour les lignes filtrées."""
+        groups = self.group_of_row[positions]
+        keep = groups >= 0
+        groups = groups[keep]
+        totals = np.bincount(groups, weights=self._capacity[positions][keep], minlength=self.n_groups)
+        present = np.unique(groups)
+        out = self.table.take(present).reset_index(drop=True)
+        out[self.capacity_column] = totals[present]
+        out[RADIUS_COLUMN] = zone_radius(out[self.capacity_column])
+        return out
@@ -0,0 +1,231 @@
+"""
+Mesures de performance des pages du tableau de bord.
+
+Chaque page appelle ``start_page`` en tête de script et ``PageTimer.ready``
+une fois tous ses éléments affichés.
+
+Temps de première interactivité : sont retenus, pour le processus, la durée
+de la première exécution de chaque page (démarrage à froid) et le délai
+écoulé depuis le démarrage du serveur, puis la dernière durée d'exécution ;
+la page d'accueil affiche ces mesures.
+
+Étapes de chaque exécution : ``PageTimer.span`` chronomètre une étape
+(chargement, filtrage, figure, clustering, sauvegarde...) avec, au besoin, le
+nombre de lignes et la taille des données produites. Les étapes ne sont
+mesurées que si le journal est activé (``EHPAD_TIMINGS_LOG=chemin.jsonl``,
+une ligne par exécution avec les identifiants de session et de page) ou si
+le panneau de débogage est demandé (``?debug=1`` dans l'adresse) ; sinon une
+étape ne coûte qu'un appel de fonction. Agrégation hors ligne du journal :
+    python dashboard/instrumentation.py chemin.jsonl
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+# Démarrage du processus (ce module est importé dès la page d'accueil)
+PROCESS_START = time.perf_counter()
+# Journal des mesures (None : pas de journal)
+LOG_PATH = os.environ.get("EHPAD_TIMINGS_LOG") or None
+DEBUG_PARAM = "debug"
+
+_timings = {}
+_lock = threading.Lock()
+
+
+def payload_size(payload):
+    """Taille en octets de données produites par une étape (table, tableau ou texte), ou None."""
+    if isinstance(payload, pd.DataFrame):
+        return int(payload.memory_usage(index=False).sum())
+    if isinstance(payload, (str, bytes)):
+        return len(payload)
+    nbytes = getattr(payload, "nbytes", None)
+    return int(nbytes) if nbytes is not None else None
+
+
+class Span:
+    """Étape chronométrée d'une exécution de page (utilisable comme gestionnaire de contexte)."""
+
+    __slots__ = ("timer", "name", "start", "duration_ms", "rows", "bytes")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.rows = None
+        self.bytes = None
+        self.duration_ms = None
+        self.start = time.perf_counter()
+
+    def stop(self, rows=None, payload=None):
+        """Termine l'étape ; ``rows`` et ``payload`` renseignent le volume de données produit."""
+        if self.duration_ms is None:
+            self.duration_ms = 1000 * (time.perf_counter() - self.start)
+            self.timer.spans.append(self)
+        if rows is not None:
+            self.rows = int(rows)
+        if payload is not None:
+            self.bytes = payload_size(payload)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def to_dict(self):
+        return {"name": self.name, "ms": round(self.duration_ms, 3), "rows": self.rows, "bytes": self.bytes}
+
+
+class _NullSpan:
+    """Étape non mesurée (mesures désactivées)."""
+
+    __slots__ = ()
+
+    def stop(self, rows=None, payload=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _debug_requested():
+    return st.query_params.get(DEBUG_PARAM) in ("1", "true")
+
+
+class PageTimer:
+    """Chronomètre d'une exécution de page et de ses étapes."""
+
+    def __init__(self, page):
+        self.page = page
+        self.start = time.perf_counter()
+        self.debug = _debug_requested()
+        self.enabled = LOG_PATH is not None or self.debug
+        self.spans = []
+
+    def span(self, name):
+        """Démarre la mesure d'une étape (``stop`` ou bloc ``with`` pour la terminer)."""
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def ready(self):
+        """Page entièrement affichée : enregistre la durée de l'exécution et de ses étapes."""
+        now = time.perf_counter()
+        duration = now - self.start
+        first_in_session = st.session_state.setdefault("_first_interactive", {})
+        if self.page not in first_in_session:
+            first_in_session[self.page] = duration
+        with _lock:
+            timing = _timings.get(self.page)
+            if timing is None:
+                timing = _timings[self.page] = {
+                    "page": self.page,
+                    "first_run_s": duration,
+                    "since_process_start_s": now - PROCESS_START,
+                    "runs": 0,
+                }
+            timing["runs"] += 1
+            timing["last_run_s"] = duration
+        if self.enabled:
+            record = self._record(duration)
+            if LOG_PATH is not None:
+                append_record(record)
+            if self.debug:
+                debug_panel(record)
+        return duration
+
+    def _record(self, duration):
+        runs = st.session_state.setdefault("_page_runs", {})
+        runs[self.page] = runs.get(self.page, 0) + 1
+        return {
+            "ts": time.time(),
+            "session": st.session_state.setdefault("_session_id", uuid.uuid4().hex),
+            "page": self.page,
+            "run": runs[self.page],
+            "total_ms": round(1000 * duration, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+def start_page(page):
+    """Démarre la mesure d'une exécution de la page ``page``."""
+    return PageTimer(page)
+
+
+def append_record(record, path=None):
+    """Ajoute une exécution au journal JSONL (une erreur d'écriture n'interrompt pas la page)."""
+    path = path or LOG_PATH
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        pass
+
+
+def debug_panel(record):
+    """Panneau de la barre latérale : durée de l'exécution et de chacune de ses étapes."""
+    with st.sidebar.expander("⏱️ Mesures de l'exécution", expanded=True):
+        st.caption(f"Exécution n°{record['run']} : {record['total_ms']:.0f} ms")
+        if record["spans"]:
+            st.dataframe(
+                pd.DataFrame(record["spans"]).rename(columns={
+                    "name": "Étape", "ms": "Durée (ms)", "rows": "Lignes", "bytes": "Octets",
+                }).round(1),
+                hide_index=True,
+            )
+
+
+def page_timings():
+    """Mesures de chaque page depuis le démarrage du processus."""
+    with _lock:
+        return [dict(timing) for timing in _timings.values()]
+
+
+def session_timings():
+    """Durée de la première exécution de chaque page dans la session courante."""
+    return dict(st.session_state.get("_first_interactive", {}))
+
+
+def read_log(path):
+    """Journal des mesures en table, une ligne par étape (avec la durée totale de l'exécution)."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            run = {key: record.get(key) for key in ("ts", "session", "page", "run")}
+            rows.append({**run, "name": "(total)", "ms": record.get("total_ms"), "rows": None, "bytes": None})
+            rows.extend({**run, **span} for span in record.get("spans", []))
+    return pd.DataFrame(rows, columns=["ts", "session", "page", "run", "name", "ms", "rows", "bytes"])
+
+
+def summarize_log(log):
+    """Durées médiane et p95 de chaque étape de chaque page."""
+    grouped = log.groupby(["page", "name"], sort=False)["ms"]
+    return pd.DataFrame({
+        "count": grouped.size(),
+        "p50_ms": grouped.quantile(0.5),
+        "p95_ms": grouped.quantile(0.95),
+        "max_ms": grouped.max(),
+    }).round(1).reset_index()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage : python dashboard/instrumentation.py chemin.jsonl")
+        sys.exit(2)
+    print(summarize_log(read_log(sys.argv[1])).to_string(index=False))
@@ -0,0 +1,3 @@
+"""Préparation des données cartographiques (sans dépendance aux pages)."""
+from .lod import level_of_detail, stratified_sample, viewport_bounds
+from .figures import map_config, map_figure, update_map_figure
@@ -0,0 +1,270 @@
+"""
+Moteur de clustering des établissements pour la carte des zones.
+
+Les méthodes sont enregistrées dans ``CLUSTERERS`` : KMeans et MiniBatchKMeans
+(distance euclidienne sur les coordonnées en radians, comme auparavant), ainsi
+que DBSCAN et HDBSCAN en métrique haversine, appuyés sur un ``BallTree`` pour
+des requêtes de voisinage en O(n log n). Les méthodes par densité produisent
+l'étiquette -1 pour les points non classés (bruit).
+
+Les étiquettes et centroïdes sont mis en cache en mémoire et sur disque, sous
+une clé dérivée des coordonnées en entrée et des paramètres du clustering :
+rouvrir la page ou déplacer un curseur sans changer ces entrées ne relance
+jamais un ajustement identique. Le cache disque est borné : après chaque
+écriture, les fichiers inutilisés depuis ``DISK_MAX_AGE_DAYS`` jours sont
+supprimés, puis les moins récemment utilisés tant que le dossier dépasse
+``DISK_MAX_BYTES`` (la date de modification d'un fichier est mise à jour à
+chaque lecture).
+
+Les coordonnées attendues sont un tableau n x 2 de [longitude, latitude] en radians.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = "./data/cache/clusters"
+# Nombre de résultats conservés en mémoire
+MEMORY_ENTRIES = 64
+# Taille maximale du cache disque et durée de conservation d'un résultat inutilisé
+DISK_MAX_BYTES = 256 * 1024 * 1024
+DISK_MAX_AGE_DAYS = 30
+# Au-delà de ce nombre de points, le mode automatique utilise MiniBatchKMeans
+MINIBATCH_THRESHOLD = 20000
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_EPS_KM = 10.0
+DEFAULT_MIN_SAMPLES = 5
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+
+def _fit_kmeans(coords, n_clusters, random_state, **_):
+    from sklearn.cluster import KMeans
+
+    model = KMeans(n_clusters=n_clusters, random_state=random_state)
+    return model.fit_predict(coords), model.cluster_centers_
+
+
+def _fit_minibatch(coords, n_clusters, random_state, **_):
+    from sklearn.cluster import MiniBatchKMeans
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, batch_size=2048, n_init=3)
+    return model.fit_predict(coords), model.cluster_centers_
+
+
+def _fit_dbscan(coords, eps_km=DEFAULT_EPS_KM, min_samples=DEFAULT_MIN_SAMPLES, **_):
+    from sklearn.cluster import DBSCAN
+
+    # La métrique haversine attend [latitude, longitude]
+    model = DBSCAN(eps=eps_km / EARTH_RADIUS_KM, min_samples=min_samples,
+                   metric="haversine", algorithm="ball_tree")
+    labels = model.fit_predict(coords[:, ::-1])
+    return labels, cluster_centroids(coords, labels)
+
+
+def _fit_hdbscan(coords, min_samples=DEFAULT_MIN_SAMPLES, **_):
+    from sklearn.cluster import HDBSCAN
+
+    model = HDBSCAN(min_cluster_size=min_samples, metric="haversine", algorithm="ball_tree")
+    labels = model.fit_predict(coords[:, ::-1])
+    return labels, cluster_centroids(coords, labels)
+
+
+# Méthodes disponibles : nom -> (fonction d'ajustement, utilise un nombre de clusters)
+CLUSTERERS = {
+    "kmeans": (_fit_kmeans, True),
+    "minibatch": (_fit_minibatch, True),
+    "dbscan": (_fit_dbscan, False),
+    "hdbscan": (_fit_hdbscan, False),
+}
+METHODS = ["auto"] + list(CLUSTERERS)
+
+
+def register_clusterer(name, fit, uses_n_clusters):
+    """
+    Ajoute une méthode de clustering. ``fit(coords, n_clusters, random_state, **options)``
+    retourne (étiquettes, centroïdes) ; l'étiquette -1 désigne le bruit.
+    """
+    CLUSTERERS[name] = (fit, uses_n_clusters)
+    if name not in METHODS:
+        METHODS.append(name)
+
+
+def uses_n_clusters(method):
+    return method == "auto" or CLUSTERERS[method][1]
+
+
+def cluster_centroids(coords, labels):
+    """
+    Centroïdes sphériques ([lon, lat] en radians) des clusters, calculés par
+    ``np.bincount`` sur les vecteurs unitaires ; le bruit (-1) est ignoré.
+    """
+    labels = np.asarray(labels)
+    keep = labels >= 0
+    n = int(labels[keep].max()) + 1 if keep.any() else 0
+    if n == 0:
+        return np.empty((0, 2))
+    lon, lat = coords[keep, 0], coords[keep, 1]
+    xyz = [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    x, y, z = (np.bincount(labels[keep], weights=v, minlength=n) for v in xyz)
+    return np.column_stack([np.arctan2(y, x), np.arctan2(z, np.hypot(x, y))])
+
+
+def cluster_summary(labels, lat, lon, capacity):
+    """
+    Résumé par cluster (effectif, capacité totale, centroïde en degrés), calculé
+    par réductions ``np.bincount`` plutôt que par filtrage du DataFrame.
+    """
+    labels = np.asarray(labels)
+    offset = 1 if (labels < 0).any() else 0  # le bruit occupe la case 0
+    bins = labels + offset
+    count = np.bincount(bins)
+    present = np.flatnonzero(count)
+    capacity = np.nan_to_num(np.asarray(capacity, dtype=float), nan=0.0)
+    coords = np.radians(np.column_stack([lon, lat]))
+    centroids = np.degrees(cluster_centroids(coords, bins))
+    return pd.DataFrame({
+        "cluster": present - offset,
+        "Établissements": count[present],
+        "Nombre de Place": np.bincount(bins, weights=capacity)[present],
+        "latitude": centroids[present, 1],
+        "longitude": centroids[present, 0],
+    })
+
+
+def cluster_key(coords, params):
+    """Empreinte des coordonnées et des paramètres du clustering."""
+    digest = hashlib.sha256()
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    digest.update(str(coords.shape).encode())
+    digest.update(coords.tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def resolve_method(method, n_points):
+    if method == "auto":
+        return "minibatch" if n_points > MINIBATCH_THRESHOLD else "kmeans"
+    if method not in CLUSTERERS:
+        raise ValueError(f"Méthode de clustering inconnue : {method}")
+    return method
+
+
+def _read_disk(key, cache_dir):
+    path = os.path.join(cache_dir, f"{key}.npz")
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            cached = data["labels"], data["centroids"]
+    except (OSError, ValueError, KeyError):
+        return None
+    try:
+        # Date de dernière utilisation, pour l'éviction
+        os.utime(path)
+    except OSError:
+        pass
+    return cached
+
+
+def _write_disk(key, labels, centroids, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.npz")
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, labels=labels, centroids=centroids)
+    os.replace(tmp_path, path)
+    evict_disk(cache_dir)
+
+
+def evict_disk(cache_dir=CACHE_DIR, max_bytes=DISK_MAX_BYTES, max_age_days=DISK_MAX_AGE_DAYS):
+    """
+    Supprime les résultats inutilisés depuis ``max_age_days`` jours, puis les
+    moins récemment utilisés jusqu'à ce que le cache tienne dans ``max_bytes``.
+    Retourne le nombre de fichiers supprimés.
+    """
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                # Les fichiers temporaires appartiennent à une écriture en cours
+                if entry.name.endswith(".npz") and ".tmp." not in entry.name:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    oldest = time.time() - max_age_days * 86400
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= oldest and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _remember(key, value):
+    with _lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def cluster_points(coords, n_clusters, method="auto", random_state=42, cache_dir=CACHE_DIR, **options):
+    """
+    Étiquettes et centroïdes des points ``coords`` ([lon, lat] en radians).
+    Le résultat provient du cache mémoire, puis disque, sinon d'un ajustement.
+    ``options`` est transmis à la méthode (ex. ``eps_km``, ``min_samples``).
+    """
+    coords = np.asarray(coords, dtype=float)
+    method = resolve_method(method, len(coords))
+    fit, with_n_clusters = CLUSTERERS[method]
+
+    params = {"method": method, **options}
+    if with_n_clusters:
+        n_clusters = min(int(n_clusters), len(coords))
+        if n_clusters <= 1:
+            # Un seul cluster si les échantillons sont insuffisants
+            return np.zeros(len(coords), dtype=np.int32), coords.mean(axis=0, keepdims=True)
+        params.update(n_clusters=n_clusters, random_state=random_state)
+    elif len(coords) < 2:
+        # Un point isolé ne forme pas de cluster par densité
+        return np.full(len(coords), -1, dtype=np.int32), np.empty((0, 2))
+
+    key = cluster_key(coords, params)
+    with _lock:
+        cached = _memory.get(key)
+    if cached is not None:
+        return cached
+
+    cached = _read_disk(key, cache_dir) if cache_dir else None
+    if cached is None:
+        labels, centroids = fit(coords, n_clusters=n_clusters, random_state=random_state, **options)
+        cached = (np.asarray(labels, dtype=np.int32), np.asarray(centroids, dtype=float))
+        if cache_dir:
+            _write_disk(key, *cached, cache_dir)
+    _remember(key, cached)
+    return cached
+
+
+def clear_memory():
+    """Vide le cache mémoire (le cache disque est conservé)."""
+    with _lock:
+        _memory.clear()
@@ -0,0 +1,151 @@
+"""
+Figure Plotly de la carte des établissements, construite une seule fois.
+
+Les parties statiques de la figure (mise en page, infobulle, style de carte,
+regroupement des points, configuration) ne dépendent que des options de la
+carte : leur squelette est mis en cache par style de carte et option de
+regroupement. Chaque session garde sa figure, tirée de ce squelette ; à
+chaque rerun, seuls les tableaux des points (positions, infobulles, tailles),
+le point sélectionné et la vue sont remplacés en place, sans repasser par
+Plotly Express ni revalider toute la figure.
+
+La figure comporte deux traces : les établissements, puis le point
+sélectionné, dessiné par-dessus en bleu et opaque. ``customdata`` porte
+l'identifiant de l'établissement (lu au clic) puis les colonnes de l'infobulle.
+"""
+import copy
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_COLOR = "#741771"
+SELECTED_COLOR = "#4182ad"
+DEFAULT_OPACITY = 0.9
+SELECTED_OPACITY = 1.0
+HEIGHT = 600
+# Taille minimale absolue des points (pixels)
+MIN_SIZE = 3
+
+# Colonnes de ``customdata`` après l'identifiant, dans l'ordre de l'infobulle
+HOVER_COLUMNS = ["Société", "Département", "Région", "Capacité"]
+HOVER_NAME = "Ville"
+HOVER_TEMPLATE = (
+    "<b>%{hovertext}</b><br>"
+    "Établissement: %{customdata[1]}<br>"
+    "Département: %{customdata[2]}<br>"
+    "Région: %{customdata[3]}<br>"
+    "Capacité: %{customdata[4]} lits"
+    "<extra></extra>"
+)
+CLUSTER = dict(enabled=True, size=10, step=3, color="rgba(231, 76, 60, 0.5)", opacity=0.7)
+
+SIZE_COLUMN = "Capacité"
+LAT_COLUMN = "coordinates.latitude"
+LON_COLUMN = "coordinates.longitude"
+
+
+def _points_trace(color, opacity, clustered):
+    trace = {
+        "type": "scattermapbox",
+        "mode": "markers",
+        "showlegend": False,
+        "hovertemplate": HOVER_TEMPLATE,
+        "marker": {"color": color, "opacity": opacity, "sizemode": "diameter", "sizemin": MIN_SIZE},
+    }
+    if clustered:
+        trace["cluster"] = dict(CLUSTER)
+    return trace
+
+
+@lru_cache(maxsize=None)
+def _skeleton(map_style, clustered):
+    """Squelette validé de la figure (partagé : ne jamais le modifier)."""
+    import plotly.graph_objects as go
+
+    return go.Figure(
+        data=[
+            _points_trace(DEFAULT_COLOR, DEFAULT_OPACITY, clustered),
+            # Le point sélectionné n'est jamais regroupé
+            _points_trace(SELECTED_COLOR, SELECTED_OPACITY, False),
+        ],
+        layout={
+            "height": HEIGHT,
+            "mapbox_style": map_style,
+            "margin": {"r": 0, "t": 0, "l": 0, "b": 0},
+            "hoverlabel": dict(bgcolor="white", font_size=14, font_family="Arial"),
+            "mapbox": dict(bearing=0, pitch=0, uirevision=True),
+            "autosize": True,
+            "clickmode": "event+select",
+        },
+    )
+
+
+def map_figure(map_style, clustered):
+    """Nouvelle figure vide de la carte, copiée du squelette mis en cache."""
+    return copy.deepcopy(_skeleton(map_style, clustered))
+
+
+@lru_cache(maxsize=None)
+def _config(zoom_sensitivity):
+    return {
+        "scrollZoom": True,
+        "scrollZoomSpeed": 0.1 * zoom_sensitivity,
+        "displayModeBar": True,
+        "modeBarButtonsToAdd": ["zoomIn", "zoomOut", "resetView"],
+        "modeBarButtonsToRemove": ["lasso2d", "select2d"],
+        "displaylogo": False,
+    }
+
+
+def map_config(zoom_sensitivity):
+    """Configuration du graphique (zoom à la molette)."""
+    return dict(_config(zoom_sensitivity))
+
+
+def marker_sizes(capacity, size, show_capacity):
+    """
+    Tailles des points et échelle ``sizeref`` : proportionnelles à la capacité
+    (le plus grand établissement mesure ``size`` ² pixels de diamètre, comme
+    le rendu de Plotly Express), ou constantes de ``size`` pixels.
+    """
+    if not show_capacity:
+        return size, 1.0
+    capacity = np.nan_to_num(np.asarray(capacity, dtype=float))
+    largest = capacity.max() if len(capacity) else 0.0
+    return capacity, (largest if largest > 0 else 1.0) / size ** 2
+
+
+def _points(frame, id_column):
+    customdata = np.empty((len(frame), 1 + len(HOVER_COLUMNS)), dtype=object)
+    customdata[:, 0] = frame[id_column].to_numpy()
+    for i, column in enumerate(HOVER_COLUMNS, start=1):
+        customdata[:, i] = frame[column].to_numpy(dtype=object)
+    return {
+        "lat": frame[LAT_COLUMN].to_numpy(),
+        "lon": frame[LON_COLUMN].to_numpy(),
+        "hovertext": frame[HOVER_NAME].to_numpy(dtype=object),
+        "customdata": customdata,
+    }
+
+
+def update_map_figure(fig, frame, id_column, size, show_capacity, center_lat, center_lon, zoom, selected_mask=None):
+    """
+    Remplace en place les points de la figure par ceux de ``frame`` (colonnes
+    de la carte renommées), le point sélectionné (``selected_mask``) et la
+    vue ; le reste de la figure est conservé.
+    """
+    if selected_mask is None:
+        selected_mask = np.zeros(len(frame), dtype=bool)
+    sizes, sizeref = marker_sizes(frame[SIZE_COLUMN], size, show_capacity)
+    if show_capacity:
+        sizes, selected_sizes = sizes[~selected_mask], sizes[selected_mask]
+    else:
+        selected_sizes = sizes
+
+    main, overlay = fig.data
+    with fig.batch_update():
+        main.update(_points(frame.loc[~selected_mask], id_column), marker=dict(size=sizes, sizeref=sizeref))
+        overlay.update(_points(frame.loc[selected_mask], id_column), marker=dict(size=selected_sizes, sizeref=sizeref))
+        fig.layout.mapbox.center = dict(lat=center_lat, lon=center_lon)
+        fig.layout.mapbox.zoom = zoom
+    return fig
@@ -0,0 +1,109 @@
+"""
+Niveau de détail de la carte des établissements.
+
+Aux faibles niveaux de zoom, lorsque trop de points sont à afficher, on en
+conserve un échantillon stratifié sur une grille : chaque cellule garde ses
+établissements de plus forte capacité, en proportion du nombre de points
+qu'elle contient. Le détail complet est envoyé à partir de ``DETAIL_ZOOM``.
+
+Si le centre de la vue réellement affichée est connu, les points situés hors
+de la fenêtre visible (avec une marge) peuvent aussi être écartés. Ce n'est
+pas le cas de la page des établissements : les déplacements et zooms faits
+dans le navigateur ne sont pas renvoyés au serveur.
+"""
+import math
+
+import numpy as np
+
+# Dimensions approximatives de la carte affichée (en pixels)
+VIEW_WIDTH_PX = 1400
+VIEW_HEIGHT_PX = 600
+# Marge autour de la fenêtre visible, pour que les déplacements restent remplis
+VIEWPORT_MARGIN = 1.5
+# En dessous de ce zoom, la vue couvre tout le territoire : pas de découpage
+CULL_MIN_ZOOM = 6
+# À partir de ce zoom, tous les points visibles sont envoyés
+DETAIL_ZOOM = 9
+# Nombre maximal de points envoyés en dessous de DETAIL_ZOOM
+MAX_POINTS = 2500
+# Taille (en pixels) d'une cellule de la grille d'échantillonnage
+CELL_PX = 16
+
+TILE_SIZE = 256
+
+
+def _degrees_per_pixel(zoom):
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def viewport_bounds(center_lat, center_lon, zoom, width_px=VIEW_WIDTH_PX,
+                    height_px=VIEW_HEIGHT_PX, margin=VIEWPORT_MARGIN):
+    """Emprise (lat_min, lat_max, lon_min, lon_max) de la vue en projection Mercator."""
+    half_width = width_px * margin / 2 * _degrees_per_pixel(zoom)
+    # En Mercator, la hauteur se mesure sur l'ordonnée projetée
+    half_height = height_px * margin / 2 * 2 * math.pi / (TILE_SIZE * 2 ** zoom)
+    center_y = math.asinh(math.tan(math.radians(center_lat)))
+    lat_min = math.degrees(math.atan(math.sinh(center_y - half_height)))
+    lat_max = math.degrees(math.atan(math.sinh(center_y + half_height)))
+    return lat_min, lat_max, center_lon - half_width, center_lon + half_width
+
+
+def in_viewport(lat, lon, bounds):
+    """Masque des points situés dans l'emprise."""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+
+def stratified_sample(lat, lon, weights, zoom, max_points=MAX_POINTS):
+    """
+    Échantillon spatialement stratifié, pondéré par la capacité : chaque cellule
+    de la grille garde ses points les plus lourds, en proportion de son effectif.
+    Retourne les positions retenues (triées).
+    """
+    n = len(lat)
+    if n <= max_points:
+        return np.arange(n)
+    cell = CELL_PX * _degrees_per_pixel(zoom)
+    row = np.floor(lat / cell).astype(np.int64)
+    col = np.floor(lon / cell).astype(np.int64)
+    _, cell_ids, counts = np.unique(
+        np.stack([row, col], axis=1), axis=0, return_inverse=True, return_counts=True
+    )
+    cell_ids = cell_ids.ravel()
+    quota = np.maximum(1, np.floor(counts * max_points / n)).astype(np.int64)
+
+    # Tri par cellule puis par poids décroissant, rang de chaque point dans sa cellule
+    weights = np.nan_to_num(np.asarray(weights, dtype=float), nan=0.0)
+    order = np.lexsort((-weights, cell_ids))
+    sorted_cells = cell_ids[order]
+    starts = np.searchsorted(sorted_cells, np.arange(len(counts)))
+    rank = np.arange(n) - starts[sorted_cells]
+    return np.sort(order[rank < quota[sorted_cells]])
+
+
+def level_of_detail(lat, lon, weights, zoom, center_lat=None, center_lon=None,
+                    max_points=MAX_POINTS, keep=None):
+    """
+    Positions des points à envoyer au navigateur pour un niveau de zoom.
+    Les points hors de la fenêtre visible ne sont écartés que si le centre de
+    la vue est donné : il doit alors s'agir de la vue réellement affichée.
+    ``keep`` est un masque de points toujours conservés (ex. point sélectionné).
+    Retourne (positions, échantillonné) où échantillonné indique si des points
+    visibles ont été omis.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    visible = np.isfinite(lat) & np.isfinite(lon)
+    if zoom >= CULL_MIN_ZOOM and center_lat is not None and center_lon is not None:
+        visible &= in_viewport(lat, lon, viewport_bounds(center_lat, center_lon, zoom))
+    positions = np.flatnonzero(visible)
+
+    sampled = False
+    if zoom < DETAIL_ZOOM and len(positions) > max_points:
+        subset = stratified_sample(lat[positions], lon[positions], np.asarray(weights)[positions], zoom, max_points)
+        positions = positions[subset]
+        sampled = True
+
+    if keep is not None:
+        positions = np.union1d(positions, np.flatnonzero(keep))
+    return positions, sampled
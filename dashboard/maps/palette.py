@@ -0,0 +1,34 @@
+"""
+Palette pastel des clusters sous forme de table de correspondance.
+
+La table est tirée une seule fois (graine fixe) : les couleurs d'un cluster
+restent les mêmes d'un rerun à l'autre, et l'attribution des couleurs aux
+points se fait par simple indexation numpy.
+"""
+import numpy as np
+
+PALETTE_SIZE = 256
+# Couleur des points non classés (bruit des méthodes par densité)
+NOISE_COLOR = np.array([160, 160, 160], dtype=np.uint8)
+
+_rng = np.random.default_rng(42)
+PALETTE = (255 * _rng.uniform(0.4, 1, size=(PALETTE_SIZE, 3))).astype(np.uint8)
+
+
+def cluster_colors(labels):
+    """Couleurs RGB (n x 3, uint8) des étiquettes de cluster ; -1 = bruit."""
+    labels = np.asarray(labels)
+    colors = PALETTE[labels % PALETTE_SIZE]
+    colors[labels < 0] = NOISE_COLOR
+    return colors
+
+
+def to_hex(rgb):
+    """Convertit une couleur RGB en chaîne hexadécimale."""
+    return "#{:02x}{:02x}{:02x}".format(*(int(c) for c in rgb))
+
+
+def legend_colors(labels):
+    """Couleur hexadécimale de chaque étiquette distincte."""
+    unique = np.unique(labels)
+    return {int(label): to_hex(rgb) for label, rgb in zip(unique, cluster_colors(unique))}
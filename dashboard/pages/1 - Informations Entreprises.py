@@ -1,25 +1,21 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import numpy as np
-from streamlit_plotly_events import plotly_events
+from dataclasses import replace
+from data import MAP_COLUMNS, RESIDENCE_TYPES, ROW_ID, TOP_K, FilterState, excluded_types, get_dataset, get_map_rows, get_summary
+from instrumentation import start_page
+from maps import level_of_detail, map_config, map_figure, update_map_figure
+from widgets import location_filters
 
-st.set_page_config(page_title="Aperçu des établissements français", page_icon="📈", layout="wide")
-
-# Charger les données
-@st.cache_data
-def load_data(path):
-    df = pd.read_csv(path, encoding="utf-8")
-    df["Nom_Entreprise"] = df["title"] + " - " + df["noFinesset"]
-    return df
+page_timer = start_page("Informations Entreprises")
 
-df = load_data("./data/dataset_to_use.csv")
+st.set_page_config(page_title="Aperçu des établissements français", page_icon="📈", layout="wide")
 
-# Liste des régions, départements et villes
-regions = df["coordinates.region"].dropna().unique().tolist()
-departements = df["coordinates.deptname"].dropna().unique().tolist()
-cities = df["coordinates.city"].dropna().unique().tolist()
-df["Nom_Entreprise"] = df["title"] + " - " + df["noFinesset"]
+# Charger les données (table partagée entre toutes les sessions, ne pas modifier en place)
+span = page_timer.span("chargement")
+dataset = get_dataset()
+df = dataset.frame
+span.stop(rows=len(df))
 
 # Capacité maximale
 capacite = df["capacity"].dropna().max()
@@ -29,108 +25,56 @@ with st.sidebar.expander("Capacité d'accueil"):
     capacite_min = st.number_input("Capacité minimale d'accueil", min_value=0, value=70)
     capacite_max = st.number_input("Capacité maximale d'accueil", max_value=int(capacite), value=int(capacite))
 
-# Initialiser les sélections
-selected_region = None
-selected_departement = None
-selected_city = None
-
-# Application des filtres sur le DataFrame
-filtered_df = df.copy()
 with st.sidebar.expander("Localisation"):
-    # Sélection de la région
-    selected_region = st.selectbox(
-        "Choisissez une région", options=["(Toutes les régions)"] + regions
-    )
-    
-    # Dynamique : départements filtrés par région
-    if selected_region != "(Toutes les régions)":
-        filtered_deps = (
-            filtered_df[filtered_df["coordinates.region"] == selected_region]["coordinates.deptname"]
-            .unique()
-            .tolist()
-        )
-        selected_departement = st.selectbox(
-            "Choisissez un département", options=["(Tous les départements)"] + filtered_deps
-        )
-    else:
-        selected_departement = st.selectbox(
-            "Choisissez un département", options=["(Tous les départements)"] + departements
-        )
-
-    # Dynamique : villes filtrées par département
-    if selected_departement != "(Tous les départements)":
-        filtered_cities = (
-            filtered_df[filtered_df["coordinates.deptname"] == selected_departement]["coordinates.city"]
-            .unique()
-            .tolist()
-        )
-        selected_city = st.selectbox(
-            "Choisissez une ville", options=["(Toutes les villes)"] + filtered_cities
-        )
-    elif selected_region != "(Toutes les régions)":
-        # Si un département n'est pas choisi, filtrer par région pour la ville
-        filtered_cities = (
-            filtered_df[filtered_df["coordinates.region"] == selected_region]["coordinates.city"]
-            .unique()
-            .tolist()
-        )
-        selected_city = st.selectbox(
-            "Choisissez une ville", options=["(Toutes les villes)"] + filtered_cities
-        )
-    else:
-        selected_city = st.selectbox(
-            "Choisissez une ville", options=["(Toutes les villes)"] + cities
-        )
-
-
-if selected_region != "(Toutes les régions)":
-    filtered_df = filtered_df[filtered_df["coordinates.region"] == (selected_region)]
-if selected_departement != "(Tous les départements)":
-    filtered_df = filtered_df[filtered_df["coordinates.deptname"] == (selected_departement)]
-if selected_city != "(Toutes les villes)":
-    filtered_df = filtered_df[filtered_df["coordinates.city"] == selected_city]
-filtered_df = filtered_df[(filtered_df.capacity >= capacite_min) & (filtered_df.capacity <= capacite_max)]
-
-groupe = filtered_df["Nom_Entreprise"].dropna().to_list()
-
-options_residence = ["EHPAD", "EHPA", "ESLD", "Résidence Autonomie", "Accueil de Jour"]
+    selected_region, selected_departement, selected_city = location_filters(dataset.geo)
+
+# État des filtres, compilé en un seul masque par le moteur de filtres
+filter_state = FilterState(
+    region=selected_region,
+    department=selected_departement,
+    city=selected_city,
+    capacity_min=capacite_min,
+    capacity_max=capacite_max,
+)
+
+options_residence = list(RESIDENCE_TYPES)
 with st.sidebar.expander("Autres critères"):
+    # Recherche instantanée parmi les groupes de la localisation et de la capacité choisies :
+    # seuls les meilleurs résultats sont envoyés au navigateur, pas toute la liste
+    recherche_groupe = st.text_input("Rechercher un groupe", placeholder="Nom, N°Finess, identifiant ou ville")
+    span = page_timer.span("recherche")
+    lignes = dataset.search.search(recherche_groupe, k=3 * TOP_K, positions=dataset.query(filter_state).positions)
+    span.stop(rows=len(lignes))
+    groupe = list(dict.fromkeys(df["Nom_Entreprise"].take(lignes).dropna()))[:TOP_K]
     selection_groupe = st.selectbox("Nom du Groupe", options=["(Tous les groupes)"] + groupe, placeholder="Nom du groupe ou N°Finness")
     selection_residence = st.segmented_control("Type de Résidence : ", options_residence, selection_mode="multi", default=["EHPAD", "Résidence Autonomie"], help="Sélectionnez les types de résidence à afficher")
 
-
-if "EHPAD" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["IsEHPAD"] == 0]
-if "EHPA" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["IsEHPA"] == 0]
-if "ESLD" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["IsESLD"] == 0]
-if "Résidence Autonomie" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["IsRA"] == 0]
-if "Accueil de Jour" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["IsAJA"] == 0] 
-
-if selection_groupe != "(Tous les groupes)":
-    filtered_df = filtered_df[filtered_df["Nom_Entreprise"] == selection_groupe]
+filter_state = replace(
+    filter_state,
+    excluded_types=excluded_types(selection_residence),
+    group=selection_groupe if selection_groupe != "(Tous les groupes)" else None,
+)
+# Lignes retenues et indicateurs clés (résultat partagé entre les sessions, ou filtré par MongoDB)
+span = page_timer.span("filtrage")
+result = get_map_rows(dataset, filter_state)
+filtered_df = result.frame
+span.stop(rows=result.count, payload=filtered_df)
 
 # Préparer les données pour la carte
-map_df = filtered_df.rename(columns={
-    "title": "Société",
-    "coordinates.city": "Ville",
-    "coordinates.deptname": "Département",
-    "coordinates.region": "Région",
-    "capacity": "Capacité"
-})
+map_df = filtered_df.rename(columns=MAP_COLUMNS)
 
-nbr_etablissement = map_df.shape[0]
+# Indicateurs clés lus dans le cube d'agrégats (ou agrégés sur les seules lignes retenues)
+with page_timer.span("indicateurs"):
+    summary = get_summary(dataset, filter_state)
+nbr_etablissement = summary.count
 
 st.header("Informations sur les Etablissements de vieillesse")
 
 # Indicateurs clés en haut de page
 col1, col2, col3 = st.columns(3)
 col1.metric("📊 Nombre d'établissements", nbr_etablissement)
-col2.metric("🧓 Capacité totale", f"{map_df['Capacité'].sum():,} lits")
-col3.metric("📍 Région sélectionnée", selected_region if selected_region != "(Toutes les régions)" else "Toute la France")
+col2.metric("🧓 Capacité totale", f"{summary.capacity_total:,} lits")
+col3.metric("📍 Région sélectionnée", selected_region or "Toute la France")
 
 st.subheader("Carte des établissements")
 
@@ -144,6 +88,7 @@ with st.sidebar.expander("Options de la carte"):
     )
     cluster_points = st.checkbox("Regrouper les points proches", value=False, help="Regroupe les points proches pour une meilleure lisibilité de la carte")
     show_capacity = st.checkbox("Taille proportionnelle à la capacité", value=True, help="Affiche la taille des points proportionnelle à la capacité d'accueil des établissements")
+    adaptive_detail = st.checkbox("Niveau de détail adaptatif", value=True, help="Sur les vues nationales et régionales, n'envoie qu'un échantillon des plus grands établissements de chaque secteur")
     
     zoom_sensitivity = st.slider(
         "Sensibilité du zoom", 
@@ -163,15 +108,23 @@ if "map_view" not in st.session_state:
 if "map_selector" in st.session_state and st.session_state.map_selector.get("selection", {}).get("points"):
     selected_point = st.session_state.map_selector["selection"]["points"][0]
     st.session_state.selected_point = {
+        "id": selected_point.get("customdata", [None])[0],  # identifiant stable de l'établissement
         "lat": selected_point["lat"],
         "lon": selected_point["lon"]
     }
 
+# Position du point sélectionné dans la table, puis dans le résultat filtré (index de hachage)
+selected_position = None
+selected_index = None
+if st.session_state.selected_point:
+    selected_position = dataset.position_of(st.session_state.selected_point.get("id"))
+    selected_index = result.index_of(st.session_state.selected_point.get("id"))
+
 if not map_df.empty:
     # Calcul du zoom initial basé sur l'étendue géographique
-    if selected_city != "(Toutes les villes)":
+    if selected_city is not None:
         default_zoom = 11
-    elif selected_departement != "(Tous les départements)":
+    elif selected_departement is not None:
         default_zoom = 8
     else:
         default_zoom = 5
@@ -194,24 +147,31 @@ if not map_df.empty:
         center_lat = point["lat"]
         center_lon = point["lon"]
     
-    # Ajouter une colonne de couleur (vert par défaut)
-    map_df["color"] = "#741771"
-    
-    # Ajouter une colonne d'opacité
-    map_df["opacity"] = 0.9  # Transparence légère par défaut
-    
-    # Si un point est sélectionné, le mettre en évidence
-    if st.session_state.selected_point:
-        point = st.session_state.selected_point
-        # Trouver l'index du point sélectionné
-        mask = (
-            (map_df["coordinates.latitude"] == point["lat"]) & 
-            (map_df["coordinates.longitude"] == point["lon"])
+    # Masque du point sélectionné
+    selected_mask = None
+    if selected_index is not None:
+        selected_mask = np.zeros(len(map_df), dtype=bool)
+        selected_mask[selected_index] = True
+
+    # Niveau de détail : échantillon des plus grands établissements au zoom choisi par les filtres.
+    # Le navigateur ne renvoie ni son zoom ni son centre : aucun point n'est écarté hors de la vue,
+    # et tous les points sont envoyés lorsqu'un point est sélectionné (la carte peut être dézoomée)
+    if adaptive_detail and selected_mask is None:
+        span = page_timer.span("niveau de détail")
+        lod_positions, sampled = level_of_detail(
+            map_df["coordinates.latitude"],
+            map_df["coordinates.longitude"],
+            map_df["Capacité"],
+            default_zoom,
         )
-        # Mettre le point sélectionné en bleu et complètement opaque
-        map_df.loc[mask, "color"] = "#4182ad"
-        map_df.loc[mask, "opacity"] = 1.0
-    
+        span.stop(rows=len(lod_positions))
+        if sampled:
+            st.caption(
+                f"{len(lod_positions)} établissements affichés sur {len(map_df)} (les plus grands de chaque secteur) : "
+                "affinez la localisation (département, ville) pour afficher tous les établissements."
+            )
+        map_df = map_df.take(lod_positions)
+
     # Calcul dynamique de la taille basée sur le zoom
     base_size = 5 if show_capacity else 2
     
@@ -226,104 +186,31 @@ if not map_df.empty:
     dynamic_size = max(dynamic_size, min_size)  # Garantir une taille minimale
     dynamic_size = min(dynamic_size, max_size)  # Limiter la taille maximale
     
-    # Préparer les données pour Plotly
-    hover_data_config = {
-        "Société": True,
-        "Département": True,
-        "Région": True,
-        "Capacité": True,
-        "coordinates.latitude": False,
-        "coordinates.longitude": False,
-        "color": False,
-        "opacity": False
-    }
-    
-    # Créer la figure en fonction du mode d'affichage de la capacité
-    if show_capacity:
-        fig = px.scatter_mapbox(
-            map_df,
-            lat="coordinates.latitude",
-            lon="coordinates.longitude",
-            hover_name="Ville",
-            hover_data=hover_data_config,
-            size="Capacité",
-            size_max=dynamic_size,
-            color="color",
-            color_discrete_map="identity",
-            opacity=map_df["opacity"],
-            height=600
-        )
-    else:
-        # Utiliser une taille fixe pour tous les points
-        fig = px.scatter_mapbox(
-            map_df,
-            lat="coordinates.latitude",
-            lon="coordinates.longitude",
-            hover_name="Ville",
-            hover_data=hover_data_config,
-            size=[dynamic_size] * len(map_df),  # Taille constante pour tous les points
-            color="color",
-            color_discrete_map="identity",
-            opacity=map_df["opacity"],
-            height=600
-        )
-    
-    # Personnaliser l'infobulle
-    fig.update_traces(
-        hovertemplate="<b>%{hovertext}</b><br>" +
-                     "Établissement: %{customdata[0]}<br>" +
-                     "Département: %{customdata[1]}<br>" +
-                     "Région: %{customdata[2]}<br>" +
-                     "Capacité: %{customdata[3]} lits",
-        marker=dict(
-            sizemode='diameter',  # Mode de taille par diamètre
-            sizemin=min_size       # Taille minimale garantie pour tous les points
-        )
-    )
-
-    # Activer le clustering
-    if cluster_points:
-        fig.update_traces(
-            cluster=dict(
-                enabled=True,
-                size=10,
-                step=3,
-                color='rgba(231, 76, 60, 0.5)',
-                opacity=0.7,
-            )
-        )
-    
-    # Mise en forme de la carte
-    fig.update_layout(
-        mapbox_style=map_style,
-        margin={"r":0,"t":0,"l":0,"b":0},
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=14,
-            font_family="Arial"
-        ),
-        mapbox=dict(
-            center=dict(lat=center_lat, lon=center_lon),
-            zoom=zoom_level,
-            bearing=0,
-            pitch=0,
-            uirevision=True
-        ),
-        autosize=True,
-        clickmode='event+select'
+    # Figure de la session, tirée du squelette mis en cache pour ce style de carte :
+    # seuls les points, le point sélectionné (en bleu, opaque) et la vue sont remplacés
+    span = page_timer.span("figure")
+    figure_key = (map_style, cluster_points)
+    if st.session_state.get("map_figure_key") != figure_key:
+        st.session_state.map_figure = map_figure(map_style, cluster_points)
+        st.session_state.map_figure_key = figure_key
+    fig = update_map_figure(
+        st.session_state.map_figure,
+        map_df,
+        ROW_ID,
+        dynamic_size,
+        show_capacity,
+        center_lat,
+        center_lon,
+        zoom_level,
+        selected_mask=selected_mask,
     )
+    span.stop(rows=len(map_df), payload=map_df)
     
     # Configuration du zoom
-    config = {
-        'scrollZoom': True,
-        'scrollZoomSpeed': 0.1 * zoom_sensitivity,
-        'displayModeBar': True,
-        'modeBarButtonsToAdd': ['zoomIn', 'zoomOut', 'resetView'],
-        'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
-        'displaylogo': False
-    }
+    config = map_config(zoom_sensitivity)
     
-    # Afficher la carte et gérer la sélection
+    # Afficher la carte et gérer la sélection (sérialisation de la figure comprise)
+    span = page_timer.span("rendu de la carte")
     chart = st.plotly_chart(
         fig, 
         use_container_width=True, 
@@ -331,6 +218,7 @@ if not map_df.empty:
         key="map_selector",
         on_select="rerun"
     )
+    span.stop(rows=len(map_df))
     
     # Stocker l'état actuel de la vue (zoom et centre)
     st.session_state.map_view = {
@@ -347,24 +235,10 @@ if not map_df.empty:
 else:
     st.warning("Aucun établissement trouvé avec les critères sélectionnés")
 
-# Gestion de la sélection d'un point
-if "map_selector" in st.session_state and "selection" in st.session_state["map_selector"]:
-    if st.session_state.map_selector["selection"] and "points" in st.session_state.map_selector["selection"]:
-        selected_points = st.session_state.map_selector["selection"]["points"]
-        if selected_points:
-            # Stocker le point sélectionné dans l'état de session
-            st.session_state.selected_point = selected_points[0]
-
 # Afficher les détails du point sélectionné
-if st.session_state.selected_point:
-    point = st.session_state.selected_point
-    
-    # Filtrer les données pour trouver l'établissement correspondant
-    mask = (
-        (abs(filtered_df["coordinates.latitude"] - point["lat"]) < 0.0001) & 
-        (abs(filtered_df["coordinates.longitude"] - point["lon"]) < 0.0001)
-    )
-    informations_point = filtered_df[mask]
+if selected_index is not None and selected_position is not None:
+    # Établissement retrouvé par son identifiant, sans parcourir la table
+    informations_point = df.iloc[[selected_position]]
     
     if not informations_point.empty:
         # Créer un expander pour les détails
@@ -391,7 +265,7 @@ if st.session_state.selected_point:
                         "IsHTEMPO", "IsACC_JOUR", "IsACC_NUIT"   
                     ]
                     for col in types_bool_cols:
-                        st.checkbox(label=col, value=informations_point[col].values[0], disabled=True)
+                        st.checkbox(label=col, value=bool(informations_point[col].values[0]), disabled=True)
                 
                 with col2bis2:
                     types_bool_cols2 = [ 
@@ -399,7 +273,7 @@ if st.session_state.selected_point:
                         "IsPASA", "IsPUV", "IsF1", "IsF1Bis", "IsF2"
                     ]
                     for col in types_bool_cols2:
-                        st.checkbox(label=col, value=informations_point[col].values[0], disabled=True)
+                        st.checkbox(label=col, value=bool(informations_point[col].values[0]), disabled=True)
 
             # Partie 3: Coordonnées et localisation
             st.subheader("Coordonnées")
@@ -415,4 +289,6 @@ if st.session_state.selected_point:
                 st.write(f"**Téléphone**: {informations_point['coordinates.phone'].values[0]}")
                 st.write(f"**Email**: {informations_point['coordinates.emailContact'].values[0]}")
                 st.write(f"**Gestionnaire**: {informations_point['coordinates.gestionnaire'].values[0]}")
-                st.write(f"**Site Web**: {informations_point['coordinates.website'].values[0]}")
\ No newline at end of file
+                st.write(f"**Site Web**: {informations_point['coordinates.website'].values[0]}")
+
+page_timer.ready()
@@ -1,191 +1,111 @@
 import streamlit as st
 import pandas as pd
-import pydeck as pdk
-import random
 import numpy as np
-import math
-from sklearn.cluster import KMeans
+from data import (
+    RESIDENCE_TYPES, SUMMARY_COLUMNS, ZONE_COLUMNS, FilterState, excluded_types, get_dataset, get_summary, get_zone_table,
+)
+from maps.clustering import (
+    DEFAULT_EPS_KM, DEFAULT_MIN_SAMPLES, METHODS, cluster_points, cluster_summary, uses_n_clusters,
+)
+from maps.palette import cluster_colors, legend_colors
+from instrumentation import start_page
+from widgets import location_filters
+
+page_timer = start_page("Informations Zones")
 
 st.set_page_config(page_title="Aperçu des établissements français", page_icon="📈", layout="wide")
 
-df = pd.read_csv("./data/dataset_to_use.csv", encoding="utf-8")
+# Table partagée entre toutes les sessions, ne pas modifier en place
+span = page_timer.span("chargement")
+dataset = get_dataset()
+df = dataset.frame
+span.stop(rows=len(df))
 # Vérifier que les colonnes nécessaires sont présentes
 required_columns = ["coordinates.deptname", "coordinates.deptcode", "capacity", "title", "noFinesset"]
 if not all(col in df.columns for col in required_columns):
     raise ValueError("Le fichier JSON ne contient pas toutes les colonnes nécessaires : " + ", ".join(required_columns))
 
-df["Nom_Entreprise"] = df["title"] + " - " + df["noFinesset"]
-
-regions = df["coordinates.region"].dropna().unique().tolist()
-departements = df["coordinates.deptname"].dropna().unique().tolist()
 capacite = max(df["capacity"].dropna().unique().tolist())
 
 # Sélection des filtres dans Streamlit
 with st.sidebar.expander("Capacité d'accueil"):
     capacite_min = st.number_input("Capacité minimale d'accueil", min_value=0, value=0)
     capacite_max = st.number_input("Capacité maximale d'accueil", max_value=capacite, value=capacite)
-    
-# Liste des régions et des départements disponibles
-regions = df["coordinates.region"].unique().tolist()
-departements = df["coordinates.deptname"].unique().tolist()
 
-# Obtenir les listes uniques pour les filtres
-regions = df["coordinates.region"].unique().tolist()
-departements = df["coordinates.deptname"].unique().tolist()
-cities = df["coordinates.city"].unique().tolist()
+with st.sidebar.expander("Localisation"):
+    selected_region, selected_departement, selected_city = location_filters(dataset.geo)
 
-# Initialiser les sélections
-selected_region = None
-selected_departement = None
-selected_city = None
 
-with st.sidebar.expander("Localisation"):
-    # Sélection de la région
-    selected_region = st.selectbox(
-        "Choisissez une région", options=["(Toutes les régions)"] + regions
+options_residence = list(RESIDENCE_TYPES)
+with st.sidebar.expander("Autres critères"):    
+    clustering_method = st.selectbox(
+        "Algorithme de clustering",
+        options=METHODS,
+        format_func=lambda method: {
+            "auto": "Automatique", "kmeans": "KMeans", "minibatch": "MiniBatchKMeans",
+            "dbscan": "DBSCAN (haversine)", "hdbscan": "HDBSCAN (haversine)",
+        }.get(method, method),
+        help="Le mode automatique utilise MiniBatchKMeans pour les grandes sélections ; "
+             "DBSCAN et HDBSCAN regroupent par densité et laissent les points isolés non classés",
     )
-    
-    # Dynamique : départements filtrés par région
-    if selected_region != "(Toutes les régions)":
-        filtered_deps = (
-            df[df["coordinates.region"] == selected_region]["coordinates.deptname"]
-            .unique()
-            .tolist()
-        )
-        selected_departement = st.selectbox(
-            "Choisissez un département", options=["(Tous les départements)"] + filtered_deps
+    clustering_options = {}
+    if uses_n_clusters(clustering_method):
+        n_clusters = st.number_input(
+            "Nombre de cluster : ", value=15, placeholder="Choisir un nombre..."
         )
     else:
-        selected_departement = st.selectbox(
-            "Choisissez un département", options=["(Tous les départements)"] + departements
-        )
-
-    # Dynamique : villes filtrées par département
-    if selected_departement != "(Tous les départements)":
-        filtered_cities = (
-            df[df["coordinates.deptname"] == selected_departement]["coordinates.city"]
-            .unique()
-            .tolist()
-        )
-        selected_city = st.selectbox(
-            "Choisissez une ville", options=["(Toutes les villes)"] + filtered_cities
-        )
-    elif selected_region != "(Toutes les régions)":
-        # Si un département n'est pas choisi, filtrer par région pour la ville
-        filtered_cities = (
-            df[df["coordinates.region"] == selected_region]["coordinates.city"]
-            .unique()
-            .tolist()
-        )
-        selected_city = st.selectbox(
-            "Choisissez une ville", options=["(Toutes les villes)"] + filtered_cities
-        )
-    else:
-        selected_city = st.selectbox(
-            "Choisissez une ville", options=["(Toutes les villes)"] + cities
+        n_clusters = None
+        if clustering_method == "dbscan":
+            clustering_options["eps_km"] = st.number_input(
+                "Rayon de voisinage (km)", min_value=0.5, value=DEFAULT_EPS_KM, step=0.5
+            )
+        clustering_options["min_samples"] = st.number_input(
+            "Taille minimale d'un cluster", min_value=2, value=DEFAULT_MIN_SAMPLES
         )
-
-# Application des filtres sur le DataFrame
-filtered_df = df.copy()
-if selected_region != "(Toutes les régions)":
-    filtered_df = filtered_df[filtered_df["coordinates.region"] == (selected_region)]
-if selected_departement != "(Tous les départements)":
-    filtered_df = filtered_df[filtered_df["coordinates.deptname"] == (selected_departement)]
-if selected_city != "(Toutes les villes)":
-    filtered_df = filtered_df[filtered_df["coordinates.city"] == selected_city]
-filtered_df = filtered_df[(df.capacity >= capacite_min) & (df.capacity <= capacite_max)]
-
-groupe = filtered_df["Nom_Entreprise"].dropna().to_list()
-
-options_residence = ["EHPAD", "EHPA", "ESLD", "Résidence Autonomie", "Accueil de Jour"]
-with st.sidebar.expander("Autres critères"):    
-    n_clusters = st.number_input(
-        "Nombre de cluster : ", value=15, placeholder="Choisir un nombre..."
-    )
     selection_residence = st.segmented_control("Type de Résidence : ", options_residence, selection_mode="multi", default=options_residence)
 
-
-if "EHPAD" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["types.IsEHPAD"] == 0]
-if "EHPA" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["types.IsEHPA"] == 0]
-if "ESLD" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["types.IsESLD"] == 0]
-if "Résidence Autonomie" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["types.IsRA"] == 0]
-if "Accueil de Jour" not in selection_residence:
-    filtered_df = filtered_df[filtered_df["types.IsAJA"] == 0] 
-
-# Regrouper les données et calculer le nombre total de places par société
-result_df = (filtered_df
-    .groupby(["title", "noFinesset", "coordinates.region","coordinates.deptname", "coordinates.deptcode",
-              "coordinates.city", "coordinates.latitude", "coordinates.longitude"], as_index=False)
-    .agg({"capacity": "sum"})
-    .rename(columns={
-        "title": "Société", 
-        "noFinesset": "noFinesset", 
-        "coordinates.region": "region",
-        "coordinates.deptname": "nom_departement", 
-        "coordinates.deptcode": "no_departement", 
-        "coordinates.city":"ville",
-        "coordinates.latitude": "latitude", 
-        "coordinates.longitude":"longitude",
-        "capacity": "Nombre de Place"
-    })
+# Table agrégée par établissement pour les filtres (précalculée au chargement et
+# découpée selon le résultat mis en cache, ou calculée par MongoDB si ce stockage est actif)
+filter_state = FilterState(
+    region=selected_region,
+    department=selected_departement,
+    city=selected_city,
+    capacity_min=capacite_min,
+    capacity_max=capacite_max,
+    excluded_types=excluded_types(selection_residence),
 )
-
-def classify_region(lat, lon):
-    if lon > -5 and lon < 10 and lat > 41 and lat < 51:  # France métropolitaine
-        return "France Metropolitaine"
-    else:
-        return "Autre"
-
-result_df["region_geographique"] = result_df.apply(lambda x: classify_region(x["latitude"], x["longitude"]), axis=1)
-
-result_df = result_df.dropna(subset=['longitude', 'latitude'])
+span = page_timer.span("table des zones")
+result_df = get_zone_table(dataset, filter_state)
+span.stop(rows=len(result_df), payload=result_df)
+if result_df.empty:
+    st.warning("Aucun établissement trouvé avec les critères sélectionnés")
+    page_timer.ready()
+    st.stop()
 
 # Stockage des résultats
 dfs = []
 
 # Clustering par région
-for region in result_df["region_geographique"].unique():
-    # Filtrer les données pour chaque région
-    region_df = result_df[result_df["region_geographique"] == region]
-    coords = region_df[["longitude", "latitude"]].to_numpy()
-    
-    # Nombre de clusters basé sur le nombre de points dans la région
-    n_clusters = min(n_clusters, len(coords))  # Par exemple, 5 clusters max ou moins si échantillons insuffisants
-
-    if n_clusters > 1:  # Assurez-vous qu'il y a au moins 2 points pour KMeans
-        coords = np.radians(coords)
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        region_df["cluster"] = kmeans.fit_predict(coords)
-    else:
-        region_df["cluster"] = 0  # Assigne tous les points au même cluster si 1 seul échantillon
+span = page_timer.span("clustering")
+for _, region_df in result_df.groupby("region_geographique", sort=False):
+    coords = np.radians(region_df[["longitude", "latitude"]].to_numpy())
     
-    dfs.append(region_df)
-
-# Fonction pour convertir hex en RGB
-def hex_to_rgb(hex_color):
-    hex_color = hex_color.lstrip('#')  # Enlever le '#' du début
-    return [int(hex_color[i:i+2], 16) for i in (0, 2, 4)]  # Convertir chaque paire de caractères en valeur RGB
+    # Étiquettes mises en cache (mémoire et disque) selon les coordonnées et les paramètres ;
+    # le nombre de clusters est borné par le nombre de points de la région
+    labels, _ = cluster_points(coords, n_clusters, method=clustering_method, random_state=42, **clustering_options)
+    dfs.append(region_df.assign(cluster=labels))
 
 df_final = pd.concat(dfs)
+span.stop(rows=len(df_final))
 
-# Créez une palette pastel unique pour vos clusters
-unique_clusters = df_final["cluster"].unique()
-colors = {cluster: "#{:02x}{:02x}{:02x}".format(int(255 * random.uniform(0.4, 1)), 
-                                                int(255 * random.uniform(0.4, 1)), 
-                                               int(255 * random.uniform(0.4, 1))) 
-          for cluster in unique_clusters}
-
-# Assigner ces couleurs dans df_final
-df_final["color"] = df_final["cluster"].map(colors)
-df_final["rgb_color"] = df_final["color"].apply(hex_to_rgb)
+# Couleurs des clusters par table de correspondance
+df_final[["r", "g", "b"]] = cluster_colors(df_final["cluster"].to_numpy())
+colors = legend_colors(df_final["cluster"].to_numpy())
 
-df["exits_radius"] = df_final["Nombre de Place"].apply(lambda exits_count: math.exp(exits_count))
+# Affichage de la carte avec pydeck (importé à la demande, préchargé par la page d'accueil)
+span = page_timer.span("carte pydeck")
+import pydeck as pdk
 
-# Affichage de la carte avec pydeck
 st.pydeck_chart(
     pdk.Deck(
         map_style="mapbox://styles/mapbox/dark-v10",  # Style sombre
@@ -201,7 +121,7 @@ st.pydeck_chart(
                 "ScatterplotLayer",
                 data=df_final,
                 get_position=["longitude", "latitude"],  # Coordonnées
-                get_fill_color="rgb_color",  # Couleur basée sur le cluster
+                get_fill_color="[r, g, b]",  # Couleur basée sur le cluster
                 radius_scale=100,  # Encore plus grand
                 radius_min_pixels=4,  # Points bien visibles
                 radius_max_pixels=300,  # Points qui peuvent devenir très gros en zoomant
@@ -215,6 +135,7 @@ st.pydeck_chart(
         ]
     )
 )
+span.stop(rows=len(df_final), payload=df_final)
 
 # Ajouter une légende sous la carte
 st.markdown("### Légende des Clusters")
@@ -229,4 +150,42 @@ for cluster in sorted(df_final["cluster"].unique()):
         f"<div>{cluster_name}</div>"
         f"</div>",
         unsafe_allow_html=True
-    )
\ No newline at end of file
+    )
+
+# Résumé par cluster (effectif, capacité totale, centroïde), les étiquettes étant propres à chaque région
+st.markdown("### Résumé des Clusters")
+summaries = [
+    cluster_summary(
+        region_df["cluster"].to_numpy(), region_df["latitude"].to_numpy(),
+        region_df["longitude"].to_numpy(), region_df[ZONE_COLUMNS["capacity"]].to_numpy(),
+    ).assign(region_geographique=region_df["region_geographique"].iloc[0])
+    for region_df in dfs
+]
+st.dataframe(pd.concat(summaries, ignore_index=True), hide_index=True)
+
+# Synthèse par département et par statut juridique, lue dans le cube d'agrégats précalculé
+st.markdown("### Synthèse par département et statut juridique")
+with page_timer.span("synthèse"):
+    summary = get_summary(dataset, filter_state)
+col1, col2, col3 = st.columns(3)
+with col1:
+    st.markdown("**Départements ayant le plus de places**")
+    st.dataframe(
+        summary.table("coordinates.deptname", top=10, missing=False)[["coordinates.deptname", "count", "capacity_total"]].rename(columns=SUMMARY_COLUMNS),
+        hide_index=True,
+    )
+with col2:
+    st.markdown("**Nombre moyen de places par département** (au moins 10 établissements)")
+    st.dataframe(
+        summary.table("coordinates.deptname", top=10, sort_by="capacity_mean", missing=False, min_count=10)[["coordinates.deptname", "capacity_mean", "capacity_std"]]
+        .rename(columns=SUMMARY_COLUMNS).round(1),
+        hide_index=True,
+    )
+with col3:
+    st.markdown("**Places par statut juridique**")
+    st.dataframe(
+        summary.table("legal_status")[["legal_status", "count", "capacity_total", "capacity_mean"]].rename(columns=SUMMARY_COLUMNS).round(1),
+        hide_index=True,
+    )
+
+page_timer.ready()
@@ -1,55 +1,53 @@
 import streamlit as st
 import pandas as pd
-import json
-import re
 import datetime
 import uuid
-import numpy as np
+from data import (
+    PAGE_SIZES, ConflictError, column_report, compact, get_audit, get_column_metadata, get_record, get_record_grid,
+    get_record_search, get_records, record_key, record_report, record_revision, save_changes, sqlite_enabled,
+    validate_value,
+)
+from instrumentation import start_page
+
+page_timer = start_page("Modifier les Etablissements")
 
 # Configurer la page
 st.set_page_config(page_title="Gestion des Établissements", page_icon="📋", layout="wide")
 st.title("Gestion des Établissements")
 
 # Charger les métadonnées des colonnes
-@st.cache_data
-def load_metadata():
-    metadata = pd.read_csv("./data/noms_colonnes.csv", sep=";")
-    return metadata.set_index('Column Names')['Type Widget'], metadata.set_index('Column Names')['Modification Obligatoire']
-
-widget_types, mandatory_fields = load_metadata()
+widget_types, mandatory_fields = get_column_metadata()
 
-# Charger les données JSON
-@st.cache_resource
-def load_data(file_path):
+# Charger les données JSON (table partagée entre toutes les sessions, ne pas modifier en place)
+def load_data():
     try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
-        df = pd.json_normalize(data)
-        # Convertir les champs Date
-        date_cols = [col for col, wt in widget_types.items() if 'Date' in wt]
-        for col in date_cols:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-        return df
+        return get_records()
     except Exception as e:
         st.error(f"Erreur lors du chargement du fichier : {e}")
         return pd.DataFrame()
 
-def save_data(dataframe, file_path):
-    # Nettoyage des valeurs NaN/Nat
-    dataframe = dataframe.replace({np.nan: None})
-    # Conversion des dates
-    for col in dataframe.columns:
-        if pd.api.types.is_datetime64_any_dtype(dataframe[col]):
-            dataframe[col] = dataframe[col].dt.strftime('%Y-%m-%d')
+def save_data(changes, expected):
+    # Enregistrement des seuls établissements modifiés (identifiant -> champs), à condition
+    # que leur révision soit toujours celle lue à l'ouverture du formulaire
     try:
-        with open(file_path, "w") as f:
-            json.dump(dataframe.to_dict(orient="records"), f, indent=4)
+        with page_timer.span("sauvegarde"):
+            revisions = save_changes(changes, expected)
         st.success("Données sauvegardées avec succès !")
+        return revisions
+    except ConflictError as e:
+        if all(revision is None for revision, _ in e.conflicts.values()):
+            st.error("Un établissement avec cet identifiant existe déjà.")
+        else:
+            st.error("Cet établissement a été modifié par un autre utilisateur depuis l'ouverture du formulaire. "
+                     "Vérifiez les valeurs actuelles avant d'enregistrer à nouveau.")
     except Exception as e:
         st.error(f"Erreur lors de la sauvegarde : {e}")
+    return None
         
 # Charger les données
-df = load_data("./data/base-etablissement.json")
+span = page_timer.span("chargement")
+df = load_data()
+span.stop(rows=len(df))
 
 # Définir les options pour les selectbox
 OPTIONS_CONFIG = {
@@ -65,36 +63,8 @@ def get_unique_values(column_name):
 
 # Fonction de validation
 def validate_input(value, widget_type, mandatory):
-    messages = []
-    valid = True
-    
-    if mandatory and (value == "" or pd.isnull(value)):
-        messages.append("Ce champ est obligatoire")
-        valid = False
-    
-    if widget_type == 'Structure telephonique' and value:
-        if not re.match(r'^\+?[0-9 .-]{8,}$', str(value)):
-            messages.append("Format téléphone invalide (+XX X XX XX XX)")
-            valid = False
-            
-    if widget_type == 'Structure mail' and value:
-        if not re.match(r'^[\w.-]+@[\w.-]+\.\w+$', str(value)):
-            messages.append("Format email invalide (exemple@domaine.com)")
-            valid = False
-            
-    if 'Date' in widget_type and value:
-        try:
-            pd.to_datetime(value)
-        except:
-            messages.append("Format date invalide (AAAA-MM-JJ)")
-            valid = False
-            
-    if widget_type == 'Nombre' and value:
-        if not str(value).replace('.', '').isdigit():
-            messages.append("Doit être un nombre valide")
-            valid = False
-            
-    return valid, ", ".join(messages)
+    # Mêmes règles que l'audit de toute la base (data.audit)
+    return validate_value(value, widget_type, mandatory)
 
 # Configuration des sections
 SECTION_CONFIG = {
@@ -158,7 +128,11 @@ if 'creation_errors' not in st.session_state:
 if 'modification_errors' not in st.session_state:
     st.session_state.modification_errors = {}
 
-def create_form_section(title, fields, entry, updates, key_prefix=""):
+# Révision de chaque établissement au moment où son formulaire a été ouvert
+if 'revisions' not in st.session_state:
+    st.session_state.revisions = {}
+
+def create_form_section(title, fields, entry, updates, key_prefix="", errors=None):
     """Crée une section de formulaire générique avec clés uniques"""
     with st.container():
         if title:
@@ -206,7 +180,6 @@ def create_form_section(title, fields, entry, updates, key_prefix=""):
 
 # Fonction de création d'un nouvel établissement
 def create_new_establishment():
-    global df
     st.subheader("➕ Créer un Nouvel Établissement")
     with st.form("create_form"):
         updates = {}
@@ -291,11 +264,13 @@ def create_new_establishment():
                 errors["Conversion"] = f"Erreur de conversion des données: {str(e)}"
 
             if not errors:
-                new_df = pd.DataFrame([updates])
-                df = pd.concat([df, new_df], ignore_index=True)
-                save_data(df, "./data/base-etablissement.json")
-                st.success("Établissement créé avec succès!")
-                st.experimental_rerun()
+                # Identifiant numérique saisi sous forme de texte : même clé que les établissements existants
+                record_id = record_key(updates.get('_id') or new_id)
+                updates['_id'] = record_id
+                if save_data({record_id: updates}, expected={record_id: None}):
+                    st.success("Établissement créé avec succès!")
+                    page_timer.ready()
+                    st.rerun()
             else:
                 st.error("## Erreurs dans le formulaire :")
                 for field, msg in errors.items():
@@ -304,12 +279,30 @@ def create_new_establishment():
 # Fonction de modification d'un établissement existant
 def modify_establishment():
     st.subheader("✏️ Modifier un Établissement")
-    selected_id = st.selectbox("Sélectionnez un établissement", options=[""] + list(df["_id"].unique()))
+    recherche = st.text_input("Rechercher un établissement", placeholder="Nom, N° FINESS, identifiant ou ville")
+    # Seuls les meilleurs résultats de l'index sont proposés (et non toute la base)
+    span = page_timer.span("recherche")
+    matches = df.take(get_record_search().search(recherche))
+    span.stop(rows=len(matches))
+    matches = matches.reindex(columns=["_id", "title", "noFinesset", "coordinates.city"]).astype(object).fillna("")
+    labels = {
+        row_id: f"{title} - {finess} ({city})"
+        for row_id, title, finess, city in matches.itertuples(index=False)
+    }
+    selected_id = st.selectbox(
+        "Sélectionnez un établissement",
+        options=[""] + list(labels),
+        format_func=lambda row_id: labels.get(row_id, str(row_id)),
+        key="modify_selected_id",
+    )
     
     if selected_id:
-        entry = df[df["_id"] == selected_id].iloc[0].to_dict()
+        entry = get_record(selected_id)
+        revisions = st.session_state.revisions
+        if selected_id not in revisions:
+            revisions[selected_id] = record_revision(entry)
         updates = {}
-        errors = []
+        errors = {}
         
         with st.form(f"modify_{selected_id}"):
             # Dans le formulaire de modification
@@ -381,9 +374,16 @@ def modify_establishment():
                             errors["Conversion"] = f"Erreur de conversion: {str(e)}"
 
                         if not errors:
-                            df.loc[df['_id'] == selected_id] = pd.Series(updates)
-                            save_data(df, "./data/base-etablissement.json")
-                            st.success("Modifications sauvegardées avec succès!")
+                            # L'identifiant désigne l'établissement modifié : il n'est pas réécrit
+                            updates.pop('_id', None)
+                            saved = save_data({selected_id: updates}, expected={selected_id: revisions[selected_id]})
+                            if saved:
+                                # Les prochaines modifications partent de la révision enregistrée
+                                revisions[selected_id] = saved[selected_id]
+                                st.success("Modifications sauvegardées avec succès!")
+                            else:
+                                # En cas de conflit, la révision courante sera relue au prochain affichage
+                                revisions.pop(selected_id, None)
                         else:
                             # Affichage des erreurs
                             st.error("## Erreurs dans le formulaire :")
@@ -397,6 +397,67 @@ with col1:
 with col2:
     create_new_establishment()
 
-# Affichage des données brutes
+# Compactage à la demande du journal des modifications dans la base JSON
+if not sqlite_enabled():
+    if st.sidebar.button("🗜️ Compacter le journal des modifications"):
+        try:
+            st.sidebar.success(f"{compact()} modification(s) compactée(s)")
+        except Exception as e:
+            st.sidebar.error(f"Erreur lors du compactage : {e}")
+
+# Affichage des données brutes, page par page (tri et filtre appliqués côté serveur)
 st.subheader("📊 Données Brutes")
-st.dataframe(df, height=300, use_container_width=True)
\ No newline at end of file
+span = page_timer.span("grille")
+grid = get_record_grid()
+sort_col, order_col, filter_col, text_col = st.columns([2, 1, 2, 2])
+with sort_col:
+    sort_by = st.selectbox("Trier par", options=[""] + grid.columns, format_func=lambda col: col or "Ordre d'origine")
+with order_col:
+    descending = st.toggle("Décroissant", value=False, disabled=not sort_by)
+with filter_col:
+    filter_by = st.selectbox("Filtrer la colonne", options=[""] + grid.columns, format_func=lambda col: col or "Aucun filtre")
+with text_col:
+    filter_text = st.text_input("Contient", value="", disabled=not filter_by)
+
+filters = {filter_by: filter_text} if filter_by and filter_text else {}
+total_rows = len(grid.positions(sort_by or None, descending, filters))
+size_col, page_col = st.columns([1, 1])
+with size_col:
+    page_size = st.selectbox("Lignes par page", options=PAGE_SIZES)
+with page_col:
+    page_count = max(1, -(-total_rows // page_size))
+    page_number = st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1)
+
+page_df, _ = grid.page(page_number, page_size, sort_by or None, descending, filters)
+st.dataframe(page_df, height=300, use_container_width=True)
+span.stop(rows=len(page_df), payload=page_df)
+first_row = (page_number - 1) * page_size
+st.caption(f"Lignes {min(first_row + 1, total_rows)} à {first_row + len(page_df)} sur {total_rows}")
+# Audit de toute la base selon les règles du formulaire (calculé à la demande, puis mis en cache)
+with st.expander("🔎 Audit de la qualité des données"):
+    if st.button("Lancer l'audit") or st.session_state.get("audit_requested"):
+        st.session_state.audit_requested = True
+        with page_timer.span("audit"):
+            violations, audited = get_audit()
+        by_column = column_report(violations, audited)
+        by_record = record_report(violations)
+        st.caption(f"{len(violations)} infraction(s) sur {len(by_record)} établissement(s) / {audited}")
+        st.markdown("**Par colonne**")
+        st.dataframe(by_column, use_container_width=True, hide_index=True)
+        st.markdown("**Par établissement**")
+        st.dataframe(by_record, height=300, use_container_width=True, hide_index=True)
+        for name, report in [("colonnes", by_column), ("etablissements", by_record)]:
+            csv_col, json_col = st.columns(2)
+            with csv_col:
+                st.download_button(
+                    f"Télécharger le rapport par {name} (CSV)", report.to_csv(sep=";", index=False),
+                    file_name=f"audit_{name}.csv", mime="text/csv",
+                )
+            with json_col:
+                st.download_button(
+                    f"Télécharger le rapport par {name} (JSON)",
+                    report.to_json(orient="records", force_ascii=False, date_format="iso"),
+                    file_name=f"audit_{name}.json", mime="application/json",
+                )
+
+page_timer.ready()
@@ -0,0 +1,137 @@
+"""
+Préchargement en tâche de fond au démarrage du serveur.
+
+Lancé par la page d'accueil, un fil d'exécution importe les bibliothèques
+lourdes des pages (Plotly, pydeck, scikit-learn), charge les tables partagées
+et leurs index puis calcule les vues par défaut des pages (carte des
+établissements et squelette de sa figure, table des zones et clusters,
+grille de l'éditeur) pendant que la page d'accueil s'affiche. Les résultats sont déposés dans les caches
+partagés (``st.cache_resource``, cache des résultats et des clusters) : le
+premier visiteur d'une page ne paie plus le démarrage à froid.
+
+Le préchargement n'a lieu qu'une fois par processus ; une erreur est
+enregistrée dans l'état du préchargement sans interrompre l'application.
+"""
+import importlib
+import logging
+import threading
+import time
+
+# Bibliothèques importées à la demande par les pages
+WARM_MODULES = ["plotly.graph_objects", "pydeck", "sklearn.cluster"]
+
+# Vues par défaut des pages (mêmes valeurs que les widgets des pages)
+ENTERPRISE_CAPACITY_MIN = 70
+ENTERPRISE_TYPES = ["EHPAD", "Résidence Autonomie"]
+ENTERPRISE_MAP_STYLE = "open-street-map"
+ZONE_N_CLUSTERS = 15
+
+THREAD_NAME = "warm-start"
+# Journal de Streamlit signalant les appels hors session (attendus dans ce fil d'exécution)
+SCRIPT_RUN_CONTEXT_LOGGER = "streamlit.runtime.scriptrunner_utils.script_run_context"
+
+_status = {"state": "idle", "steps": {}, "error": None, "duration_s": None}
+_lock = threading.Lock()
+
+
+def _import_modules():
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+
+
+def _warm_dataset():
+    from data import get_dataset
+
+    dataset = get_dataset()
+    # Index de recherche construit à la première recherche
+    dataset.search
+    return dataset
+
+
+def _warm_enterprises(dataset):
+    from data import FilterState, excluded_types, get_map_rows, get_summary
+    from maps import map_figure
+
+    state = FilterState(
+        capacity_min=ENTERPRISE_CAPACITY_MIN,
+        capacity_max=int(dataset.frame["capacity"].dropna().max()),
+        excluded_types=excluded_types(ENTERPRISE_TYPES),
+    )
+    get_map_rows(dataset, state)
+    get_summary(dataset, state)
+    # Squelette de la figure de la carte (style par défaut, points non regroupés)
+    map_figure(ENTERPRISE_MAP_STYLE, False)
+
+
+def _warm_zones(dataset):
+    import numpy as np
+
+    from data import RESIDENCE_TYPES, FilterState, excluded_types, get_summary, get_zone_table
+    from maps.clustering import cluster_points
+
+    state = FilterState(
+        capacity_min=0,
+        capacity_max=dataset.frame["capacity"].dropna().max(),
+        excluded_types=excluded_types(list(RESIDENCE_TYPES)),
+    )
+    zones = get_zone_table(dataset, state)
+    get_summary(dataset, state)
+    # Clusters de chaque région, comme sur la page (méthode automatique)
+    for _, region_df in zones.groupby("region_geographique", sort=False):
+        coords = np.radians(region_df[["longitude", "latitude"]].to_numpy())
+        cluster_points(coords, ZONE_N_CLUSTERS, method="auto", random_state=42)
+
+
+def _warm_editor():
+    from data import get_column_metadata, get_record_grid, get_record_search
+
+    get_column_metadata()
+    get_record_grid()
+    get_record_search()
+
+
+def _step(name, warm, *args):
+    start = time.perf_counter()
+    value = warm(*args)
+    with _lock:
+        _status["steps"][name] = time.perf_counter() - start
+    return value
+
+
+def _run():
+    start = time.perf_counter()
+    try:
+        _step("imports", _import_modules)
+        dataset = _step("dataset", _warm_dataset)
+        _step("enterprises", _warm_enterprises, dataset)
+        _step("zones", _warm_zones, dataset)
+        _step("editor", _warm_editor)
+        state, error = "done", None
+    except Exception as e:
+        state, error = "failed", f"{type(e).__name__}: {e}"
+    with _lock:
+        _status.update(state=state, error=error, duration_s=time.perf_counter() - start)
+
+
+class _OutsideSessionFilter(logging.Filter):
+    """Écarte les avertissements « missing ScriptRunContext » émis par le préchargement."""
+
+    def filter(self, record):
+        return record.threadName != THREAD_NAME
+
+
+def warm_start():
+    """Lance le préchargement en tâche de fond (une seule fois par processus)."""
+    with _lock:
+        if _status["state"] != "idle":
+            return False
+        _status["state"] = "running"
+    logging.getLogger(SCRIPT_RUN_CONTEXT_LOGGER).addFilter(_OutsideSessionFilter())
+    threading.Thread(target=_run, name=THREAD_NAME, daemon=True).start()
+    return True
+
+
+def status():
+    """État du préchargement : « idle », « running », « done » ou « failed », et durée de chaque étape."""
+    with _lock:
+        return {**_status, "steps": dict(_status["steps"])}
@@ -0,0 +1,30 @@
+"""Composants d'interface partagés par les pages du tableau de bord."""
+import streamlit as st
+
+ALL_REGIONS = "(Toutes les régions)"
+ALL_DEPARTMENTS = "(Tous les départements)"
+ALL_CITIES = "(Toutes les villes)"
+
+
+def _selection(value, all_label):
+    return None if value == all_label else value
+
+
+def location_filters(geo):
+    """
+    Sélecteurs en cascade région → département → ville, alimentés par l'index
+    géographique. Retourne (région, département, ville), None signifiant « tous ».
+    """
+    region = _selection(
+        st.selectbox("Choisissez une région", options=[ALL_REGIONS] + geo.regions),
+        ALL_REGIONS,
+    )
+    departement = _selection(
+        st.selectbox("Choisissez un département", options=[ALL_DEPARTMENTS] + geo.departments_of(region)),
+        ALL_DEPARTMENTS,
+    )
+    city = _selection(
+        st.selectbox("Choisissez une ville", options=[ALL_CITIES] + geo.cities_of(region, departement)),
+        ALL_CITIES,
+    )
+    return region, departement, city
@@ -0,0 +1,5 @@
+"""Les tests importent les modules du tableau de bord comme les pages (``dashboard/`` dans le chemin)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dashboard"))
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.cube import RollupCube, capacity_bucket
+from data.filters import RESIDENCE_TYPES, FilterState, excluded_types
+from data.snapshot import apply_schema
+from data.store import Dataset, add_derived_columns
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    n = 2000
+    capacity = rng.integers(0, 300, n).astype(float)
+    capacity[rng.random(n) < 0.1] = np.nan
+    data = {
+        "coordinates.region": rng.choice(["Bretagne", "Normandie", None], n),
+        "coordinates.deptname": rng.choice(["FINISTERE", "MANCHE", "ORNE"], n),
+        "legal_status": rng.choice(["Public", "Privé"], n),
+        "capacity": capacity,
+    }
+    for col in RESIDENCE_TYPES.values():
+        data[col] = rng.choice(np.array([True, False, None], dtype=object), n)
+    return pd.DataFrame(data)
+
+
+def _expected(frame, state):
+    keep = pd.Series(True, index=frame.index)
+    if state.region is not None:
+        keep &= frame["coordinates.region"].eq(state.region)
+    if state.capacity_min is not None:
+        keep &= frame["capacity"] >= state.capacity_min
+    if state.capacity_max is not None:
+        keep &= frame["capacity"] <= state.capacity_max
+    for col in state.excluded_types:
+        keep &= frame[col].eq(False).fillna(False).astype(bool)
+    return frame.loc[keep, "capacity"]
+
+
+def test_capacity_bucket_isolates_edges():
+    buckets = capacity_bucket([np.nan, -1, 0, 5, 10, 10.5, 1000], edges=[0, 10])
+    assert buckets.tolist() == [-1, 0, 1, 2, 3, 4, 4]
+
+
+@pytest.mark.parametrize("capacity_min, capacity_max", [(None, None), (70, 299), (0, 70), (10, 200), (70, None)])
+@pytest.mark.parametrize("region", [None, "Bretagne"])
+@pytest.mark.parametrize("types", [list(RESIDENCE_TYPES), ["EHPAD", "Résidence Autonomie"]])
+def test_cube_matches_row_filters_on_bucket_edges(frame, capacity_min, capacity_max, region, types):
+    cube = RollupCube(frame)
+    state = FilterState(region=region, capacity_min=capacity_min, capacity_max=capacity_max,
+                        excluded_types=excluded_types(types))
+    assert cube.answers(state)
+    expected = _expected(frame, state)
+    summary = cube.slice(state)
+    assert summary.count == len(expected)
+    assert summary.capacity_total == pytest.approx(expected.sum())
+    assert summary.capacity_std == pytest.approx(expected.std())
+
+
+def test_cube_declines_bounds_between_edges(frame):
+    cube = RollupCube(frame)
+    assert not cube.answers(FilterState(capacity_min=55))
+    assert not cube.answers(FilterState(capacity_max=123))
+    assert not cube.answers(FilterState(city="Brest"))
+
+
+@pytest.mark.parametrize("capacity_min, capacity_max", [(55, None), (None, 123), (55, 123), (10, 123)])
+@pytest.mark.parametrize("region", [None, "Normandie"])
+def test_summary_between_edges_falls_back_to_rows(frame, capacity_min, capacity_max, region):
+    data = frame.assign(_id=np.arange(len(frame)), title="EHPAD", noFinesset="290000017")
+    dataset = Dataset(add_derived_columns(apply_schema(data)), "test")
+    state = FilterState(region=region, capacity_min=capacity_min, capacity_max=capacity_max,
+                        excluded_types=excluded_types(["EHPAD"]))
+    # Une borne entre deux tranches : le cube ne peut pas répondre
+    assert not dataset.cube.answers(dataset.filters.normalize(state))
+
+    expected = _expected(dataset.frame, state)
+    summary = dataset.summary(state)
+    assert summary.count == len(expected)
+    assert summary.capacity_total == pytest.approx(expected.sum())
+    assert summary.capacity_mean == pytest.approx(expected.mean())
+    assert summary.capacity_std == pytest.approx(expected.std())
+
+    table = summary.table("coordinates.deptname").set_index("coordinates.deptname")
+    rows = dataset.frame.loc[expected.index].groupby("coordinates.deptname", observed=True)["capacity"]
+    assert table["count"].to_dict() == rows.size().to_dict()
+    assert table["capacity_total"].to_dict() == pytest.approx(rows.sum().to_dict())
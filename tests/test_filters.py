@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.filters import RESIDENCE_TYPES, FilterState, excluded_types
+from data.snapshot import BOOL_COLUMNS, apply_schema
+from data.store import Dataset, add_derived_columns
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    rng = np.random.default_rng(1)
+    n = 400
+    places = [
+        ("Bretagne", "FINISTERE", "Brest"), ("Bretagne", "FINISTERE", "Quimper"),
+        ("Bretagne", "MORBIHAN", "Vannes"), ("Normandie", "MANCHE", "Cherbourg"),
+        ("Normandie", "ORNE", "Alençon"), (None, None, None),
+    ]
+    region, department, city = zip(*(places[i] for i in rng.integers(0, len(places), n)))
+    capacity = rng.integers(0, 200, n).astype(float)
+    capacity[rng.random(n) < 0.1] = np.nan
+    data = {
+        "_id": np.arange(1, n + 1),
+        # Quelques groupes partagent un même titre et numéro FINESS
+        "title": rng.choice(["EHPAD Les Tilleuls", "Résidence du Port", "EHPAD des Pins"], n),
+        "noFinesset": rng.choice(["290000017", "290000025", "500000031"], n),
+        "capacity": capacity,
+        "legal_status": rng.choice(["Public", "Privé"], n),
+        "coordinates.region": region,
+        "coordinates.deptname": department,
+        "coordinates.city": city,
+        "coordinates.latitude": rng.uniform(43, 50, n),
+        "coordinates.longitude": rng.uniform(-4, 7, n),
+    }
+    for col in BOOL_COLUMNS:
+        # Indicateurs vrais, faux ou inconnus
+        data[col] = rng.choice(np.array([True, False, None], dtype=object), n)
+    return Dataset(add_derived_columns(apply_schema(pd.DataFrame(data))), "test")
+
+
+def _expected(frame, state):
+    """Chaîne de filtres pandas d'origine des pages."""
+    keep = pd.Series(True, index=frame.index)
+    for column, value in (
+        ("coordinates.region", state.region),
+        ("coordinates.deptname", state.department),
+        ("coordinates.city", state.city),
+        ("Nom_Entreprise", state.group),
+    ):
+        if value is not None:
+            keep &= frame[column].astype(object) == value
+    if state.capacity_min is not None:
+        keep &= frame["capacity"] >= state.capacity_min
+    if state.capacity_max is not None:
+        keep &= frame["capacity"] <= state.capacity_max
+    for col in state.excluded_types:
+        keep &= (frame[col] == 0).fillna(False).astype(bool)
+    return np.flatnonzero(keep.to_numpy())
+
+
+STATES = [
+    FilterState(),
+    FilterState(region="Bretagne"),
+    FilterState(region="Bretagne", department="FINISTERE"),
+    FilterState(department="MORBIHAN", city="Vannes"),
+    FilterState(city="Cherbourg", capacity_min=50),
+    FilterState(region="Bretagne", city="Cherbourg"),
+    FilterState(region="Corse"),
+    FilterState(capacity_min=20, capacity_max=120),
+    FilterState(capacity_min=-10, capacity_max=1000),
+    FilterState(capacity_max=0),
+    FilterState(excluded_types=excluded_types(["EHPAD", "Résidence Autonomie"])),
+    FilterState(excluded_types=excluded_types(list(RESIDENCE_TYPES))),
+    FilterState(excluded_types=excluded_types([])),
+    FilterState(group="EHPAD des Pins - 290000025"),
+    FilterState(group="EHPAD des Pins - 290000025", region="Normandie", capacity_min=10),
+    FilterState(group="Inconnu - 000000000"),
+]
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_query_matches_pandas_filters(dataset, state):
+    result = dataset.query(state)
+    expected = _expected(dataset.frame, state)
+    assert result.positions.tolist() == expected.tolist()
+    assert result.capacity_total == pytest.approx(np.nansum(dataset.frame["capacity"].to_numpy()[expected]))
+
+
+def test_unknown_type_flags_are_excluded(dataset):
+    unknown = dataset.frame["IsEHPAD"].isna().to_numpy()
+    positions = dataset.query(FilterState(excluded_types=frozenset({"IsEHPAD"}))).positions
+    assert unknown.any()
+    assert not unknown[positions].any()
+
+
+def test_normalize_clamps_capacity_bounds_to_the_data(dataset):
+    capacity = dataset.frame["capacity"]
+    low, high = capacity.min(), capacity.max()
+    state = dataset.filters.normalize(FilterState(capacity_min=-10, capacity_max=1000))
+    assert (state.capacity_min, state.capacity_max) == (low, high)
+    # Deux états équivalents partagent le même résultat en cache
+    assert dataset.query(FilterState(capacity_min=-10)) is dataset.query(FilterState(capacity_min=low - 1))
+    assert dataset.filters.normalize(FilterState(excluded_types={"IsRA"})).excluded_types == frozenset({"IsRA"})
+
+
+def test_index_of_gives_the_rank_in_the_result(dataset):
+    result = dataset.query(FilterState(region="Bretagne"))
+    for rank, position in enumerate(result.positions[:20]):
+        assert result.index_of(int(position)) == rank
+    outside = dataset.query(FilterState(region="Normandie")).positions[0]
+    assert result.index_of(int(outside)) is None
+    assert result.index_of(None) is None
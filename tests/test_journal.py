@@ -0,0 +1,158 @@
+import copy
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import journal
+from data.journal import (
+    ConflictError,
+    append_changes,
+    apply_changes,
+    commit,
+    compact,
+    compact_in_background,
+    fold,
+    journal_path,
+    merge_changes,
+    read_journal,
+    record_key,
+    write_records,
+)
+
+
+def test_record_key_normalizes_numeric_ids():
+    assert record_key("17") == 17
+    assert record_key(" 17 ") == 17
+    assert record_key(17.0) == 17
+    assert record_key(np.int64(17)) == 17
+    assert record_key("-3") == -3
+    # Les identifiants non numériques (uuid) sont conservés
+    assert record_key("0b5c-17") == "0b5c-17"
+    assert record_key("") == ""
+
+
+def test_create_with_numeric_string_id_conflicts_with_existing_record(tmp_path):
+    path = journal_path(str(tmp_path / "base.json"))
+    base = {17: 0}
+
+    # « 17 » saisi dans le formulaire de création désigne l'établissement 17, qui existe déjà
+    with pytest.raises(ConflictError) as error:
+        commit({"17": {"title": "Doublon"}}, path, expected={"17": None}, base_revisions=lambda: base)
+    assert error.value.conflicts == {"17": (None, 0)}
+    assert read_journal(path) == ([], 0)
+
+    # Un identifiant libre est accepté, puis sa recréation est refusée
+    commit({"18": {"title": "Nouveau"}}, path, expected={"18": None}, base_revisions=lambda: base)
+    with pytest.raises(ConflictError):
+        commit({18: {"title": "Doublon"}}, path, expected={18: None}, base_revisions=lambda: base)
+
+
+def test_apply_changes_matches_numeric_string_ids():
+    frame = pd.DataFrame({"_id": [16, 17], "title": ["A", "B"]})
+    changed = apply_changes(frame, {"17": {"title": "B modifié"}})
+    assert len(changed) == 2
+    assert changed["title"].tolist() == ["A", "B modifié"]
+
+
+BASE_RECORDS = [
+    {"_id": 1, "title": "EHPAD Les Tilleuls", "capacity": 80, "coordinates": {"city": "Brest"}},
+    {"_id": 2, "title": "Résidence du Port", "capacity": None, "coordinates": {"city": "Quimper"}},
+]
+
+
+@pytest.fixture
+def records_path(tmp_path):
+    path = str(tmp_path / "base.json")
+    write_records(copy.deepcopy(BASE_RECORDS), path)
+    return path
+
+
+def _base_revisions(records_path):
+    def revisions():
+        with open(records_path) as f:
+            return {record_key(record["_id"]): record.get("_rev", 0) for record in json.load(f)}
+    return revisions
+
+
+def _records(records_path):
+    """Base rejouée : instantané JSON puis changements du journal."""
+    with open(records_path) as f:
+        records = json.load(f)
+    entries, _ = read_journal(journal_path(records_path))
+    return merge_changes(records, fold(entries))
+
+
+def _edit(records_path):
+    path = journal_path(records_path)
+    revisions = _base_revisions(records_path)
+    commit({1: {"capacity": 90, "coordinates.city": "Brest Centre"}}, path, {1: 0}, revisions)
+    commit({2: {"capacity": 40}}, path, {2: 0}, revisions)
+    commit({1: {"title": "EHPAD Les Tilleuls (nouveau)"}}, path, {1: 1}, revisions)
+    commit({3: {"title": "Nouveau", "coordinates.city": "Vannes"}}, path, {3: None}, revisions)
+
+
+def test_compacted_journal_folds_to_the_same_records(records_path):
+    _edit(records_path)
+    raw = _records(records_path)
+
+    assert compact(records_path) == 4
+    assert not os.path.exists(journal_path(records_path))
+    with open(records_path) as f:
+        assert json.load(f) == raw
+    assert raw[0]["coordinates"] == {"city": "Brest Centre"}
+    assert [record["_rev"] for record in raw] == [2, 1, 1]
+
+
+def test_lines_appended_during_compaction_survive(records_path, monkeypatch):
+    _edit(records_path)
+    path = journal_path(records_path)
+    rewrite = journal.write_records
+
+    def append_while_rewriting(records, target):
+        # Un autre processus ajoute au journal entre sa lecture et la réécriture de la base
+        append_changes({2: {"title": "Résidence du Port (nouveau)"}}, path, {2: 2})
+        rewrite(records, target)
+
+    monkeypatch.setattr(journal, "write_records", append_while_rewriting)
+    assert compact(records_path) == 4
+
+    entries, _ = read_journal(path)
+    assert [(entry["_id"], entry["rev"]) for entry in entries] == [(2, 2)]
+    records = _records(records_path)
+    assert records[1]["title"] == "Résidence du Port (nouveau)"
+    assert records[1]["_rev"] == 2
+    assert records[1]["capacity"] == 40
+
+
+def test_stale_revision_conflicts_after_compaction(records_path):
+    _edit(records_path)
+    compact(records_path)
+    path = journal_path(records_path)
+
+    # Révision lue avant le compactage : l'établissement a été modifié depuis
+    with pytest.raises(ConflictError) as error:
+        commit({1: {"capacity": 100}}, path, {1: 1}, _base_revisions(records_path))
+    assert error.value.conflicts == {1: (1, 2)}
+    with pytest.raises(ConflictError):
+        commit({3: {"title": "Doublon"}}, path, {3: None}, _base_revisions(records_path))
+    assert read_journal(path) == ([], 0)
+
+    # La révision courante, lue dans la base compactée, est acceptée
+    assert commit({1: {"capacity": 100}}, path, {1: 2}, _base_revisions(records_path)) == {1: 3}
+
+
+def test_background_compaction(records_path):
+    _edit(records_path)
+    raw = _records(records_path)
+    assert not compact_in_background(records_path, threshold=1 << 30)
+
+    assert compact_in_background(records_path, threshold=0)
+    for thread in threading.enumerate():
+        if thread.name == "journal-compaction":
+            thread.join()
+    assert not os.path.exists(journal_path(records_path))
+    assert _records(records_path) == raw
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from data import mongo
+from data.journal import append_changes, journal_path
+
+pytest.importorskip("mongomock")
+
+RECORDS = [
+    {"_id": 1, "title": "EHPAD [Les Tilleuls], Brest", "capacity": 80, "coordinates": {"city": "Brest"}},
+    {"_id": 2, "title": "Résidence \"Les Pins\"", "capacity": None, "coordinates": {"city": "Quimper"}},
+    {"_id": 3, "title": "EHPAD du Port", "capacity": 45.5, "coordinates": {"city": "Lorient"}},
+]
+
+
+@pytest.fixture
+def records_path(tmp_path):
+    path = tmp_path / "base-etablissement.json"
+    path.write_text(json.dumps(RECORDS, indent=4, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 16, mongo.CHUNK_SIZE])
+def test_iter_json_array_matches_json_load(records_path, chunk_size):
+    assert list(mongo.iter_json_array(records_path, chunk_size)) == RECORDS
+
+
+def test_establishment_documents_include_journal_changes(records_path):
+    append_changes({2: {"capacity": 60}, 4: {"title": "Nouveau", "coordinates.city": "Vannes"}},
+                   journal_path(records_path), {2: 1, 4: 1})
+    documents = list(mongo.establishment_documents(records_path))
+    assert [doc["_id"] for doc in documents] == [1, 2, 3, 4]
+    assert documents[1]["capacity"] == 60
+    assert documents[3]["coordinates"] == {"city": "Vannes"}
+
+
+def test_loading_twice_gives_the_same_collection(records_path):
+    collection = mongo.get_client("mongomock://")["Ehpad"][mongo.ESTABLISHMENTS]
+    key_fields = mongo.KEY_FIELDS[mongo.ESTABLISHMENTS]
+
+    first = mongo.load(collection, mongo.establishment_documents(records_path), key_fields, batch_size=2, workers=2)
+    snapshot = sorted(collection.find(), key=lambda doc: doc["_id"])
+    second = mongo.load(collection, mongo.establishment_documents(records_path), key_fields, batch_size=2, workers=2)
+
+    assert (first["documents"], first["upserted"], first["errors"]) == (3, 3, 0)
+    # Le second chargement remplace les documents sans en ajouter
+    assert (second["documents"], second["upserted"], second["errors"]) == (3, 0, 0)
+    assert sorted(collection.find(), key=lambda doc: doc["_id"]) == snapshot
+    assert collection.count_documents({}) == len(RECORDS)
@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from data.search import SearchIndex, normalize
+
+
+@pytest.fixture(scope="module")
+def index():
+    frame = pd.DataFrame({
+        "_id": [1.0, 2.0, 3.0, 4.0, None],
+        "title": ["Résidence Les Tilleuls", "EHPAD Sainte-Anne", "EHPAD Annexe du Port", "Foyer Mariannes", None],
+        "noFinesset": ["290000017", "290000025", "290000033", None, "500000041"],
+        "coordinates.city": ["Brest", "Quimper", "Élancourt", "Lorient", "Caen"],
+    })
+    return SearchIndex(frame)
+
+
+def test_normalize_folds_accents_case_and_punctuation():
+    assert normalize("  ÉHPAD  Sainte-Anne (Côte-d'Armor) ") == "ehpad sainte anne cote d armor"
+    assert normalize("") == ""
+
+
+@pytest.mark.parametrize("query", ["residence", "RÉSIDENCE", "Résidence", "tilleuls RESID"])
+def test_search_ignores_accents_and_case(index, query):
+    assert index.search(query).tolist() == [0]
+
+
+def test_accented_rows_match_plain_queries(index):
+    assert index.search("elancourt").tolist() == [2]
+    assert index.search("ÉLAN").tolist() == [2]
+
+
+def test_prefix_match_ranks_before_substring_match(index):
+    # « anne » : mot identique (Sainte-Anne), début de mot (Annexe), sous-chaîne (Mariannes)
+    assert index.search("anne").tolist() == [1, 2, 3]
+    # « ann » : début de mot avant sous-chaîne, puis ordre de la table à score égal
+    assert index.search("ann").tolist() == [1, 2, 3]
+    assert index.search("ianne").tolist() == [3]
+
+
+def test_every_term_must_match(index):
+    assert index.search("ehpad port").tolist() == [2]
+    assert index.search("ehpad brest").tolist() == []
+    assert index.search("xyz").tolist() == []
+
+
+def test_identifiers_are_searchable(index):
+    assert index.search("290000025").tolist() == [1]
+    # Les identifiants flottants entiers sont indexés sans « .0 »
+    assert index.search("4").tolist() == [3]
+
+
+def test_empty_query_returns_the_first_rows(index):
+    assert index.search("").tolist() == [0, 1, 2, 3, 4]
+    assert index.search("  -- ", k=2).tolist() == [0, 1]
+    assert index.search("", positions=[1, 3]).tolist() == [1, 3]
+
+
+def test_search_is_restricted_to_positions(index):
+    assert index.search("ehpad", positions=[0, 2, 4]).tolist() == [2]
+    assert index.search("anne", k=1).tolist() == [1]
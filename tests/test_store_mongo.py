@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from data import mongo, store
+from data.filters import FilterState
+from data.snapshot import BOOL_COLUMNS
+
+pytest.importorskip("mongomock")
+
+
+def _document(row_id, title, city, region, capacity, ehpad=True):
+    return {
+        "_id": row_id,
+        "title": title,
+        "noFinesset": f"{row_id:09d}",
+        "capacity": capacity,
+        "legal_status": "Public",
+        "types": {col: ehpad if col == "IsEHPAD" else False for col in BOOL_COLUMNS},
+        "pricing": {"cerfa": None, "prixMin": 61.5},
+        "coordinates": {
+            "city": city, "deptname": "FINISTERE", "deptcode": "29", "region": region,
+            "postcode": "29200", "latitude": 48.39, "longitude": -4.48,
+        },
+    }
+
+
+# Établissements absents du CSV du tableau de bord : seule la collection les connaît
+DOCUMENTS = [
+    _document(90001, "EHPAD Les Tilleuls", "Brest", "Bretagne", 80.0),
+    _document(90002, "Résidence du Port", "Quimper", "Bretagne", None, ehpad=False),
+    _document(90003, "EHPAD des Pins", "Caen", "Normandie", 45.0),
+]
+
+
+def _same(value, other):
+    return (pd.isna(value) and pd.isna(other)) or value == other
+
+
+@pytest.fixture
+def collection(monkeypatch, request):
+    monkeypatch.setattr(mongo, "BACKEND", "mongo")
+    monkeypatch.setattr(mongo, "MONGO_URI", "mongomock://")
+    monkeypatch.setattr(mongo, "DATABASE", f"test_{request.node.name}")
+    collection = store.get_mongo_collection()
+    mongo.load_collection(collection.database, mongo.ESTABLISHMENTS, DOCUMENTS, workers=1)
+    return collection
+
+
+def test_dataset_is_read_from_the_collection(collection):
+    dataset = store.get_dataset()
+    assert dataset.frame[store.ROW_ID].tolist() == [doc["_id"] for doc in DOCUMENTS]
+    assert dataset.frame["IsEHPAD"].tolist() == [True, False, True]
+    assert dataset.frame["prixMin"].tolist() == [61.5] * 3
+    assert dataset.frame["Nom_Entreprise"].iloc[0] == "EHPAD Les Tilleuls - 000090001"
+
+
+def test_clicked_point_details_match_the_plotted_row(collection):
+    dataset = store.get_dataset()
+    rows = store.get_map_rows(dataset, FilterState(region="Bretagne"))
+    assert rows.count == 2
+
+    for rank, plotted in enumerate(rows.frame.to_dict(orient="records")):
+        # L'identifiant est relu dans ``customdata`` au clic
+        row_id = plotted[store.ROW_ID]
+        assert rows.index_of(row_id) == rank
+        details = dataset.frame.iloc[dataset.position_of(row_id)]
+        for column in store.MAP_FIELDS:
+            assert _same(details[column], plotted[column]), column
+
+    assert rows.index_of(90003) is None
+
+
+def test_dataset_is_reloaded_with_the_collection(collection):
+    assert store.get_dataset().frame["title"].iloc[0] == "EHPAD Les Tilleuls"
+    renamed = [dict(DOCUMENTS[0], title="EHPAD Les Tilleuls (nouveau)"), *DOCUMENTS[1:]]
+    mongo.load_collection(collection.database, mongo.ESTABLISHMENTS, renamed, workers=1)
+    assert store.get_dataset().frame["title"].iloc[0] == "EHPAD Les Tilleuls (nouveau)"